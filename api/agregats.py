@@ -0,0 +1,137 @@
+"""Agrégats des graphiques de comparaison du dashboard (onglet 3).
+
+Pour un fichier et un filtre (vue globale, même sexe, tranche d'âge, voisins), les
+graphiques ne reçoivent plus toutes les lignes mais des agrégats de taille fixe :
+histogramme, densité lissée (KDE sur histogramme fin), quantiles, et grille 2D de
+densité pour le graphique bivarié. Ils sont calculés une fois puis gardés dans le
+cache mémoire du jeu de données : le rendu ne dépend plus de la taille de la population.
+"""
+
+import numpy as np
+
+BINS_HISTOGRAMME = 30
+BINS_KDE = 512
+POINTS_KDE = 256
+BINS_2D = 60
+MAX_POINTS_NUAGE = 2000
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+
+
+def valeurs_filtrees(jeu, colonnes, masque=None):
+    """Valeurs float64 (lignes, colonnes) ; masque booléen ou liste de positions (voisins)."""
+    data = jeu.donnees(colonnes)
+    if masque is not None:
+        data = (
+            data.iloc[masque] if isinstance(masque, list) else data[np.asarray(masque)]
+        )
+    return data.to_numpy(dtype=np.float64)
+
+
+def _bornes(valeurs, bins):
+    minimum, maximum = float(valeurs.min()), float(valeurs.max())
+    if minimum == maximum:
+        minimum, maximum = minimum - 0.5, maximum + 0.5
+    return np.linspace(minimum, maximum, bins + 1)
+
+
+def _kde(valeurs, bornes):
+    """Densité gaussienne (règle de Scott) par convolution d'un histogramme fin : coût indépendant de n."""
+    fins = np.linspace(bornes[0], bornes[-1], BINS_KDE + 1)
+    comptes, _ = np.histogram(valeurs, bins=fins)
+    largeur = fins[1] - fins[0]
+    ecart_type = valeurs.std()
+    densite = comptes / (len(valeurs) * largeur)
+    if len(valeurs) > 1 and ecart_type > 0:
+        h = ecart_type * len(valeurs) ** (-1 / 5) / largeur  # largeur de bande en cases
+        # Noyau tronqué à 4 écarts-types et jamais plus long que l'histogramme (sortie de même taille)
+        demi = int(min(np.ceil(4 * h), (BINS_KDE - 1) // 2))
+        noyau = np.exp(-0.5 * (np.arange(-demi, demi + 1) / h) ** 2)
+        densite = np.convolve(densite, noyau / noyau.sum(), mode="same")
+    x = (fins[:-1] + fins[1:]) / 2
+    pas = BINS_KDE // POINTS_KDE
+    return x[::pas].tolist(), densite[::pas].tolist()
+
+
+def histogramme(jeu, colonne, filtre=None, masque=None, bins=BINS_HISTOGRAMME):
+    """Histogramme, densité lissée et quantiles d'une colonne pour la population filtrée.
+
+    `filtre` identifie la population dans la clé du cache (None : tout le fichier) ;
+    `masque` est une fonction sans argument appelée seulement si l'agrégat n'est pas en cache.
+    """
+
+    def calculer():
+        valeurs = valeurs_filtrees(
+            jeu, [colonne], masque() if masque is not None else None
+        )[:, 0]
+        presentes = valeurs[~np.isnan(valeurs)]
+        agregat = {"n": len(valeurs), "n_manquants": int(len(valeurs) - len(presentes))}
+        if len(presentes) == 0:
+            return {
+                **agregat,
+                "bornes": [],
+                "comptes": [],
+                "kde_x": [],
+                "kde_y": [],
+                "quantiles": {},
+                "cumul": [],
+            }
+        bornes = _bornes(presentes, bins)
+        comptes, _ = np.histogram(presentes, bins=bornes)
+        kde_x, kde_y = _kde(presentes, bornes)
+        return {
+            **agregat,
+            "bornes": bornes.tolist(),
+            "comptes": comptes.tolist(),
+            "kde_x": kde_x,
+            "kde_y": kde_y,
+            "quantiles": dict(
+                zip(QUANTILES, np.quantile(presentes, QUANTILES).tolist())
+            ),
+            "moyenne": float(presentes.mean()),
+            # Fonction de répartition empirique sur 101 points : rang centile d'un client sans relire la colonne
+            "cumul": np.quantile(presentes, np.linspace(0, 1, 101)).tolist(),
+        }
+
+    return jeu.agregat(("histogramme", colonne, filtre, bins), calculer)
+
+
+def rang_centile(agregat, valeur):
+    """Part (en %) de la population filtrée sous `valeur`, à 1 % près."""
+    if not agregat["cumul"] or valeur is None or np.isnan(valeur):
+        return None
+    return float(
+        np.interp(valeur, agregat["cumul"], np.arange(101), left=0.0, right=100.0)
+    )
+
+
+def densite_2d(jeu, colonne_x, colonne_y, filtre=None, masque=None, bins=BINS_2D):
+    """Grille de densité (bins x bins) de deux colonnes ; points bruts si la population est petite."""
+
+    def calculer():
+        colonnes = list(dict.fromkeys([colonne_x, colonne_y]))
+        valeurs = valeurs_filtrees(
+            jeu, colonnes, masque() if masque is not None else None
+        )
+        x, y = valeurs[:, 0], valeurs[:, -1]
+        presentes = ~np.isnan(x) & ~np.isnan(y)
+        x, y = x[presentes], y[presentes]
+        agregat = {"n": int(presentes.sum()), "n_manquants": int((~presentes).sum())}
+        if len(x) == 0:
+            return {
+                **agregat,
+                "bornes_x": [],
+                "bornes_y": [],
+                "comptes": [],
+                "points": None,
+            }
+        bornes_x, bornes_y = _bornes(x, bins), _bornes(y, bins)
+        comptes, _, _ = np.histogram2d(x, y, bins=[bornes_x, bornes_y])
+        return {
+            **agregat,
+            "bornes_x": bornes_x.tolist(),
+            "bornes_y": bornes_y.tolist(),
+            "comptes": comptes.astype(np.int64).tolist(),
+            "points": [x.tolist(), y.tolist()] if len(x) <= MAX_POINTS_NUAGE else None,
+        }
+
+    return jeu.agregat(("densite_2d", colonne_x, colonne_y, filtre, bins), calculer)
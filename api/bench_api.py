@@ -0,0 +1,397 @@
+"""Benchmark de charge et de latence des endpoints de l'API.
+
+Usage :
+    python -m api.bench_api [--mode inprocess|uvicorn] [--endpoints predict,shap_local,shap_global]
+                            [--fichiers 1k,5k] [--tailles-lot 1,100] [--concurrences 1,8]
+                            [--reference api/bench_reference.json] [--enregistrer-reference]
+                            [--sans-cache-shap] [--sans-instrumentation]
+
+Chaque scénario (endpoint x fichier x taille de lot x concurrence) envoie des
+lignes réelles de data/sample_clients_<fichier>.csv et mesure le débit, les
+latences p50/p95/p99 et le pic de RSS du serveur. Les résultats sont écrits en
+JSON ; avec --reference, le code de sortie vaut 1 si un scénario régresse au-delà
+de la tolérance (p95 plus lent ou débit plus faible).
+
+La référence versionnée est api/bench_reference.json (paramètres par défaut, mode
+inprocess, machine décrite dans le fichier) ; bench_resultats/ n'est pas versionné.
+Sur une autre machine, enregistrer d'abord sa propre référence avec
+--enregistrer-reference avant de comparer.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+racine = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+chemin_data = os.path.join(racine, "data")
+
+ENDPOINTS = {
+    "predict": "/predict",
+    "shap_local": "/shap_local",
+    "shap_global": "/shap_global",
+}
+# /shap_local explique un seul client : la taille de lot est forcée à 1
+LOT_UNIQUE = {"shap_local"}
+
+
+def charger_lignes(fichier):
+    """Lignes du CSV (sans SK_ID_CURR), NaN remplacés par None pour le JSON."""
+    data = pd.read_csv(os.path.join(chemin_data, f"sample_clients_{fichier}.csv")).drop(
+        columns=["SK_ID_CURR"]
+    )
+    return data.astype(object).where(
+        data.notna(), None
+    ).values.tolist(), data.columns.tolist()
+
+
+def construire_corps(lignes, colonnes, taille_lot, n_requetes):
+    """Corps JSON pré-encodés : lots consécutifs qui parcourent le fichier en boucle."""
+    corps = []
+    for i in range(n_requetes):
+        debut = (i * taille_lot) % len(lignes)
+        lot = [lignes[(debut + j) % len(lignes)] for j in range(taille_lot)]
+        corps.append(json.dumps({"data": lot, "columns": colonnes}).encode())
+    return corps
+
+
+async def executer(client, chemin, corps, concurrence, duree_max):
+    """Envoie les requêtes avec `concurrence` clients en parallèle ; renvoie latences et erreurs."""
+    latences, erreurs = [], 0
+    file = iter(corps)
+    limite = time.perf_counter() + duree_max
+
+    async def client_virtuel():
+        nonlocal erreurs
+        for contenu in file:
+            if time.perf_counter() > limite:
+                return
+            debut = time.perf_counter()
+            response = await client.post(
+                chemin, content=contenu, headers={"Content-Type": "application/json"}
+            )
+            latences.append(time.perf_counter() - debut)
+            if response.status_code != 200:
+                erreurs += 1
+
+    debut = time.perf_counter()
+    await asyncio.gather(*(client_virtuel() for _ in range(concurrence)))
+    return latences, erreurs, time.perf_counter() - debut
+
+
+def resumer(latences, erreurs, duree, taille_lot):
+    latences_ms = np.array(latences) * 1000
+    p50, p95, p99 = (
+        np.percentile(latences_ms, [50, 95, 99]) if len(latences_ms) else (np.nan,) * 3
+    )
+    return {
+        "requetes": len(latences),
+        "erreurs": erreurs,
+        "duree_s": round(duree, 3),
+        "debit_req_s": round(len(latences) / duree, 2),
+        "debit_lignes_s": round(len(latences) * taille_lot / duree, 1),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+    }
+
+
+def cle_scenario(resultat):
+    return f"{resultat['endpoint']}|{resultat['fichier']}|lot={resultat['taille_lot']}|c={resultat['concurrence']}"
+
+
+def comparer(resultats, reference, tolerance):
+    """Liste des régressions par rapport aux résultats de référence (même mode et mêmes scénarios)."""
+    if resultats["mode"] != reference.get("mode"):
+        return [f"mode différent de la référence ({reference.get('mode')})"]
+    precedents = {cle_scenario(r): r for r in reference["scenarios"]}
+    regressions = []
+    for resultat in resultats["scenarios"]:
+        precedent = precedents.get(cle_scenario(resultat))
+        if precedent is None:
+            continue
+        if resultat["p95_ms"] > precedent["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{cle_scenario(resultat)} : p95 {resultat['p95_ms']} ms > {precedent['p95_ms']} ms (référence)"
+            )
+        if resultat["debit_req_s"] < precedent["debit_req_s"] * (1 - tolerance):
+            regressions.append(
+                f"{cle_scenario(resultat)} : débit {resultat['debit_req_s']} req/s"
+                f" < {precedent['debit_req_s']} req/s (référence)"
+            )
+        if resultat["erreurs"] > precedent["erreurs"]:
+            regressions.append(
+                f"{cle_scenario(resultat)} : {resultat['erreurs']} erreurs"
+            )
+    return regressions
+
+
+# --- Cibles : application dans le processus ou serveur uvicorn local ---
+
+
+def rss_pic_processus_courant():
+    # ru_maxrss est en Ko sous Linux, en octets sous macOS
+    pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pic / 1024 if sys.platform == "darwin" else pic * 1024
+
+
+def rss_pic_pid(pid):
+    """Pic de RSS (octets) d'un processus et de ses enfants, d'après /proc (Linux)."""
+    total = 0
+    pids = [pid]
+    while pids:
+        courant = pids.pop()
+        try:
+            with open(f"/proc/{courant}/status") as file:
+                for ligne in file:
+                    if ligne.startswith("VmHWM:"):
+                        total += int(ligne.split()[1]) * 1024
+            with open(f"/proc/{courant}/task/{courant}/children") as file:
+                pids += [int(enfant) for enfant in file.read().split()]
+        except OSError:
+            continue
+    return total or None
+
+
+class CibleInprocess:
+    """Application importée dans le processus du benchmark (transport ASGI, sans réseau).
+
+    Un seul AsyncClient sur la boucle du benchmark : le sémaphore SHAP et le
+    micro-batcher de l'API sont liés à la boucle qui les utilise.
+    """
+
+    def __init__(self):
+        import httpx
+
+        from api.main import app
+
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://bench",
+            timeout=None,
+        )
+
+    def rss_pic(self):
+        return rss_pic_processus_courant()
+
+    async def fermer(self):
+        await self.client.aclose()
+
+
+class CibleUvicorn:
+    """Serveur uvicorn lancé en sous-processus sur un port libre."""
+
+    def __init__(self, workers=1, delai_demarrage=120):
+        import httpx
+
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        self.processus = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "uvicorn",
+                "api.main:app",
+                "--port",
+                str(port),
+                "--workers",
+                str(workers),
+            ],
+            cwd=racine,
+            env=dict(os.environ, PYTHONPATH=racine),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        base_url = f"http://127.0.0.1:{port}"
+        self._attendre(httpx, f"{base_url}/health/ready", delai_demarrage)
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=None,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=None),
+        )
+
+    def _attendre(self, httpx, url, delai):
+        limite = time.perf_counter() + delai
+        while time.perf_counter() < limite:
+            if self.processus.poll() is not None:
+                raise RuntimeError("le serveur uvicorn s'est arrêté au démarrage")
+            try:
+                if httpx.get(url, params={"avec_shap": True}).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            time.sleep(0.2)
+        self.processus.terminate()
+        raise RuntimeError(f"serveur non prêt après {delai} s")
+
+    def rss_pic(self):
+        return rss_pic_pid(self.processus.pid)
+
+    async def fermer(self):
+        await self.client.aclose()
+        self.processus.terminate()
+        self.processus.wait()
+
+
+async def lancer(args):
+    cible = (
+        CibleInprocess()
+        if args.mode == "inprocess"
+        else CibleUvicorn(workers=args.workers)
+    )
+    scenarios = []
+    try:
+        for fichier in args.fichiers:
+            lignes, colonnes = charger_lignes(fichier)
+            for nom in args.endpoints:
+                tailles = [1] if nom in LOT_UNIQUE else args.tailles_lot
+                for taille_lot in tailles:
+                    corps = construire_corps(
+                        lignes, colonnes, taille_lot, args.requetes + args.echauffement
+                    )
+                    for concurrence in args.concurrences:
+                        chemin = ENDPOINTS[nom]
+                        # Échauffement (non mesuré) : caches CPU, threadpool, connexions
+                        await executer(
+                            cible.client,
+                            chemin,
+                            corps[: args.echauffement],
+                            concurrence,
+                            args.duree_max,
+                        )
+                        latences, erreurs, duree = await executer(
+                            cible.client,
+                            chemin,
+                            corps[args.echauffement :],
+                            concurrence,
+                            args.duree_max,
+                        )
+                        resultat = {
+                            "endpoint": nom,
+                            "fichier": fichier,
+                            "taille_lot": taille_lot,
+                            "concurrence": concurrence,
+                            **resumer(latences, erreurs, duree, taille_lot),
+                        }
+                        scenarios.append(resultat)
+                        print(
+                            f"{cle_scenario(resultat):40s} {resultat['debit_req_s']:8.1f} req/s"
+                            f"  p50 {resultat['p50_ms']:8.2f} ms  p95 {resultat['p95_ms']:8.2f} ms"
+                            f"  p99 {resultat['p99_ms']:8.2f} ms  erreurs {resultat['erreurs']}"
+                        )
+        rss_pic = cible.rss_pic()
+    finally:
+        await cible.fermer()
+
+    return {
+        "mode": args.mode,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "machine": f"{platform.machine()}, {os.cpu_count()} CPU",
+        "rss_pic_mo": round(rss_pic / 1024**2, 1) if rss_pic else None,
+        "scenarios": scenarios,
+    }
+
+
+def liste(type_element):
+    return lambda valeur: [type_element(v) for v in valeur.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark de charge des endpoints de l'API"
+    )
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--endpoints", type=liste(str), default=list(ENDPOINTS))
+    parser.add_argument("--fichiers", type=liste(str), default=["1k", "5k"])
+    parser.add_argument("--tailles-lot", type=liste(int), default=[1, 100])
+    parser.add_argument("--concurrences", type=liste(int), default=[1, 8])
+    parser.add_argument(
+        "--requetes", type=int, default=100, help="requêtes mesurées par scénario"
+    )
+    parser.add_argument("--echauffement", type=int, default=5)
+    parser.add_argument(
+        "--duree-max", type=float, default=20.0, help="durée maximale d'un scénario (s)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="workers uvicorn (mode uvicorn)"
+    )
+    parser.add_argument(
+        "--sans-cache-shap",
+        action="store_true",
+        help="désactive le cache SHAP (CACHE_SHAP_MO=0)",
+    )
+    parser.add_argument(
+        "--sans-instrumentation",
+        action="store_true",
+        help="désactive les métriques par étape (INSTRUMENTATION=0), pour mesurer leur coût",
+    )
+    parser.add_argument(
+        "--sortie", default=os.path.join("bench_resultats", "bench_api.json")
+    )
+    parser.add_argument(
+        "--reference",
+        help="résultats de référence (JSON) pour détecter les régressions, ex : api/bench_reference.json",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="écart relatif toléré (défaut 20 %%)",
+    )
+    parser.add_argument(
+        "--enregistrer-reference",
+        action="store_true",
+        help="écrit aussi les résultats dans --reference",
+    )
+    args = parser.parse_args()
+
+    inconnus = set(args.endpoints) - set(ENDPOINTS)
+    if inconnus:
+        parser.error(f"endpoints inconnus : {sorted(inconnus)}")
+    if args.sans_cache_shap:
+        # Avant l'import de l'API (mode inprocess) ou le lancement d'uvicorn
+        os.environ["CACHE_SHAP_MO"] = "0"
+    if args.sans_instrumentation:
+        os.environ["INSTRUMENTATION"] = "0"
+
+    resultats = asyncio.run(lancer(args))
+    print(f"Pic RSS du serveur : {resultats['rss_pic_mo']} Mo")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.sortie)), exist_ok=True)
+    with open(args.sortie, "w") as file:
+        json.dump(resultats, file, indent=2)
+    print(f"Résultats écrits dans {args.sortie}")
+
+    if not args.reference:
+        return
+    if args.enregistrer_reference or not os.path.exists(args.reference):
+        os.makedirs(os.path.dirname(os.path.abspath(args.reference)), exist_ok=True)
+        with open(args.reference, "w") as file:
+            json.dump(resultats, file, indent=2)
+        print(f"Référence enregistrée dans {args.reference}")
+        return
+
+    with open(args.reference) as file:
+        regressions = comparer(resultats, json.load(file), args.tolerance)
+    for regression in regressions:
+        print(f"RÉGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+    print(
+        f"Aucune régression au-delà de {args.tolerance:.0%} par rapport à {args.reference}"
+    )
+
+
+if __name__ == "__main__":
+    main()
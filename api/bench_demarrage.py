@@ -0,0 +1,84 @@
+"""Mesure du temps entre le lancement de Python et la disponibilité de l'API.
+
+Usage : python -m api.bench_demarrage [--repetitions N]
+
+Compare l'initialisation différée de SHAP (défaut) à l'initialisation au
+chargement (SHAP_INIT_DIFFEREE=0, comportement d'avant) : temps jusqu'à
+/predict prêt et jusqu'à SHAP prêt, médiane sur N lancements.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+racine = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Exécuté dans un processus neuf : import de l'API puis attente de l'explainer
+SCRIPT = """
+import json, time
+debut = time.perf_counter()
+import api.main
+pret_predict = time.perf_counter() - debut
+api.main.obtenir_explainer()
+pret_shap = time.perf_counter() - debut
+print(json.dumps({"pret_predict": pret_predict, "pret_shap": pret_shap,
+                  "etapes": api.main.etapes_demarrage}))
+"""
+
+
+def mesurer(differee, repetitions):
+    env = dict(
+        os.environ, SHAP_INIT_DIFFEREE="1" if differee else "0", PYTHONPATH=racine
+    )
+    mesures = []
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        sortie = subprocess.run(
+            [sys.executable, "-c", SCRIPT],
+            env=env,
+            cwd=racine,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        total = time.perf_counter() - debut
+        resultat = json.loads(sortie.stdout.strip().splitlines()[-1])
+        # Temps depuis le lancement de l'interpréteur (démarrage Python inclus)
+        lancement = total - resultat["pret_shap"]
+        mesures.append(
+            {
+                "pret_predict": lancement + resultat["pret_predict"],
+                "pret_shap": total,
+                "etapes": resultat["etapes"],
+            }
+        )
+    return {
+        "pret_predict_median": statistics.median(m["pret_predict"] for m in mesures),
+        "pret_shap_median": statistics.median(m["pret_shap"] for m in mesures),
+        "etapes": mesures[-1]["etapes"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du démarrage de l'API")
+    parser.add_argument("--repetitions", type=int, default=3)
+    args = parser.parse_args()
+
+    resultats = {
+        "avant (SHAP au chargement)": mesurer(False, args.repetitions),
+        "apres (SHAP différé)": mesurer(True, args.repetitions),
+    }
+    for nom, resultat in resultats.items():
+        print(
+            f"{nom:28s} /predict prêt : {resultat['pret_predict_median']:.2f} s"
+            f" | SHAP prêt : {resultat['pret_shap_median']:.2f} s"
+        )
+    print(json.dumps(resultats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from api.empreinte import empreinte_fichier
+
+# Surcoût mémoire estimé par entrée (clé, tuple, objets Python)
+SURCOUT_ENTREE = 200
+
+
+class CacheShap:
+    """Cache des explications SHAP par ligne transformée.
+
+    La clé est un hash de la ligne transformée et de la version du modèle.
+    Chaque entrée garde le vecteur SHAP et la base value de la ligne.
+    L'éviction est LRU bornée en mémoire avec une durée de vie (TTL), et le
+    cache est vidé automatiquement quand le fichier du modèle change.
+    """
+
+    def __init__(self, chemin_modele, max_octets=64 * 1024 * 1024, ttl=3600.0):
+        self.chemin_modele = chemin_modele
+        self.max_octets = max_octets
+        self.ttl = ttl
+
+        self._entrees = OrderedDict()  # clé -> (valeurs, base_value, expiration)
+        self._octets = 0
+        self._verrou = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._stat_modele = _stat(chemin_modele)
+        self.version_modele = empreinte_fichier(chemin_modele)
+
+    def cles(self, X_transforme, version=None):
+        prefixe = (version or self.version_modele).encode()
+        X = np.ascontiguousarray(X_transforme, dtype=np.float64)
+        return [
+            hashlib.blake2b(prefixe + ligne.tobytes(), digest_size=16).digest()
+            for ligne in X
+        ]
+
+    def explications(self, X_transforme, calculer, version=None):
+        """Valeurs SHAP (n, p) et base values (n,) ; seules les lignes absentes sont calculées.
+
+        `calculer(X)` renvoie (valeurs, base_values) pour les lignes manquantes. `version`
+        (empreinte du modèle) remplace celle du fichier surveillé dans la clé (registre de modèles).
+        """
+        self._verifier_modele()
+        cles = self.cles(X_transforme, version)
+        n = len(cles)
+
+        valeurs, bases, manquantes = [None] * n, np.empty(n), []
+        maintenant = time.monotonic()
+        with self._verrou:
+            for i, cle in enumerate(cles):
+                entree = self._entrees.get(cle)
+                if entree is not None and entree[2] > maintenant:
+                    self._entrees.move_to_end(cle)
+                    valeurs[i], bases[i] = entree[0], entree[1]
+                else:
+                    manquantes.append(i)
+            self.hits += n - len(manquantes)
+            self.misses += len(manquantes)
+
+        if manquantes:
+            nouvelles_valeurs, nouvelles_bases = calculer(X_transforme[manquantes])
+            nouvelles_bases = np.broadcast_to(nouvelles_bases, (len(manquantes),))
+            for j, i in enumerate(manquantes):
+                valeurs[i], bases[i] = nouvelles_valeurs[j], nouvelles_bases[j]
+            self._stocker(
+                [cles[i] for i in manquantes], nouvelles_valeurs, nouvelles_bases
+            )
+
+        if n == 0:
+            return np.empty((0, X_transforme.shape[1])), bases
+        return np.vstack(valeurs), bases
+
+    def _stocker(self, cles, valeurs, bases):
+        expiration = time.monotonic() + self.ttl
+        with self._verrou:
+            for cle, ligne, base in zip(cles, valeurs, bases):
+                ligne = np.array(
+                    ligne, dtype=np.float64
+                )  # copie : ne retient pas la matrice du lot
+                ancienne = self._entrees.pop(cle, None)
+                if ancienne is not None:
+                    self._octets -= ancienne[0].nbytes + SURCOUT_ENTREE
+                self._entrees[cle] = (ligne, float(base), expiration)
+                self._octets += ligne.nbytes + SURCOUT_ENTREE
+
+            # Éviction LRU jusqu'à repasser sous la limite mémoire
+            while self._octets > self.max_octets and self._entrees:
+                _, (ligne, _, _) = self._entrees.popitem(last=False)
+                self._octets -= ligne.nbytes + SURCOUT_ENTREE
+                self.evictions += 1
+
+    def _verifier_modele(self):
+        stat = _stat(self.chemin_modele)
+        if stat != self._stat_modele:
+            # Nouveau fichier modèle : nouvelle version, toutes les entrées sont invalidées
+            self._stat_modele = stat
+            self.version_modele = empreinte_fichier(self.chemin_modele)
+            self.vider()
+
+    def vider(self):
+        with self._verrou:
+            self._entrees.clear()
+            self._octets = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "version_modele": self.version_modele,
+            "entrees": len(self._entrees),
+            "octets": self._octets,
+            "max_octets": self.max_octets,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "taux_hits": self.hits / total if total else 0.0,
+        }
+
+
+def _stat(chemin):
+    stat = os.stat(chemin)
+    return stat.st_mtime_ns, stat.st_size
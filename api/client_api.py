@@ -0,0 +1,307 @@
+"""Client HTTP de l'API de scoring, partagé par le dashboard.
+
+Session `requests` unique (connexions keep-alive en pool), URL de base lue dans
+la variable d'environnement API_URL, prédiction en binaire float64 sur
+/predict_colonnes, JSON compressé en gzip pour SHAP, et cache des réponses par
+ligne client et version du modèle.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from api.format_shap import decoder_float32
+
+API_URL = os.environ.get(
+    "API_URL", "https://projet7-credit-default-risk.azurewebsites.net"
+)
+# API_URL=http://127.0.0.1:8000 pour une API locale
+
+TIMEOUT = (3.05, 120)  # (connexion, lecture) en secondes
+SEUIL_GZIP = 1024  # octets : les petits corps sont envoyés tels quels
+
+
+def valeurs_json(data):
+    """Matrice de la DataFrame en listes, NaN et infinis remplacés par None (JSON valide)."""
+    valeurs = data.to_numpy(dtype=np.float64)
+    return np.where(np.isfinite(valeurs), valeurs, None).tolist()
+
+
+def corps_float64(data):
+    """Buffers float64 little-endian concaténés colonne par colonne (format de /predict_colonnes)."""
+    return np.ascontiguousarray(data.to_numpy(dtype="<f8").T).tobytes()
+
+
+def decoder_resultats_float64(contenu, n_lignes):
+    """Décode la réponse binaire de /predict_colonnes : probas float64 puis décisions int8."""
+    probas = np.frombuffer(contenu, dtype="<f8", count=n_lignes)
+    predictions = np.frombuffer(
+        contenu, dtype=np.int8, count=n_lignes, offset=8 * n_lignes
+    )
+    return {
+        "predictions": predictions.astype(int).tolist(),
+        "probas_class_1": probas.tolist(),
+    }
+
+
+def decoder_reponse_binaire(response):
+    """Réponse SHAP en mode binaire -> dict au format de la réponse JSON complète (tableaux NumPy)."""
+    feature_names = json.loads(response.headers["x-feature-names"])
+    shap_values, features, base_values = decoder_float32(
+        response.content, int(response.headers["x-lignes"]), len(feature_names)
+    )
+    reponse = {
+        "shap_values": shap_values,
+        "features_transformed": features,
+        "feature_names": feature_names,
+        "base_values": base_values,
+    }
+    if "x-approximation" in response.headers:
+        reponse["approximation"] = json.loads(response.headers["x-approximation"])
+    return reponse
+
+
+class ClientApi:
+    """Appels à l'API avec pool de connexions et cache LRU des réponses par client."""
+
+    def __init__(
+        self,
+        base_url=None,
+        timeout=TIMEOUT,
+        taille_cache=512,
+        ttl_version=30.0,
+        nb_threads=4,
+    ):
+        self.base_url = (base_url or API_URL).rstrip("/")
+        self.timeout = timeout
+        self.taille_cache = taille_cache
+        self.ttl_version = ttl_version
+
+        self.session = requests.Session()
+        # Nouvelles tentatives sur erreurs de connexion uniquement (pas de double envoi d'un POST lu)
+        adaptateur = HTTPAdapter(
+            pool_connections=2,
+            pool_maxsize=nb_threads,
+            max_retries=Retry(total=2, connect=2, read=0, backoff_factor=0.2),
+        )
+        self.session.mount("http://", adaptateur)
+        self.session.mount("https://", adaptateur)
+        self._executor = ThreadPoolExecutor(
+            max_workers=nb_threads, thread_name_prefix="client_api"
+        )
+
+        self._cache = OrderedDict()  # clé -> réponse décodée
+        self._verrou = threading.Lock()
+        self._version = None
+        self._date_version = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    # --- Version du modèle et cache ---
+
+    def _infos_version(self):
+        # /version relu au plus toutes les `ttl_version` secondes
+        if (
+            self._version is None
+            or time.monotonic() - self._date_version > self.ttl_version
+        ):
+            response = self.session.get(
+                f"{self.base_url}/version", timeout=self.timeout
+            )
+            response.raise_for_status()
+            self._version = response.json()
+            self._date_version = time.monotonic()
+        return self._version
+
+    def version_modele(self):
+        """Empreinte du modèle servi."""
+        return self._infos_version()["version_modele"]
+
+    def seuil(self):
+        """Seuil de décision de la version servie."""
+        return self._infos_version()["seuil"]
+
+    def _cle(self, endpoint, data):
+        empreinte = hashlib.blake2b(digest_size=16)
+        empreinte.update(f"{endpoint}|{self.version_modele()}|".encode())
+        empreinte.update("\x1f".join(map(str, data.columns)).encode())
+        empreinte.update(
+            np.ascontiguousarray(data.to_numpy(dtype=np.float64)).tobytes()
+        )
+        return empreinte.digest()
+
+    def _memoiser(self, endpoint, data, appeler):
+        cle = self._cle(endpoint, data)
+        with self._verrou:
+            if cle in self._cache:
+                self._cache.move_to_end(cle)
+                self.hits += 1
+                return self._cache[cle]
+            self.misses += 1
+
+        resultat = appeler()
+        with self._verrou:
+            self._cache[cle] = resultat
+            while len(self._cache) > self.taille_cache:
+                self._cache.popitem(last=False)
+        return resultat
+
+    # --- Appels ---
+
+    def _post_json(self, endpoint, contenu, params=None):
+        corps = json.dumps(contenu).encode()
+        entetes = {"Content-Type": "application/json"}
+        if len(corps) >= SEUIL_GZIP:
+            corps = gzip.compress(corps, compresslevel=5)
+            entetes["Content-Encoding"] = "gzip"
+        response = self.session.post(
+            f"{self.base_url}{endpoint}",
+            data=corps,
+            headers=entetes,
+            params=params,
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        if response.headers.get("x-feature-names") is not None:
+            return decoder_reponse_binaire(response)
+        return response.json()
+
+    def predire(self, data):
+        """Prédictions et probabilités des lignes de `data` (colonnes du modèle, sans SK_ID_CURR)."""
+
+        def appeler():
+            response = self.session.post(
+                f"{self.base_url}/predict_colonnes",
+                data=corps_float64(data),
+                headers={
+                    "Content-Type": "application/octet-stream",
+                    "X-Colonnes": json.dumps(list(data.columns)),
+                },
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            return decoder_resultats_float64(response.content, len(data))
+
+        return self._memoiser("/predict_colonnes", data, appeler)
+
+    def shap_local(self, data):
+        """Explication SHAP du client (première ligne de `data`)."""
+        return self._memoiser(
+            "/shap_local",
+            data,
+            lambda: self._post_json(
+                "/shap_local",
+                {"data": valeurs_json(data), "columns": list(data.columns)},
+            ),
+        )
+
+    def shap_global(self, data, mode="binaire", **params):
+        """SHAP à la demande sur tout le fichier (non mis en cache côté client).
+
+        Par défaut en mode binaire float32 : mêmes clés que la réponse JSON complète,
+        en tableaux NumPy. Autres modes : voir api/format_shap.py.
+        """
+        return self._post_json(
+            "/shap_global",
+            {"data": valeurs_json(data), "columns": list(data.columns)},
+            params={"mode": mode, **params},
+        )
+
+    def shap_global_precalcule(self, nom_dataset, **params):
+        """Réponse brute de /shap_global/precalcule/{nom} (404/409 gérés par l'appelant)."""
+        return self.session.get(
+            f"{self.base_url}/shap_global/precalcule/{nom_dataset}",
+            params=params,
+            timeout=self.timeout,
+        )
+
+    def analyse_seuil(self, probas, labels, cout_fn=10.0, cout_fp=1.0, max_points=1000):
+        """Courbes précision / rappel / coût et seuil optimal (corps binaire : probas float64 puis labels int8)."""
+        corps = (
+            np.ascontiguousarray(probas, dtype="<f8").tobytes()
+            + np.ascontiguousarray(labels, dtype=np.int8).tobytes()
+        )
+        response = self.session.post(
+            f"{self.base_url}/seuil/analyse",
+            data=gzip.compress(corps, compresslevel=1),
+            params={"cout_fn": cout_fn, "cout_fp": cout_fp, "max_points": max_points},
+            headers={
+                "Content-Type": "application/octet-stream",
+                "Content-Encoding": "gzip",
+            },
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def what_if(self, data, grilles, croise=False, shap=False):
+        """Courbes de probabilité du client (première ligne de `data`) sur des grilles de valeurs.
+
+        `grilles` : {colonne: [valeurs] ou {"min", "max", "n"}} ; toutes les variantes sont
+        scorées en une seule requête (voir api/what_if.py).
+        """
+        ligne = data.iloc[:1]
+        contenu = {
+            "data": valeurs_json(ligne),
+            "columns": list(data.columns),
+            "grilles": grilles,
+            "croise": croise,
+        }
+        # Grilles et options dans la clé du cache : un rerun du dashboard ne rappelle pas l'API
+        cle = f"/what_if|{json.dumps(grilles, sort_keys=True)}|{croise}|{shap}"
+        return self._memoiser(
+            cle,
+            ligne,
+            lambda: self._post_json("/what_if", contenu, params={"shap": shap}),
+        )
+
+    def voisins(self, nom_dataset, data, k=10, ponderation="aucune", id_client=None):
+        """SK_ID_CURR et distances des k clients les plus proches de la première ligne de `data`."""
+        params = {"k": k, "ponderation": ponderation}
+        if id_client is not None:
+            params["id_client"] = int(id_client)
+        endpoint = f"/voisins/{nom_dataset}"
+        return self._memoiser(
+            f"{endpoint}?{sorted(params.items())}",
+            data,
+            lambda: self._post_json(
+                endpoint,
+                {"data": valeurs_json(data), "columns": list(data.columns)},
+                params,
+            ),
+        )
+
+    def predire_et_expliquer(self, data):
+        """Prédiction et SHAP local lancés en parallèle : (prédiction, shap_local)."""
+        # Version lue avant le lancement : un seul appel /version même si les deux threads démarrent ensemble
+        self.version_modele()
+        prediction = self._executor.submit(self.predire, data)
+        explication = self._executor.submit(self.shap_local, data)
+        return prediction.result(), explication.result()
+
+    def fermer(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+_client_partage = None
+_verrou_partage = threading.Lock()
+
+
+def client_partage():
+    """Instance unique du processus (réutilisée entre les reruns Streamlit)."""
+    global _client_partage
+    with _verrou_partage:
+        if _client_partage is None:
+            _client_partage = ClientApi()
+        return _client_partage
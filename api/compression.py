@@ -0,0 +1,78 @@
+import zlib
+
+# Taille maximale d'un corps décompressé (protection contre les "zip bombs")
+MAX_OCTETS_DECOMPRESSES = 256 * 1024 * 1024
+
+
+class MiddlewareDecompression:
+    """Middleware ASGI : décompresse les corps de requête envoyés en `Content-Encoding: gzip`.
+
+    Les endpoints reçoivent le corps en clair, sans changement de leur code.
+    """
+
+    def __init__(self, app, max_octets=MAX_OCTETS_DECOMPRESSES):
+        self.app = app
+        self.max_octets = max_octets
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        entetes = scope.get("headers", [])
+        if (b"content-encoding", b"gzip") not in [
+            (cle, valeur.lower()) for cle, valeur in entetes
+        ]:
+            return await self.app(scope, receive, send)
+
+        # wbits = 16 + MAX_WBITS : format gzip (en-tête + CRC)
+        decompresseur = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        morceaux, taille = [], 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            try:
+                morceau = decompresseur.decompress(
+                    message.get("body", b""), self.max_octets - taille + 1
+                )
+            except zlib.error:
+                return await _repondre(send, 400, b"corps gzip invalide")
+            taille += len(morceau)
+            if taille > self.max_octets or decompresseur.unconsumed_tail:
+                return await _repondre(send, 413, b"corps decompresse trop volumineux")
+            morceaux.append(morceau)
+            if not message.get("more_body", False):
+                break
+        if not decompresseur.eof:
+            return await _repondre(send, 400, b"corps gzip tronque")
+
+        corps = b"".join(morceaux)
+        scope = dict(scope)
+        scope["headers"] = [
+            (cle, valeur)
+            for cle, valeur in entetes
+            if cle not in (b"content-encoding", b"content-length")
+        ] + [(b"content-length", str(len(corps)).encode())]
+        envoye = False
+
+        async def recevoir():
+            nonlocal envoye
+            if not envoye:
+                envoye = True
+                return {"type": "http.request", "body": corps, "more_body": False}
+            return await receive()
+
+        await self.app(scope, recevoir, send)
+
+
+async def _repondre(send, code, message):
+    await send(
+        {
+            "type": "http.response.start",
+            "status": code,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(message)).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": message})
@@ -1,12 +1,21 @@
 import streamlit as st
 import pandas as pd
-import requests
 import numpy as np
 import matplotlib.pyplot as plt
-import seaborn as sns
+from matplotlib.colors import LogNorm
 import shap
 import plotly.graph_objects as go
 import os
+import sys
+
+# Racine du dépôt dans le chemin d'import (lancement par `streamlit run api/dashbord_streamlit.py`)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from api.agregats import densite_2d, histogramme, rang_centile
+from api.client_api import client_partage
+from api.donnees_dashboard import jeu_donnees
+
+# Client HTTP partagé (pool de connexions, cache des réponses) ; URL de l'API via API_URL
+client_api = client_partage()
 
 plt.style.use('fivethirtyeight')
 
@@ -42,23 +51,26 @@ if uploaded_file is not None:
     # Création des onglets
     tab1, tab2, tab3 = st.tabs(["Info Client", "Valeurs SHAP", "Comparaison des données"])
 
+    # Fichier converti en Parquet au premier accès, colonnes en cache pour les reruns suivants
+    jeu = jeu_donnees(uploaded_file)
+
     with tab1:
-        data = pd.read_csv(uploaded_file)
+        data = jeu.donnees()
         st.write("### Aperçu des données :")
         st.dataframe(data, height=200)
 
-        id_clients = data["SK_ID_CURR"].unique().tolist()
+        id_clients = jeu.ids()
         id_selectionne = st.selectbox("Selectionner un client via son SK_ID_CURR :", id_clients)
 
         st.write("### Information du client sélectionné :")
-        # Initialisation ou changement de client
+        # Initialisation ou changement de client (recherche par index SK_ID_CURR)
         if "client_selectionne" not in st.session_state or st.session_state["client_id"] != id_selectionne:
-            st.session_state["client_selectionne"] = data[data["SK_ID_CURR"] == id_selectionne]
+            st.session_state["client_selectionne"] = jeu.client(id_selectionne)
             st.session_state["client_id"] = id_selectionne
 
         # Reset
         if st.button("Reset"):
-            st.session_state["client_selectionne"] = data[data["SK_ID_CURR"] == id_selectionne]
+            st.session_state["client_selectionne"] = jeu.client(id_selectionne)
 
         st.session_state["client_selectionne"] = st.data_editor(
             st.session_state["client_selectionne"],
@@ -80,38 +92,29 @@ if uploaded_file is not None:
 
    
         if uploaded_file is not None:
-            # Bouton Prédire
-            if st.button("Prédire"):
-                data_client = client_selectionne.drop(columns=["SK_ID_CURR"])
-                data_json = [
-                    [None if (isinstance(x, float) and (np.isnan(x) or np.isinf(x))) else x for x in row]
-                    for row in data_client.values.tolist()
-                ]
-                columns_json = data_client.columns.tolist()
-
-                try:
-                    response = requests.post(
-                        "https://projet7-credit-default-risk.azurewebsites.net/predict",
-                        #"http://127.0.0.1:8000/predict",
-                        json={"data": data_json, "columns": columns_json},
-                    )
-                    if response.status_code == 200:
-                        pred_json = response.json()
-                        st.session_state["predictions"] = pd.DataFrame({
-                            "Prediction": [pred_json["predictions"][0]],
-                            "Score Client (%)": [pred_json["probas_class_1"][0] * 100],
-                        })
-                    else:
-                        st.error(f"Erreur API : {response.status_code} - {response.text}")
-                except Exception as e:
-                    st.error(f"Erreur lors de l'appel API : {e}")
+            # Prédiction et SHAP local lancés ensemble dès la sélection (ou modification) du client.
+            # Les réponses sont en cache par ligne client : un rerun sans changement ne rappelle pas l'API.
+            data_client = client_selectionne.drop(columns=["SK_ID_CURR"])
+            try:
+                pred_json, shap_json = client_api.predire_et_expliquer(data_client)
+                st.session_state["predictions"] = pd.DataFrame({
+                    "Prediction": [pred_json["predictions"][0]],
+                    "Score Client (%)": [pred_json["probas_class_1"][0] * 100],
+                })
+                st.session_state["shap_local_values"] = np.array(shap_json["shap_values"])
+                st.session_state["shap_local_features"] = np.array(shap_json["features_transformed"])
+                st.session_state["shap_local_names"] = shap_json["feature_names"]
+                st.session_state["shap_local_base_value"] = shap_json["base_value"]
+            except Exception as e:
+                st.error(f"Erreur lors de l'appel API : {e}")
 
             # Affichage prédiction 
             if "predictions" in st.session_state:
                 st.write("### Résultat de la prédiction")
                 #st.dataframe(st.session_state["predictions"])
                 score = st.session_state["predictions"]["Score Client (%)"].values[0]               
-                seuil = 47
+                # Seuil de décision de la version servie par l'API (en %)
+                seuil = round(client_api.seuil() * 100)
 
                 # Jauge Plotly
                 fig = go.Figure(go.Indicator(
@@ -139,41 +142,46 @@ if uploaded_file is not None:
                 else:
                     st.error(f"Score client : {score:.0f} / 100 — Risque élevé (seuil = {seuil})")
 
+                # What-if : courbes du score quand une variable varie seule (une seule requête pour toutes les variantes)
+                st.write("### Sensibilité du score (what-if)")
+                colonnes_modele = list(data_client.columns)
+                colonnes_defaut = [
+                    col for col in ["AMT_CREDIT", "EXT_SOURCE_2", "EXT_SOURCE_3", "DAYS_EMPLOYED"] if col in colonnes_modele
+                ]
+                colonnes_what_if = st.multiselect("Variables à faire varier :", colonnes_modele, default=colonnes_defaut)
+                n_points = st.slider("Nombre de points par variable :", 5, 50, 20)
+
+                if colonnes_what_if:
+                    # Grilles sur les quantiles 1 % - 99 % de la population du fichier
+                    grilles = {}
+                    for col in colonnes_what_if:
+                        population = jeu.colonne(col).to_numpy(dtype=np.float64)
+                        valeurs = np.unique(np.nanquantile(population, np.linspace(0.01, 0.99, n_points)))
+                        valeurs = valeurs[~np.isnan(valeurs)]
+                        if len(valeurs) > 0:
+                            grilles[col] = valeurs.tolist()
+                    try:
+                        what_if = client_api.what_if(data_client, grilles)
+                        colonnes_graphes = st.columns(2)
+                        for i, (col, courbe) in enumerate(what_if["courbes"].items()):
+                            fig = go.Figure(go.Scatter(
+                                x=courbe["valeurs"], y=np.array(courbe["probas"]) * 100, mode="lines+markers", name=col
+                            ))
+                            fig.add_hline(y=seuil, line_dash="dash", line_color="red", annotation_text="seuil")
+                            valeur_client = data_client[col].iloc[0]
+                            if pd.notna(valeur_client):
+                                fig.add_vline(x=valeur_client, line_dash="dot", annotation_text="client")
+                            fig.update_layout(title=col, yaxis_title="Score (%)", yaxis_range=[0, 100], height=300)
+                            colonnes_graphes[i % 2].plotly_chart(fig, use_container_width=True)
+                    except Exception as e:
+                        st.error(f"Erreur lors de l'appel API : {e}")
+
 
     with tab2:
         col1, col2 = st.columns(2)
         if uploaded_file is not None:
             with col1:
-                # Bouton SHAP Local
-                if st.button("Calcul SHAP Local (Waterfall)"):
-                    data_client = client_selectionne.drop(columns=["SK_ID_CURR"])
-                    data_json = [
-                        [None if (isinstance(x, float) and (np.isnan(x) or np.isinf(x))) else x for x in row]
-                        for row in data_client.values.tolist()
-                    ]
-                    columns_json = data_client.columns.tolist()
-
-                    try:
-                        response = requests.post(
-                            "https://projet7-credit-default-risk.azurewebsites.net/shap_local",
-                            #"http://127.0.0.1:8000/shap_local",
-                            json={"data": data_json, "columns": columns_json},
-                        )
-                        if response.status_code == 200:
-                            res_json = response.json()
-
-                            # Nettoyage et extraction
-                            st.session_state["shap_local_values"] = np.array(res_json["shap_values"])
-                            st.session_state["shap_local_features"] = np.array(res_json["features_transformed"])
-                            st.session_state["shap_local_names"]  = res_json["feature_names"]
-                            st.session_state["shap_local_base_value"] = res_json["base_value"] 
-
-                        else:
-                            st.error(f"Erreur API : {response.status_code} - {response.text}")
-                            
-                    except Exception as e:
-                        st.error(f"Erreur lors de l'appel API : {e}")
-
+                # SHAP local calculé avec la prédiction à la sélection du client (onglet Info Client)
                 # Affichage Waterfall
                 if "shap_local_values" in st.session_state:
                     st.write("### Interprétation locale (SHAP - Waterfall)")
@@ -200,26 +208,26 @@ if uploaded_file is not None:
             with col2:
                 # Bouton SHAP global
                 if st.button("Calcul SHAP Global (Beeswarm)"):
-                    data_pour_api = data.drop(columns=["SK_ID_CURR"], errors="ignore")
-                    data_json = [
-                        [None if (isinstance(x, float) and (np.isnan(x) or np.isinf(x))) else x for x in row]
-                        for row in data_pour_api.values.tolist()
-                    ]
-                    columns_json = data_pour_api.columns.tolist()
-
                     try:
-                        response = requests.post(
-                            "https://projet7-credit-default-risk.azurewebsites.net/shap_global",
-                            #"http://127.0.0.1:8000/shap_global",
-                            json={"data": data_json, "columns": columns_json},
-                        )
-                        if response.status_code == 200:
+                        # SHAP précalculé pour ce fichier (échantillon à pas régulier de la population)
+                        nom_dataset = os.path.splitext(fichier_selection)[0]
+                        response = client_api.shap_global_precalcule(nom_dataset, echantillon=2000)
+
+                        # Pas d'artefact à jour : calcul à la demande sur un échantillon stratifié du fichier
+                        if response.status_code in (404, 409):
+                            res_json = client_api.shap_global(
+                                data.drop(columns=["SK_ID_CURR"], errors="ignore"), approx=True
+                            )
+                        elif response.status_code == 200:
                             res_json = response.json()
+                        else:
+                            res_json = None
+                            st.error(f"Erreur API : {response.status_code} - {response.text}")
+
+                        if res_json is not None:
                             st.session_state["shap_values"] = np.array(res_json["shap_values"])
                             st.session_state["feature_names"] = res_json["feature_names"]
                             st.session_state["features_transformed"] = np.array(res_json["features_transformed"])
-                        else:
-                            st.error(f"Erreur API : {response.status_code} - {response.text}")
                     except Exception as e:
                         st.error(f"Erreur lors de l'appel API : {e}")
 
@@ -239,40 +247,80 @@ if uploaded_file is not None:
         # filtre 
         filtre = st.radio(
             "Filtrer les clients similaires :",
-            ["Vue globale", "Même sexe", "Même tranche d'âge", "Même sexe et tranche d'âge"]
+            ["Vue globale", "Même sexe", "Même tranche d'âge", "Même sexe et tranche d'âge", "Clients les plus proches"]
         )
+        # Filtre = clé des agrégats en cache + fonction du masque, évaluée seulement au premier calcul
+        genre_client = client_selectionne["CODE_GENDER"].iloc[0]
+        age_client = client_selectionne["DAYS_BIRTH"].iloc[0]
+
+        def meme_sexe():
+            return (jeu.colonne("CODE_GENDER") == genre_client).to_numpy()
+
+        def meme_age():
+            age = jeu.colonne("DAYS_BIRTH")
+            return ((age >= age_client - 1825) & (age <= age_client + 1825)).to_numpy()
+
         if filtre == "Vue globale":
-            data_filtre = data
+            cle_filtre, masque = None, None
         elif filtre == "Même sexe":
-            data_filtre = data[data["CODE_GENDER"] == client_selectionne["CODE_GENDER"].iloc[0]]
+            cle_filtre, masque = ("sexe", genre_client), meme_sexe
         elif filtre == "Même tranche d'âge":
-            data_filtre = data[(data["DAYS_BIRTH"] >= client_selectionne['DAYS_BIRTH'].iloc[0] - 1825) & (data["DAYS_BIRTH"] <= client_selectionne['DAYS_BIRTH'].iloc[0] + 1825)]
+            cle_filtre, masque = ("age", age_client), meme_age
         elif filtre == "Même sexe et tranche d'âge":
-            data_filtre = data[(data["DAYS_BIRTH"] >= client_selectionne['DAYS_BIRTH'].iloc[0] - 1825) & (data["DAYS_BIRTH"] <= client_selectionne['DAYS_BIRTH'].iloc[0] + 1825) & (data["CODE_GENDER"] == client_selectionne["CODE_GENDER"].iloc[0])]
-
+            cle_filtre, masque = ("sexe_age", genre_client, age_client), lambda: meme_sexe() & meme_age()
+        elif filtre == "Clients les plus proches":
+            # Plus proches voisins dans l'espace des features du modèle (index construit une fois côté API)
+            col_k, col_ponderation = st.columns(2)
+            k_voisins = col_k.slider("Nombre de clients similaires :", 5, 500, 50, step=5)
+            ponderation = "shap" if col_ponderation.checkbox("Pondérer par l'importance SHAP", value=True) else "aucune"
+            try:
+                res_voisins = client_api.voisins(
+                    os.path.splitext(fichier_selection)[0],
+                    client_selectionne.drop(columns=["SK_ID_CURR"]),
+                    k=k_voisins,
+                    ponderation=ponderation,
+                    id_client=id_selectionne,
+                )
+                index_ids = jeu.index()
+                positions = [index_ids[i] for i in res_voisins["ids"] if i in index_ids]
+                cle_filtre, masque = ("voisins", tuple(positions)), lambda: positions
+            except Exception as e:
+                st.error(f"Erreur lors de l'appel API : {e}")
+                cle_filtre, masque = None, None
+
+        # Les graphiques tracent des agrégats de taille fixe (api/agregats.py), en cache par fichier et filtre
         col1, col2 = st.columns(2)
         if uploaded_file is not None:
             with col1:
                 st.write("Comparaison univariée :")
                  # 1. Liste des colonnes possibles à visualiser (hors ID)
-                features_disponibles = [col for col in data.columns if col != "SK_ID_CURR"]
+                features_disponibles = [col for col in jeu.colonnes if col != "SK_ID_CURR"]
 
                 # 2. Choix de la variable à visualiser
                 variable_choisie = st.selectbox("Choisissez une variable à comparer :", features_disponibles)
 
                 # 3. Création du graphique
                 fig, ax = plt.subplots(figsize=(8, 4))
-                
-                # Histogramme ou KDE de tous les clients
-                sns.histplot(data_filtre[variable_choisie], kde=True, color="green", bins=30, ax=ax)
+                hist = histogramme(jeu, variable_choisie, cle_filtre, masque)
+
+                # Histogramme et KDE de la population filtrée
+                if hist["comptes"]:
+                    ax.stairs(hist["comptes"], hist["bornes"], fill=True, color="green", alpha=0.5)
+                    # Densité ramenée à l'échelle des comptes (comme histplot(kde=True))
+                    echelle = (hist["n"] - hist["n_manquants"]) * (hist["bornes"][1] - hist["bornes"][0])
+                    ax.plot(hist["kde_x"], np.array(hist["kde_y"]) * echelle, color="green")
 
                 # Valeur du client
                 valeur_client = client_selectionne[variable_choisie].values[0]
                 ax.axvline(valeur_client, color="red", linestyle="--", linewidth=3, label="Client sélectionné")
-                
+
                 ax.legend(loc='upper left')
                 st.pyplot(fig)
 
+                centile = rang_centile(hist, valeur_client)
+                if centile is not None:
+                    st.caption(f"{hist['n']} clients — le client est au {centile:.0f}e centile (médiane : {hist['quantiles'][0.5]:.4g})")
+
         with col2:
             st.write("Comparaison bivariée :")
 
@@ -282,24 +330,22 @@ if uploaded_file is not None:
 
             # Création du plot
             fig, ax = plt.subplots(figsize=(6, 6))
+            densite = densite_2d(jeu, variable_x, variable_y, cle_filtre, masque)
 
-            # 1. Tous les clients 
-            sns.scatterplot(
-                data=data_filtre,
-                x=variable_x,
-                y=variable_y,
-                color="green",
-                ax=ax,
-                label="Population"
-            )
+            # 1. Population : nuage si elle est petite, grille de densité sinon
+            if densite["points"] is not None:
+                ax.scatter(densite["points"][0], densite["points"][1], color="green", s=15, label="Population")
+            elif densite["comptes"]:
+                comptes = np.ma.masked_equal(np.array(densite["comptes"]).T, 0)
+                maillage = ax.pcolormesh(densite["bornes_x"], densite["bornes_y"], comptes, cmap="Greens", norm=LogNorm())
+                fig.colorbar(maillage, ax=ax, label="Nombre de clients")
 
             # 2. Ajout du client sélectionné
-            sns.scatterplot(
-                x=client_selectionne[variable_x],
-                y=client_selectionne[variable_y],
+            ax.scatter(
+                client_selectionne[variable_x],
+                client_selectionne[variable_y],
                 color="red",
-                s=100,  
-                ax=ax,
+                s=100,
                 label="Client sélectionné"
             )
 
@@ -309,4 +355,3 @@ if uploaded_file is not None:
             ax.legend(loc='upper left')
 
             st.pyplot(fig)
-                
@@ -0,0 +1,483 @@
+"""Surveillance de la dérive des données sur le trafic de scoring.
+
+Usage : python -m api.derive [fichier.csv] [--force]  (profil de référence, défaut data/sample_clients_5k.csv)
+
+Le profil de référence fixe, pour chaque colonne d'entrée du preprocessor, des bornes
+de quantiles calculées sur l'échantillon d'entraînement (N_CASES - 1 intervalles au plus)
+et une case pour les valeurs manquantes ; les probabilités prédites ont N_CASES_PROBAS
+cases régulières sur [0, 1]. Une esquisse n'est qu'un tableau de comptages par case :
+mise à jour en un seul `np.bincount`, mémoire fixe, fusion par addition (tranches de
+temps, workers). PSI, KS et quantiles approchés sont calculés sur ces histogrammes.
+"""
+
+import argparse
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+import warnings
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from api.empreinte import empreinte_fichier
+
+chemin_fichier = os.path.dirname(__file__)
+chemin_data = os.path.abspath(os.path.join(chemin_fichier, "..", "data"))
+dossier_derive = os.path.join(chemin_fichier, "artefacts", "derive")
+chemin_reference_defaut = os.path.join(chemin_data, "sample_clients_5k.csv")
+
+N_CASES = 20
+N_CASES_PROBAS = 50
+TAILLE_BLOC = 4096
+EPSILON_PSI = 1e-4
+
+
+class EsquisseDerive:
+    """Comptages par (colonne, case) et par case de probabilité ; fusionnables par addition."""
+
+    def __init__(self, n_colonnes, n_cases=N_CASES + 1, n_cases_probas=N_CASES_PROBAS):
+        self.comptages = np.zeros((n_colonnes, n_cases), dtype=np.int64)
+        self.comptages_probas = np.zeros(n_cases_probas, dtype=np.int64)
+        self.n_lignes = 0
+
+    def ajouter(self, X, probas, bornes):
+        """Ajoute un lot : X (lignes, colonnes) float64 dans l'ordre du profil, probas (lignes,)."""
+        n_colonnes, n_cases = self.comptages.shape
+        decalages = np.arange(n_colonnes) * n_cases
+        for debut in range(0, len(X), TAILLE_BLOC):
+            bloc = X[debut : debut + TAILLE_BLOC]
+            # Case = nombre de bornes <= valeur (bornes complétées par +inf) ; NaN dans la dernière case
+            cases = (bloc[:, :, None] >= bornes[None]).sum(axis=2)
+            cases[np.isnan(bloc)] = n_cases - 1
+            self.comptages += np.bincount(
+                (cases + decalages).ravel(), minlength=n_colonnes * n_cases
+            ).reshape(n_colonnes, n_cases)
+        cases_probas = np.clip(
+            (np.asarray(probas) * len(self.comptages_probas)).astype(np.intp),
+            0,
+            len(self.comptages_probas) - 1,
+        )
+        self.comptages_probas += np.bincount(
+            cases_probas, minlength=len(self.comptages_probas)
+        )
+        self.n_lignes += len(X)
+
+    def fusionner(self, autre):
+        self.comptages += autre.comptages
+        self.comptages_probas += autre.comptages_probas
+        self.n_lignes += autre.n_lignes
+        return self
+
+    def exporter(self, chemin, **meta):
+        # Écriture atomique : un autre worker ne lit jamais un fichier à moitié écrit
+        temporaire = f"{chemin}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporaire, "wb") as file:
+            np.savez(
+                file,
+                comptages=self.comptages,
+                comptages_probas=self.comptages_probas,
+                n_lignes=self.n_lignes,
+                meta=json.dumps(meta),
+            )
+        os.replace(temporaire, chemin)
+
+    @classmethod
+    def charger(cls, chemin):
+        """(esquisse, meta) depuis un fichier écrit par `exporter`."""
+        with np.load(chemin) as contenu:
+            esquisse = cls(
+                *contenu["comptages"].shape, len(contenu["comptages_probas"])
+            )
+            esquisse.comptages += contenu["comptages"]
+            esquisse.comptages_probas += contenu["comptages_probas"]
+            esquisse.n_lignes = int(contenu["n_lignes"])
+            return esquisse, json.loads(str(contenu["meta"]))
+
+
+def psi(reference, courant):
+    """Population Stability Index par ligne de deux tableaux de comptages (colonnes x cases)."""
+    p = np.maximum(
+        reference / np.maximum(reference.sum(axis=-1, keepdims=True), 1), EPSILON_PSI
+    )
+    q = np.maximum(
+        courant / np.maximum(courant.sum(axis=-1, keepdims=True), 1), EPSILON_PSI
+    )
+    return ((q - p) * np.log(q / p)).sum(axis=-1)
+
+
+def ks(reference, courant):
+    """Statistique de Kolmogorov-Smirnov sur les histogrammes (écart maximal des fonctions de répartition)."""
+    p = np.cumsum(reference, axis=-1) / np.maximum(
+        reference.sum(axis=-1, keepdims=True), 1
+    )
+    q = np.cumsum(courant, axis=-1) / np.maximum(courant.sum(axis=-1, keepdims=True), 1)
+    return np.abs(p - q).max(axis=-1)
+
+
+class ProfilReference:
+    """Bornes des cases et esquisse de l'échantillon de référence."""
+
+    def __init__(self, colonnes, bornes, minimums, maximums, esquisse, meta):
+        self.colonnes = list(colonnes)
+        self.bornes = bornes  # (colonnes, N_CASES - 1), complétées par +inf
+        self.minimums = minimums
+        self.maximums = maximums
+        self.esquisse = esquisse
+        self.meta = meta
+
+    @classmethod
+    def construire(cls, X_input, probas, **meta):
+        X = X_input.to_numpy(dtype=np.float64)
+        bornes = np.full((X.shape[1], N_CASES - 1), np.inf)
+        with warnings.catch_warnings():
+            # Colonnes entièrement manquantes : quantiles, minimum et maximum à NaN
+            warnings.simplefilter("ignore", RuntimeWarning)
+            quantiles = np.nanquantile(
+                X, np.linspace(0, 1, N_CASES + 1)[1:-1], axis=0
+            ).T
+            minimums, maximums = np.nanmin(X, axis=0), np.nanmax(X, axis=0)
+        for j, ligne in enumerate(quantiles):
+            # Colonnes discrètes : bornes dupliquées retirées, cases inutilisées à +inf
+            uniques = np.unique(ligne[~np.isnan(ligne)])
+            bornes[j, : len(uniques)] = uniques
+        esquisse = EsquisseDerive(X.shape[1])
+        esquisse.ajouter(X, probas, bornes)
+        return cls(X_input.columns, bornes, minimums, maximums, esquisse, meta)
+
+    def sauvegarder(self, dossier=dossier_derive):
+        """Écrit le profil ; chaque fichier est écrit à part puis renommé : un lecteur ne voit jamais de fichier partiel."""
+        os.makedirs(dossier, exist_ok=True)
+        suffixe = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        chemin_bornes = os.path.join(dossier, "bornes.npz")
+        with open(chemin_bornes + suffixe, "wb") as file:
+            np.savez(
+                file, bornes=self.bornes, minimums=self.minimums, maximums=self.maximums
+            )
+        os.replace(chemin_bornes + suffixe, chemin_bornes)
+        self.esquisse.exporter(os.path.join(dossier, "reference.npz"))
+
+        # meta.json publié en dernier : un profil sans meta est considéré comme absent
+        chemin_meta = os.path.join(dossier, "meta.json")
+        with open(chemin_meta + suffixe, "w", encoding="utf-8") as file:
+            json.dump({**self.meta, "colonnes": self.colonnes}, file, indent=2)
+        os.replace(chemin_meta + suffixe, chemin_meta)
+
+    @classmethod
+    def charger(cls, dossier=dossier_derive):
+        chemin_meta = os.path.join(dossier, "meta.json")
+        if not os.path.exists(chemin_meta):
+            return None
+        with open(chemin_meta, encoding="utf-8") as file:
+            meta = json.load(file)
+        esquisse, _ = EsquisseDerive.charger(os.path.join(dossier, "reference.npz"))
+        with np.load(os.path.join(dossier, "bornes.npz")) as contenu:
+            bornes, minimums, maximums = (
+                contenu["bornes"],
+                contenu["minimums"],
+                contenu["maximums"],
+            )
+        return cls(meta.pop("colonnes"), bornes, minimums, maximums, esquisse, meta)
+
+    def quantiles(self, comptages, q):
+        """Quantiles approchés par colonne, interpolés linéairement dans les cases (valeurs manquantes exclues)."""
+        presents = comptages[:, :-1].astype(np.float64)
+        cumul = np.cumsum(presents, axis=1)
+        total = cumul[:, -1:]
+        # Bords des cases : minimum de référence, bornes finies, maximum de référence
+        bords = np.column_stack(
+            [
+                self.minimums,
+                np.where(np.isinf(self.bornes), np.nan, self.bornes),
+                self.maximums,
+            ]
+        )
+        resultats = np.full((len(comptages), len(q)), np.nan)
+        for j in np.flatnonzero(total[:, 0] > 0):
+            bords_j = bords[j][~np.isnan(bords[j])]
+            cumul_j = cumul[j, : len(bords_j) - 1] / total[j, 0]
+            # Fonction de répartition linéaire par morceaux entre les bords
+            resultats[j] = np.interp(
+                q, np.concatenate([[0.0], cumul_j]), bords_j[: len(cumul_j) + 1]
+            )
+        return resultats
+
+
+def construire_profil(chemin_csv, version):
+    """Profil de référence d'un fichier de clients pour une version du modèle."""
+    data = pd.read_csv(chemin_csv)
+    X_input = data[version.colonnes_entree]
+    return ProfilReference.construire(
+        X_input,
+        version.predire_probas(X_input),
+        fichier=os.path.basename(chemin_csv),
+        empreinte_donnees=empreinte_fichier(chemin_csv),
+        empreinte_modele=version.empreinte,
+        n_lignes=len(data),
+        cree_le=time.strftime("%Y-%m-%dT%H:%M:%S"),
+    )
+
+
+def profil_reference(chemin_csv, version, dossier=dossier_derive, force=False):
+    """Profil sauvegardé s'il est à jour (données et modèle), reconstruit et sauvegardé sinon."""
+    profil = None if force else ProfilReference.charger(dossier)
+    if (
+        profil is None
+        or profil.colonnes != version.colonnes_entree
+        or profil.meta.get("empreinte_modele") != version.empreinte
+        or profil.meta.get("empreinte_donnees") != empreinte_fichier(chemin_csv)
+    ):
+        profil = construire_profil(chemin_csv, version)
+        profil.sauvegarder(dossier)
+    return profil
+
+
+class MoniteurDerive:
+    """Esquisses du trafic par tranches de temps, mises à jour hors du chemin de la requête.
+
+    `soumettre` ne fait que déposer le lot dans une file traitée par un thread (lots
+    ignorés au-delà de `max_lots` en attente). Chaque worker publie la somme de ses
+    tranches dans `dossier_partage` toutes les `intervalle_publication` secondes ;
+    `esquisse_globale` y ajoute celles des autres workers encore actifs (fichier
+    mis à jour depuis moins de 3 intervalles). Un worker retire son fichier à sa
+    sortie ; ceux des workers arrêtés sans le faire sont supprimés après une fenêtre.
+    """
+
+    def __init__(
+        self,
+        profil,
+        duree_tranche=300.0,
+        n_tranches=12,
+        dossier_partage=None,
+        intervalle_publication=10.0,
+        max_lots=64,
+    ):
+        self.profil = profil
+        self.duree_tranche = duree_tranche
+        self.n_tranches = n_tranches
+        self.dossier_partage = dossier_partage
+        self.intervalle_publication = intervalle_publication
+        self.max_lots = max_lots
+        self.tranches = deque()  # (début de tranche, esquisse)
+        self.lots_ignores = 0
+        self.erreurs = 0
+        self._lots_en_attente = 0
+        self._verrou = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="derive")
+        if dossier_partage:
+            os.makedirs(dossier_partage, exist_ok=True)
+        self.chemin_publication = (
+            os.path.join(dossier_partage, f"worker-{os.getpid()}.npz")
+            if dossier_partage
+            else None
+        )
+        if self.chemin_publication is not None:
+            atexit.register(self.retirer_publication)
+
+    @property
+    def fenetre(self):
+        return self.duree_tranche * self.n_tranches
+
+    def soumettre(self, X_input, probas):
+        with self._verrou:
+            if self._lots_en_attente >= self.max_lots:
+                self.lots_ignores += 1
+                return
+            self._lots_en_attente += 1
+        self._executor.submit(self._ajouter, X_input, np.asarray(probas))
+
+    def _ajouter(self, X_input, probas):
+        try:
+            colonnes = self.profil.colonnes
+            if list(X_input.columns) != colonnes:
+                X_input = X_input[colonnes]
+            X = X_input.to_numpy(dtype=np.float64)
+            self._tranche_courante().ajouter(X, probas, self.profil.bornes)
+        except (KeyError, TypeError, ValueError) as e:
+            # Colonnes manquantes ou valeurs non numériques : lot ignoré, compté dans `erreurs`
+            self.erreurs += 1
+            print(f"Suivi de la dérive en erreur : {e}")
+        finally:
+            with self._verrou:
+                self._lots_en_attente -= 1
+
+    def _tranche_courante(self):
+        maintenant = time.time()
+        debut = maintenant - maintenant % self.duree_tranche
+        with self._verrou:
+            if not self.tranches or self.tranches[-1][0] != debut:
+                self.tranches.append(
+                    (debut, EsquisseDerive(*self.profil.esquisse.comptages.shape))
+                )
+            while self.tranches and self.tranches[0][0] <= maintenant - self.fenetre:
+                self.tranches.popleft()
+            return self.tranches[-1][1]
+
+    def attendre(self):
+        # Attend les lots déjà soumis (tests, publication)
+        self._executor.submit(lambda: None).result()
+
+    def reinitialiser(self):
+        self.attendre()
+        with self._verrou:
+            self.tranches.clear()
+
+    def esquisse_locale(self):
+        """Somme des tranches de la fenêtre (copie, lue dans le thread de mise à jour)."""
+
+        def sommer():
+            self._tranche_courante()
+            with self._verrou:
+                esquisses = [esquisse for _, esquisse in self.tranches]
+            total = EsquisseDerive(*self.profil.esquisse.comptages.shape)
+            for esquisse in esquisses:
+                total.fusionner(esquisse)
+            return total
+
+        return self._executor.submit(sommer).result()
+
+    def publier(self):
+        if self.chemin_publication is not None:
+            self.esquisse_locale().exporter(
+                self.chemin_publication, pid=os.getpid(), date=time.time()
+            )
+
+    def retirer_publication(self):
+        """Supprime le fichier publié par ce worker (appelé à la sortie du processus)."""
+        if self.chemin_publication is not None:
+            try:
+                os.remove(self.chemin_publication)
+            except FileNotFoundError:
+                pass
+
+    def publier_en_continu(self):
+        """Thread de fond qui publie l'esquisse locale toutes les `intervalle_publication` secondes."""
+
+        def boucle():
+            while True:
+                time.sleep(self.intervalle_publication)
+                try:
+                    self.publier()
+                except (OSError, ValueError) as e:
+                    print(f"Publication de l'esquisse de dérive impossible : {e}")
+
+        threading.Thread(target=boucle, name="publication-derive", daemon=True).start()
+
+    def esquisse_globale(self):
+        """(esquisse fusionnée de tous les workers, nombre de workers)."""
+        total = self.esquisse_locale()
+        workers = 1
+        if self.dossier_partage:
+            maintenant = time.time()
+            limite = maintenant - 3 * self.intervalle_publication
+            for chemin in glob.glob(os.path.join(self.dossier_partage, "worker-*.npz")):
+                if chemin == self.chemin_publication:
+                    continue
+                try:
+                    date = os.path.getmtime(chemin)
+                    if date < maintenant - self.fenetre:
+                        # Worker arrêté sans retirer son fichier (arrêt brutal) : plus rien à fusionner
+                        os.remove(chemin)
+                except FileNotFoundError:
+                    # Supprimé entre-temps par un autre worker
+                    continue
+                if date < limite:
+                    continue
+                try:
+                    esquisse, _ = EsquisseDerive.charger(chemin)
+                except (OSError, ValueError, KeyError) as e:
+                    # Fichier illisible (remplacé pendant la lecture, dossier corrompu) : worker ignoré
+                    print(f"Esquisse de dérive {chemin} ignorée : {e}")
+                    continue
+                if esquisse.comptages.shape == total.comptages.shape:
+                    total.fusionner(esquisse)
+                    workers += 1
+        return total, workers
+
+    def rapport(self, top=10, seuil_alerte=0.2, tous_workers=True):
+        """Scores PSI / KS par colonne et sur les probabilités, colonnes les plus dérivantes en tête."""
+        esquisse, workers = (
+            self.esquisse_globale() if tous_workers else (self.esquisse_locale(), 1)
+        )
+        reference = self.profil.esquisse
+        psi_colonnes = psi(reference.comptages, esquisse.comptages)
+        ks_colonnes = ks(reference.comptages[:, :-1], esquisse.comptages[:, :-1])
+        manquants_ref = reference.comptages[:, -1] / max(reference.n_lignes, 1)
+        manquants = esquisse.comptages[:, -1] / max(esquisse.n_lignes, 1)
+        medianes_ref = self.profil.quantiles(reference.comptages, [0.5])[:, 0]
+        medianes = self.profil.quantiles(esquisse.comptages, [0.5])[:, 0]
+
+        ordre = (
+            np.argsort(-psi_colonnes, kind="stable")[:top] if esquisse.n_lignes else []
+        )
+        return {
+            "n_lignes": esquisse.n_lignes,
+            "n_reference": reference.n_lignes,
+            "workers": workers,
+            "fenetre_s": self.fenetre,
+            "reference": self.profil.meta,
+            "lots_ignores": self.lots_ignores,
+            "probas": {
+                "psi": float(psi(reference.comptages_probas, esquisse.comptages_probas))
+                if esquisse.n_lignes
+                else None,
+                "ks": float(ks(reference.comptages_probas, esquisse.comptages_probas))
+                if esquisse.n_lignes
+                else None,
+            },
+            "psi_max": float(psi_colonnes.max()) if esquisse.n_lignes else None,
+            "colonnes_en_alerte": int((psi_colonnes > seuil_alerte).sum())
+            if esquisse.n_lignes
+            else 0,
+            "colonnes": [
+                {
+                    "colonne": self.profil.colonnes[j],
+                    "psi": float(psi_colonnes[j]),
+                    "ks": float(ks_colonnes[j]),
+                    "manquants_reference": float(manquants_ref[j]),
+                    "manquants": float(manquants[j]),
+                    "mediane_reference": _float_ou_none(medianes_ref[j]),
+                    "mediane": _float_ou_none(medianes[j]),
+                }
+                for j in ordre
+            ],
+        }
+
+
+def _float_ou_none(valeur):
+    return None if np.isnan(valeur) else float(valeur)
+
+
+def main():
+    from api.registre import VersionModele
+
+    parser = argparse.ArgumentParser(
+        description="Profil de référence pour le suivi de la dérive"
+    )
+    parser.add_argument(
+        "fichier",
+        nargs="?",
+        default=chemin_reference_defaut,
+        help="échantillon d'entraînement (CSV)",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="recalculer même si à jour"
+    )
+    args = parser.parse_args()
+
+    version = VersionModele(
+        "model", os.path.join(chemin_fichier, "models", "model.pkl")
+    )
+    debut = time.perf_counter()
+    profil = profil_reference(args.fichier, version, force=args.force)
+    print(
+        f"{args.fichier} -> {dossier_derive} ({profil.esquisse.n_lignes} lignes, {time.perf_counter() - debut:.1f} s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
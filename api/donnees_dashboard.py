@@ -0,0 +1,183 @@
+"""Couche de données du dashboard : fichiers clients convertis une fois en Parquet,
+colonnes chargées à la demande et gardées dans un cache commun au processus.
+
+Streamlit réexécute le script à chaque interaction ; ce module étant importé une
+seule fois, les reruns relisent les colonnes en mémoire au lieu du CSV.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+chemin_fichier = os.path.dirname(__file__)
+dossier_colonnaire = os.path.join(chemin_fichier, "artefacts", "donnees")
+
+COLONNE_ID = "SK_ID_CURR"
+TAILLE_ROW_GROUP = 50_000
+
+
+class CacheMemoire:
+    """Cache LRU borné en mémoire (octets estimés des Series/DataFrames stockés)."""
+
+    def __init__(self, max_octets):
+        self.max_octets = max_octets
+        self._entrees = OrderedDict()  # clé -> (valeur, octets)
+        self._octets = 0
+        self._verrou = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def obtenir(self, cle, charger):
+        with self._verrou:
+            entree = self._entrees.get(cle)
+            if entree is not None:
+                self._entrees.move_to_end(cle)
+                self.hits += 1
+                return entree[0]
+            self.misses += 1
+
+        valeur = charger()
+        octets = _taille(valeur)
+        with self._verrou:
+            ancienne = self._entrees.pop(cle, None)
+            if ancienne is not None:
+                self._octets -= ancienne[1]
+            self._entrees[cle] = (valeur, octets)
+            self._octets += octets
+            # Éviction LRU ; l'entrée qui vient d'être chargée est toujours gardée
+            while self._octets > self.max_octets and len(self._entrees) > 1:
+                _, (_, octets_evinces) = self._entrees.popitem(last=False)
+                self._octets -= octets_evinces
+                self.evictions += 1
+        return valeur
+
+    def invalider(self, prefixe):
+        """Supprime les entrées dont la clé commence par `prefixe` (tuple)."""
+        with self._verrou:
+            for cle in [c for c in self._entrees if c[: len(prefixe)] == prefixe]:
+                self._octets -= self._entrees.pop(cle)[1]
+
+    def stats(self):
+        with self._verrou:
+            return {
+                "entrees": len(self._entrees),
+                "octets": self._octets,
+                "max_octets": self.max_octets,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def _taille(valeur):
+    if isinstance(valeur, (pd.DataFrame, pd.Series)):
+        taille = valeur.memory_usage(deep=True, index=True)
+        return int(taille.sum()) if isinstance(taille, pd.Series) else int(taille)
+    if isinstance(valeur, dict):
+        return 100 * len(valeur)
+    if isinstance(valeur, list):
+        return 40 * len(valeur)
+    return 0
+
+
+def convertir_parquet(chemin_csv, dossier=dossier_colonnaire):
+    """Chemin du Parquet du fichier ; (re)conversion si absent ou plus ancien que le CSV."""
+    nom = os.path.splitext(os.path.basename(chemin_csv))[0]
+    chemin_parquet = os.path.join(dossier, f"{nom}.parquet")
+    if os.path.exists(chemin_parquet) and os.path.getmtime(
+        chemin_parquet
+    ) >= os.path.getmtime(chemin_csv):
+        return chemin_parquet
+
+    os.makedirs(dossier, exist_ok=True)
+    data = pd.read_csv(chemin_csv)
+    # Écriture dans un fichier temporaire puis renommage : pas de Parquet partiel lu par un autre rerun
+    temporaire = f"{chemin_parquet}.{os.getpid()}.tmp"
+    data.to_parquet(temporaire, index=False, row_group_size=TAILLE_ROW_GROUP)
+    os.replace(temporaire, chemin_parquet)
+    return chemin_parquet
+
+
+class JeuDonnees:
+    """Fichier client au format colonnaire, indexé par SK_ID_CURR."""
+
+    def __init__(self, chemin_csv, cache, dossier=dossier_colonnaire):
+        self.chemin_csv = chemin_csv
+        self.cache = cache
+        self.chemin_parquet = convertir_parquet(chemin_csv, dossier)
+        self.version = os.path.getmtime(self.chemin_parquet)
+
+        import pyarrow.parquet as pq
+
+        fichier = pq.ParquetFile(self.chemin_parquet)
+        self.colonnes = fichier.schema_arrow.names
+        self.n_lignes = fichier.metadata.num_rows
+
+    def _cle(self, *elements):
+        return (self.chemin_parquet, self.version, *elements)
+
+    def colonne(self, nom):
+        """Series d'une colonne, lue seule dans le Parquet au premier accès."""
+
+        def charger():
+            return pd.read_parquet(self.chemin_parquet, columns=[nom])[nom]
+
+        return self.cache.obtenir(self._cle("colonne", nom), charger)
+
+    def donnees(self, colonnes=None):
+        """DataFrame des colonnes demandées (toutes par défaut), dans l'ordre du fichier.
+
+        Assemblé à chaque appel, sans copie, à partir des colonnes en cache : les données
+        ne sont gardées (et comptées dans la limite du cache) qu'une seule fois.
+        """
+        colonnes = list(self.colonnes if colonnes is None else colonnes)
+        if not colonnes:
+            return pd.DataFrame(index=pd.RangeIndex(self.n_lignes))
+        return pd.concat([self.colonne(nom) for nom in colonnes], axis=1, copy=False)
+
+    def index(self):
+        """SK_ID_CURR -> position de la ligne."""
+
+        def charger():
+            ids = self.colonne(COLONNE_ID).tolist()
+            return dict(zip(ids, range(len(ids))))
+
+        return self.cache.obtenir(self._cle("index"), charger)
+
+    def ids(self):
+        """Liste des SK_ID_CURR uniques (ordre du fichier), pour les listes de sélection."""
+        return self.cache.obtenir(
+            self._cle("ids"), lambda: self.colonne(COLONNE_ID).unique().tolist()
+        )
+
+    def agregat(self, cle, calculer):
+        """Valeur dérivée du fichier (ex : agrégats de l'onglet 3), calculée une fois puis gardée
+        dans le même cache que les colonnes ; `cle` (tuple) l'identifie pour ce fichier."""
+        return self.cache.obtenir(self._cle("agregat", *cle), calculer)
+
+    def client(self, id_client, colonnes=None):
+        """DataFrame d'une ligne pour le client, sans parcours du fichier."""
+        position = self.index()[id_client]
+        return self.donnees(colonnes).iloc[[position]]
+
+
+# Cache commun à tous les fichiers (limite : DASHBOARD_CACHE_MO, 512 Mo par défaut)
+cache_donnees = CacheMemoire(
+    int(float(os.environ.get("DASHBOARD_CACHE_MO", "512")) * 1024 * 1024)
+)
+_jeux = {}
+_verrou_jeux = threading.Lock()
+
+
+def jeu_donnees(chemin_csv):
+    """JeuDonnees partagé du fichier ; recréé si le CSV a été modifié depuis la conversion."""
+    with _verrou_jeux:
+        jeu = _jeux.get(chemin_csv)
+        if jeu is None or os.path.getmtime(chemin_csv) > jeu.version:
+            if jeu is not None:
+                cache_donnees.invalider((jeu.chemin_parquet,))
+            jeu = _jeux[chemin_csv] = JeuDonnees(chemin_csv, cache_donnees)
+        return jeu
@@ -0,0 +1,10 @@
+import hashlib
+
+
+def empreinte_fichier(chemin, taille_bloc=1 << 20):
+    """Empreinte courte (SHA-256, 16 caractères hexadécimaux) du contenu d'un fichier."""
+    h = hashlib.sha256()
+    with open(chemin, "rb") as file:
+        for bloc in iter(lambda: file.read(taille_bloc), b""):
+            h.update(bloc)
+    return h.hexdigest()[:16]
@@ -0,0 +1,81 @@
+import json
+
+import numpy as np
+
+# Types de contenu acceptés par l'endpoint colonnaire
+TYPE_ARROW = "application/vnd.apache.arrow.stream"
+TYPE_FLOAT64 = "application/octet-stream"
+
+
+def decoder_float64(corps, colonnes, colonnes_modele):
+    """Décode des buffers float64 little-endian concaténés colonne par colonne.
+
+    `colonnes` est le manifeste (ordre des buffers dans le corps). Renvoie une
+    matrice (n_colonnes_modele, n_lignes) dans l'ordre attendu par le modèle.
+    """
+    if not colonnes:
+        raise ValueError("manifeste de colonnes vide")
+    if len(corps) % (8 * len(colonnes)) != 0:
+        raise ValueError(
+            f"taille du corps ({len(corps)} octets) incompatible avec {len(colonnes)} colonnes float64"
+        )
+    n_lignes = len(corps) // (8 * len(colonnes))
+    buffers = np.frombuffer(corps, dtype="<f8").reshape(len(colonnes), n_lignes)
+    return buffers[_positions(colonnes, colonnes_modele)]
+
+
+def decoder_arrow(corps, colonnes_modele):
+    """Décode un flux Arrow IPC en matrice (n_colonnes_modele, n_lignes) float64."""
+    import pyarrow as pa
+
+    table = pa.ipc.open_stream(corps).read_all()
+    positions = _positions(table.column_names, colonnes_modele)
+
+    matrice = np.empty((len(colonnes_modele), table.num_rows), dtype=np.float64)
+    for i, pos in enumerate(positions):
+        # Les valeurs nulles deviennent NaN, comme les None du JSON
+        matrice[i] = table.column(int(pos)).cast(pa.float64()).to_numpy()
+    return matrice
+
+
+def encoder_float64(probas, predictions):
+    """Encode les résultats : probas float64 puis décisions int8 (little-endian)."""
+    return (
+        np.ascontiguousarray(probas, dtype="<f8").tobytes()
+        + np.ascontiguousarray(predictions, dtype=np.int8).tobytes()
+    )
+
+
+def encoder_arrow(probas, predictions):
+    """Encode les résultats en flux Arrow IPC (colonnes `probas_class_1` et `predictions`)."""
+    import pyarrow as pa
+
+    table = pa.table(
+        {
+            "probas_class_1": pa.array(np.asarray(probas, dtype=np.float64)),
+            "predictions": pa.array(np.asarray(predictions, dtype=np.int8)),
+        }
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def lire_manifeste(entete):
+    """Lit le manifeste de colonnes envoyé en en-tête (liste JSON ou noms séparés par des virgules)."""
+    if entete is None:
+        raise ValueError("en-tête X-Colonnes manquant")
+    entete = entete.strip()
+    if entete.startswith("["):
+        return json.loads(entete)
+    return [col.strip() for col in entete.split(",") if col.strip()]
+
+
+def _positions(colonnes, colonnes_modele):
+    # Position de chaque colonne du modèle dans le manifeste reçu
+    index = {col: i for i, col in enumerate(colonnes)}
+    manquantes = [col for col in colonnes_modele if col not in index]
+    if manquantes:
+        raise ValueError(f"colonnes manquantes : {manquantes[:5]}")
+    return np.array([index[col] for col in colonnes_modele])
@@ -0,0 +1,125 @@
+"""Formats compacts des réponses SHAP (paramètre `mode` de /shap_global et /shap_local).
+
+- complet : matrices complètes en JSON (comportement historique) ;
+- top_k   : les K features les plus influentes, par ligne ou globalement (moyenne |SHAP|) ;
+- resume  : résumé de beeswarm, quantiles des SHAP par classe de valeur de chaque feature ;
+- binaire : matrices float32 little-endian brutes, dimensions dans les en-têtes.
+"""
+
+import json
+
+import numpy as np
+
+MODES_SHAP = ("complet", "top_k", "resume", "binaire")
+PORTEES_TOP_K = ("ligne", "global")
+QUANTILES_RESUME = (0.05, 0.25, 0.5, 0.75, 0.95)
+TYPE_SHAP_FLOAT32 = "application/octet-stream"
+
+
+def importance(shap_values):
+    """Moyenne des |SHAP| par feature."""
+    return np.abs(shap_values).mean(axis=0)
+
+
+def top_k(shap_values, features, feature_names, k, portee="ligne"):
+    """Les `k` features de plus fort |SHAP| : indices par ligne, ou mêmes colonnes pour toutes les lignes."""
+    k = min(k, shap_values.shape[1])
+    if portee == "global":
+        colonnes = np.argsort(-importance(shap_values), kind="stable")[:k]
+        return {
+            "feature_names": [feature_names[i] for i in colonnes],
+            "importance": importance(shap_values)[colonnes].tolist(),
+            "shap_values": shap_values[:, colonnes].tolist(),
+            "features_transformed": features[:, colonnes].tolist(),
+        }
+
+    # Par ligne : argpartition (O(p)) puis tri des seules K colonnes retenues
+    abs_shap = np.abs(shap_values)
+    indices = np.argpartition(-abs_shap, k - 1, axis=1)[:, :k]
+    ordre = np.argsort(
+        -np.take_along_axis(abs_shap, indices, axis=1), axis=1, kind="stable"
+    )
+    indices = np.take_along_axis(indices, ordre, axis=1)
+    return {
+        "feature_names": feature_names,
+        "indices": indices.tolist(),
+        "shap_values": np.take_along_axis(shap_values, indices, axis=1).tolist(),
+        "features_transformed": np.take_along_axis(features, indices, axis=1).tolist(),
+    }
+
+
+def resume_beeswarm(shap_values, features, feature_names, bins=10, max_features=20):
+    """Pour chaque feature (par importance décroissante) : classes de valeur par quantiles,
+    effectif, valeur moyenne et quantiles des SHAP de chaque classe."""
+    importances = importance(shap_values)
+    resume = []
+    for j in np.argsort(-importances, kind="stable")[:max_features]:
+        valeurs, shap_j = features[:, j], shap_values[:, j]
+        bornes = np.unique(np.quantile(valeurs, np.linspace(0, 1, bins + 1)))
+        n_classes = max(len(bornes) - 1, 1)
+        classes = np.clip(
+            np.searchsorted(bornes[1:-1], valeurs, side="right"), 0, n_classes - 1
+        )
+
+        # Tri par (classe, shap) : les quantiles de chaque classe sont lus par position
+        ordre = np.lexsort((shap_j, classes))
+        shap_trie = shap_j[ordre]
+        effectifs = np.bincount(classes, minlength=n_classes)
+        debuts = np.concatenate([[0], np.cumsum(effectifs)[:-1]])
+        non_vides = effectifs > 0
+        quantiles = {}
+        for q in QUANTILES_RESUME:
+            positions = debuts + np.floor(q * (effectifs - 1)).astype(int)
+            quantiles[str(q)] = np.where(
+                non_vides, shap_trie[np.clip(positions, 0, len(shap_trie) - 1)], 0.0
+            ).tolist()
+
+        sommes = np.bincount(classes, weights=valeurs, minlength=n_classes)
+        resume.append(
+            {
+                "feature": feature_names[j],
+                "importance": float(importances[j]),
+                "bornes": bornes.tolist(),
+                "effectifs": effectifs.tolist(),
+                "valeur_moyenne": np.divide(
+                    sommes, effectifs, out=np.zeros(n_classes), where=non_vides
+                ).tolist(),
+                "shap_quantiles": quantiles,
+            }
+        )
+    return {
+        "n_lignes": len(shap_values),
+        "quantiles": list(QUANTILES_RESUME),
+        "features": resume,
+    }
+
+
+def encoder_float32(shap_values, features, base_values):
+    """SHAP (n, p) puis features (n, p) puis base values (n,), float32 little-endian, lignes contiguës."""
+    return b"".join(
+        np.ascontiguousarray(tableau, dtype="<f4").tobytes()
+        for tableau in (shap_values, features, base_values)
+    )
+
+
+def entetes_float32(n_lignes, feature_names):
+    return {
+        "X-Lignes": str(n_lignes),
+        "X-Features": str(len(feature_names)),
+        "X-Feature-Names": json.dumps(feature_names),
+    }
+
+
+def decoder_float32(contenu, n_lignes, n_features):
+    """Inverse de `encoder_float32` : (shap_values, features, base_values) en float32."""
+    taille = n_lignes * n_features
+    tableau = np.frombuffer(contenu, dtype="<f4")
+    if len(tableau) != 2 * taille + n_lignes:
+        raise ValueError(
+            f"taille du corps incompatible avec {n_lignes} lignes x {n_features} features"
+        )
+    return (
+        tableau[:taille].reshape(n_lignes, n_features),
+        tableau[taille : 2 * taille].reshape(n_lignes, n_features),
+        tableau[2 * taille :],
+    )
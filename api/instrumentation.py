@@ -0,0 +1,288 @@
+import bisect
+import contextvars
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+# Bornes des histogrammes (secondes pour les durées, lignes pour la taille des requêtes)
+BUCKETS_DUREE = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+BUCKETS_LIGNES = (1, 2, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Étapes de la requête en cours, pour l'en-tête Server-Timing
+_etapes_requete = contextvars.ContextVar("etapes_requete", default=None)
+
+
+class Histogramme:
+    """Histogramme cumulatif (format Prometheus) + réservoir glissant pour les percentiles."""
+
+    def __init__(self, buckets, taille_reservoir=1024):
+        self.buckets = buckets
+        self.comptes = [0] * (len(buckets) + 1)  # dernier = +Inf
+        self.somme = 0.0
+        self.nombre = 0
+        self.reservoir = deque(maxlen=taille_reservoir)
+
+    def observer(self, valeur):
+        self.comptes[bisect.bisect_left(self.buckets, valeur)] += 1
+        self.somme += valeur
+        self.nombre += 1
+        self.reservoir.append(valeur)
+
+    def quantiles(self, quantiles=QUANTILES):
+        valeurs = sorted(self.reservoir)
+        if not valeurs:
+            return {}
+        return {
+            q: valeurs[min(len(valeurs) - 1, int(q * len(valeurs)))] for q in quantiles
+        }
+
+
+class Metriques:
+    """Durées par étape et par endpoint, lignes par requête, requêtes en cours.
+
+    Avec `actif=False`, les étapes et les lignes ne sont pas mesurées (référence
+    sans instrumentation pour en mesurer le coût).
+    """
+
+    def __init__(self, actif=True):
+        self.actif = actif
+        self._verrou = threading.Lock()
+        self.durees = {}  # (endpoint, étape) -> Histogramme
+        self.lignes = {}  # endpoint -> Histogramme
+        self.requetes = Counter()  # (endpoint, code HTTP) -> nombre
+        self.en_cours = 0
+        self._collecteurs = []  # fonctions renvoyant des lignes Prometheus supplémentaires
+
+    @contextmanager
+    def etape(self, endpoint, nom):
+        if not self.actif:
+            yield
+            return
+        debut = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observer_duree(endpoint, nom, time.perf_counter() - debut)
+
+    def observer_duree(self, endpoint, nom, duree):
+        if not self.actif:
+            return
+        with self._verrou:
+            histogramme = self.durees.get((endpoint, nom))
+            if histogramme is None:
+                histogramme = self.durees[(endpoint, nom)] = Histogramme(BUCKETS_DUREE)
+            histogramme.observer(duree)
+        etapes = _etapes_requete.get()
+        if etapes is not None:
+            etapes.append((nom, duree))
+
+    def observer_lignes(self, endpoint, n):
+        if not self.actif:
+            return
+        with self._verrou:
+            histogramme = self.lignes.get(endpoint)
+            if histogramme is None:
+                histogramme = self.lignes[endpoint] = Histogramme(BUCKETS_LIGNES)
+            histogramme.observer(n)
+
+    def ajouter_collecteur(self, collecteur):
+        self._collecteurs.append(collecteur)
+
+    def exposition_prometheus(self):
+        """Texte au format d'exposition Prometheus (version 0.0.4)."""
+        lignes = []
+        with self._verrou:
+            lignes += [
+                "# HELP api_requetes_en_cours Requêtes HTTP en cours de traitement",
+                "# TYPE api_requetes_en_cours gauge",
+            ]
+            lignes.append(f"api_requetes_en_cours {self.en_cours}")
+
+            lignes += [
+                "# HELP api_requetes_total Requêtes HTTP traitées",
+                "# TYPE api_requetes_total counter",
+            ]
+            for (endpoint, code), n in sorted(self.requetes.items()):
+                lignes.append(
+                    f'api_requetes_total{{endpoint="{endpoint}",code="{code}"}} {n}'
+                )
+
+            lignes += _histogrammes(
+                "api_etape_duree_secondes",
+                "Durée des étapes par endpoint",
+                {
+                    f'endpoint="{e}",etape="{n}"': h
+                    for (e, n), h in sorted(self.durees.items())
+                },
+            )
+            lignes += _histogrammes(
+                "api_lignes_par_requete",
+                "Nombre de lignes par requête",
+                {f'endpoint="{e}"': h for e, h in sorted(self.lignes.items())},
+            )
+        for collecteur in self._collecteurs:
+            lignes += collecteur()
+        return "\n".join(lignes) + "\n"
+
+
+def _histogrammes(nom, aide, series):
+    lignes = [f"# HELP {nom} {aide}", f"# TYPE {nom} histogram"]
+    quantiles = [
+        f"# HELP {nom}_quantile Percentiles sur les dernières observations",
+        f"# TYPE {nom}_quantile gauge",
+    ]
+    for labels, histogramme in series.items():
+        cumul = 0
+        for borne, compte in zip((*histogramme.buckets, "+Inf"), histogramme.comptes):
+            cumul += compte
+            lignes.append(f'{nom}_bucket{{{labels},le="{borne}"}} {cumul}')
+        lignes.append(f"{nom}_sum{{{labels}}} {histogramme.somme}")
+        lignes.append(f"{nom}_count{{{labels}}} {histogramme.nombre}")
+        for q, valeur in histogramme.quantiles().items():
+            quantiles.append(f'{nom}_quantile{{{labels},quantile="{q}"}} {valeur}')
+    return lignes + quantiles
+
+
+class ProfileurEchantillonnage:
+    """Profileur par échantillonnage : relève périodiquement les piles de tous les threads.
+
+    Fonctionne aussi pour les handlers exécutés dans le threadpool (contrairement
+    à cProfile, limité au thread courant). Les piles inactives sont ignorées.
+    """
+
+    MODULES_INACTIFS = ("threading.py", "selectors.py", "queue.py", "base_events.py")
+
+    def __init__(self, intervalle=0.002, profondeur=12):
+        self.intervalle = intervalle
+        self.profondeur = profondeur
+        self.piles = Counter()
+        self.echantillons = 0
+        self._arret = threading.Event()
+        self._thread = threading.Thread(
+            target=self._boucle, name="profileur", daemon=True
+        )
+
+    def demarrer(self):
+        self._thread.start()
+        return self
+
+    def arreter(self):
+        self._arret.set()
+        self._thread.join()
+        return self
+
+    def _boucle(self):
+        moi = threading.get_ident()
+        while not self._arret.wait(self.intervalle):
+            self.echantillons += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == moi or frame.f_code.co_filename.endswith(
+                    self.MODULES_INACTIFS
+                ):
+                    continue
+                pile = []
+                while frame is not None and len(pile) < self.profondeur:
+                    code = frame.f_code
+                    pile.append(
+                        f"{code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno} {code.co_name}"
+                    )
+                    frame = frame.f_back
+                self.piles[tuple(pile)] += 1
+
+    def rapport(self, n=5):
+        lignes = [f"{self.echantillons} échantillons"]
+        for pile, compte in self.piles.most_common(n):
+            lignes.append(f"  {compte} x " + " <- ".join(pile[:4]))
+        return "\n".join(lignes)
+
+
+class MiddlewareInstrumentation:
+    """Middleware ASGI : requêtes en cours, durée totale, en-tête Server-Timing, profilage."""
+
+    def __init__(
+        self,
+        app,
+        metriques,
+        server_timing=False,
+        profil_taux=0.0,
+        profil_seuil_ms=1000.0,
+    ):
+        self.app = app
+        self.metriques = metriques
+        self.server_timing = server_timing
+        self.profil_taux = profil_taux
+        self.profil_seuil = profil_seuil_ms / 1000
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        metriques = self.metriques
+        etapes = []
+        jeton = _etapes_requete.set(etapes)
+        timing = self.server_timing or (b"x-server-timing", b"1") in scope.get(
+            "headers", []
+        )
+        profileur = None
+        if self.profil_taux and random.random() < self.profil_taux:
+            profileur = ProfileurEchantillonnage().demarrer()
+
+        debut = time.perf_counter()
+        code = 500
+        with metriques._verrou:
+            metriques.en_cours += 1
+
+        async def envoyer(message):
+            nonlocal code
+            if message["type"] == "http.response.start":
+                code = message["status"]
+                if timing:
+                    total = ("total", time.perf_counter() - debut)
+                    valeur = ", ".join(
+                        f"{nom};dur={duree * 1000:.2f}"
+                        for nom, duree in [*etapes, total]
+                    )
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (b"server-timing", valeur.encode()),
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, envoyer)
+        finally:
+            duree = time.perf_counter() - debut
+            route = scope.get("route")
+            endpoint = getattr(route, "path", "non_route")
+            with metriques._verrou:
+                metriques.en_cours -= 1
+                metriques.requetes[(endpoint, code)] += 1
+            metriques.observer_duree(endpoint, "total", duree)
+            _etapes_requete.reset(jeton)
+
+            if profileur is not None:
+                profileur.arreter()
+                if duree >= self.profil_seuil:
+                    print(
+                        f"Requête lente {endpoint} ({duree * 1000:.0f} ms) - profil :\n{profileur.rapport()}"
+                    )
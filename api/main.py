@@ -1,25 +1,129 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
-import pickle
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse, UJSONResponse
+from starlette.background import BackgroundTask
+from starlette.middleware.gzip import GZipMiddleware
+import asyncio
+import hashlib
+import itertools
+import json
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack
 from pydantic import BaseModel
 import pandas as pd
 import os
-import shap
 import numpy as np
 
+from api.format_colonnaire import (
+    TYPE_ARROW,
+    TYPE_FLOAT64,
+    decoder_arrow,
+    decoder_float64,
+    encoder_arrow,
+    encoder_float64,
+    lire_manifeste,
+)
+from api.cache_shap import CacheShap
+from api.compression import MiddlewareDecompression
+from api.format_shap import (
+    MODES_SHAP,
+    PORTEES_TOP_K,
+    TYPE_SHAP_FLOAT32,
+    encoder_float32,
+    entetes_float32,
+    resume_beeswarm,
+    top_k,
+)
+from api.instrumentation import Metriques, MiddlewareInstrumentation
+from api.micro_batch import MicroBatcher
+from api.pool_processus import PoolShap
+from api.precalcul_shap import ArtefactsShap, indices_page
+from api.registre import RegistreModeles
+from api.seuil import COUT_FN, COUT_FP, MAX_POINTS, CourbeSeuils, cout_au_seuil, decoder_probas_labels
+from api.shap_approx import shap_approx
+from api.voisins import IndexVoisins
+from api.what_if import construire_variantes, decouper_courbes, lire_grille
+from api.donnees_dashboard import jeu_donnees
+from api.derive import MoniteurDerive, ProfilReference, dossier_derive
+from api.scoring_lot import ENCODEURS, TAILLE_BLOC, TYPES_CONTENU, lire_blocs, scorer_blocs
+
 app = FastAPI()
 
+# Compression : corps de requête gzip décompressés, réponses compressées si le client l'accepte
+app.add_middleware(MiddlewareDecompression)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# Instrumentation : durées par étape, lignes par requête, requêtes en cours (exposées sur /metrics).
+# INSTRUMENTATION=0 la désactive (mesure de son coût avec python -m api.bench_api --sans-instrumentation)
+metriques = Metriques(actif=os.environ.get("INSTRUMENTATION", "1") == "1")
+if metriques.actif:
+    app.add_middleware(
+        MiddlewareInstrumentation,
+        metriques=metriques,
+        server_timing=os.environ.get("SERVER_TIMING", "0") == "1",
+        profil_taux=float(os.environ.get("PROFIL_TAUX", "0")),
+        profil_seuil_ms=float(os.environ.get("PROFIL_SEUIL_MS", "1000")),
+    )
+
 # Calcul du chemin absolu du modèle à partir du fichier actuel
 chemin_fichier = os.path.dirname(__file__)  # dossier où se trouve le script
-chemin_modele = os.path.join(chemin_fichier, "models", "model.pkl")
 chemin_favicon = os.path.abspath(os.path.join(chemin_fichier, "..", "assets", "favicon.ico"))
 
-# Chargement du modèle
-with open(chemin_modele, "rb") as file:
-    model = pickle.load(file)
+# Durée de chaque étape du démarrage (exposée par /health/ready)
+etapes_demarrage = {}
+
+
+def mesurer_etape(nom, debut):
+    etapes_demarrage[nom] = round(time.perf_counter() - debut, 4)
+    print(f"Démarrage - {nom} : {etapes_demarrage[nom]:.3f} s")
+
 
+# Chargement du modèle : registre des versions de api/models/ (MODELE_ACTIF, "model" par défaut).
+# Pipeline, moteur compilé (MOTEUR_COMPILE=0 pour le désactiver), preprocessor et feature_names
+# sont construits une fois par version.
+debut = time.perf_counter()
+registre = RegistreModeles(
+    os.path.join(chemin_fichier, "models"),
+    nom_actif=os.environ.get("MODELE_ACTIF", "model"),
+    moteur_compile=os.environ.get("MOTEUR_COMPILE", "1") == "1",
+)
+mesurer_etape("chargement_modele", debut)
 print("Modèle chargé")
 
+# Version chargée au démarrage (les handlers lisent registre.actif, remplacée à chaud)
+version_demarrage = registre.actif
+model = version_demarrage.pipeline
+version_modele = version_demarrage.empreinte
+chemin_modele = version_demarrage.chemin
+
+
+
+def predire_probas(X_input, trafic=False):
+    # Prédictions probabilistes (proba d'appartenir à la classe 1) de la version active
+    version = registre.actif
+    y_proba = version.predire_probas(X_input)
+    if trafic:
+        # Trafic de scoring : le candidat éventuel score le même lot et le suivi de la dérive
+        # l'ajoute à ses esquisses, tous deux en arrière-plan
+        registre.soumettre_ombre(X_input, y_proba, version.seuil)
+        if moniteur_derive is not None:
+            moniteur_derive.soumettre(X_input, y_proba)
+    return y_proba
+
+
+def appliquer_seuil(y_proba, version=None):
+    # Application du seuil métier de la version (api/models/<nom>.json, 0.47 par défaut)
+    seuil = (version or registre.actif).seuil
+    return (y_proba >= seuil).astype(int)
+
+
+def predire(X_input):
+    y_proba = predire_probas(X_input, trafic=True)
+    return appliquer_seuil(y_proba), y_proba
+
 
 @app.get("/favicon.ico")
 def favicon():
@@ -29,6 +133,47 @@ def favicon():
 def read_root():
     return {"message": "API prête avec modèle déjà en mémoire"}
 
+
+@app.get("/version")
+def version():
+    # Empreinte du modèle servi : les clients l'utilisent dans la clé de leur cache de réponses
+    version = registre.actif
+    return {"version_modele": version.empreinte, "nom": version.nom, "seuil": version.seuil}
+
+
+@app.get("/metrics")
+def metrics():
+    return Response(metriques.exposition_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+# --- Sondes de santé ---
+@app.get("/health/live")
+def health_live():
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+def health_ready(avec_shap: bool = False):
+    etat_shap = registre.actif.etat_shap()
+    pret = modele_pret and (etat_shap == "pret" or not avec_shap)
+    etat = {
+        "status": "ready" if pret else "starting",
+        "predict": modele_pret,
+        "shap": etat_shap,
+        "etapes_demarrage": etapes_demarrage,
+    }
+    return JSONResponse(etat, status_code=200 if pret else 503)
+
+
+def reponse_predictions(y_proba):
+    # Application du seuil métier puis encodage JSON
+    y_pred = appliquer_seuil(y_proba)
+    return JSONResponse({
+        "predictions": [int(y) for y in y_pred],
+        "probas_class_1": [float(p) for p in y_proba]
+    })
+
+
 # Schéma d'entrée
 class PredictRequest(BaseModel):
     data: list[list] 
@@ -36,47 +181,303 @@ class PredictRequest(BaseModel):
 
 
 @app.post("/predict")
-def predict(request: PredictRequest):
+async def predict(request: PredictRequest):
 
+    # Lots volumineux : DataFrame et rendu JSON dans le threadpool pour ne pas bloquer la boucle
+    # d'événements (ni les minuteurs du micro-batching) ; les petites requêtes restent sur la boucle
+    hors_boucle = len(request.data) >= micro_batcher.max_lignes
     try:
         # Recréer un DataFrame 
-        X_input = pd.DataFrame(request.data, columns=request.columns)
-
-        # Prédictions probabilistes
-        y_proba = model.predict_proba(X_input)[:, 1]  # proba d'appartenir à la classe 1
-
-        # Application du seuil métier 
-        seuil_optimal = 0.47
-        y_pred = (y_proba >= seuil_optimal).astype(int)
-     
-        return {
-            "predictions": [int(y) for y in y_pred],
-            "probas_class_1": [float(p) for p in y_proba]
-        }
+        with metriques.etape("/predict", "dataframe"):
+            if hors_boucle:
+                X_input = await run_in_threadpool(pd.DataFrame, request.data, columns=request.columns)
+            else:
+                X_input = pd.DataFrame(request.data, columns=request.columns)
+        metriques.observer_lignes("/predict", len(X_input))
+
+        # Prédictions probabilistes, regroupées en micro-lots avec les requêtes concurrentes
+        with metriques.etape("/predict", "score"):
+            y_proba = await micro_batcher.soumettre(X_input)
+
+        # Sérialisation mesurée jusqu'au corps JSON encodé (rendu dans le constructeur de la réponse)
+        with metriques.etape("/predict", "serialisation"):
+            if hors_boucle:
+                return await run_in_threadpool(reponse_predictions, y_proba)
+            return reponse_predictions(y_proba)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erreur lors de la prédiction : {e}")
 
-# Récupération du modèle et du preprocessor
-preprocessor = model.named_steps["preprocessor"]
-model_lgb = model.named_steps["model"]
+# Preprocessor et noms des features transformées (colonnes scalées puis passthrough) de la
+# version de démarrage ; les handlers utilisent ceux de registre.actif
+preprocessor = version_demarrage.preprocessor
+model_lgb = version_demarrage.model_lgb
+colonnes_entree_modele = version_demarrage.colonnes_entree
+feature_names = version_demarrage.feature_names
 
-# Colonnes du preprocessor en entrée
-colonnes_entree_modele = preprocessor.feature_names_in_.tolist()
+# Micro-batching de /predict (fenêtre à 0 pour désactiver)
+micro_batcher = MicroBatcher(
+    lambda X: predire_probas(X, trafic=True),
+    lambda: registre.actif.colonnes_entree,
+    fenetre_ms=float(os.environ.get("MICRO_BATCH_FENETRE_MS", "2")),
+    max_lignes=int(os.environ.get("MICRO_BATCH_MAX_LIGNES", "64")),
+)
 
-# Colonnes scalées (on récupère dynamiquement les colonnes du scaler)
-scaler = preprocessor.named_transformers_["scaler_continuous_features"]
-colonnes_scalées = scaler.get_feature_names_out()
 
-# Colonnes passthrough = toutes celles en entrée - celles qui ont été scalées
-colonnes_passthrough = [
-    col for col in colonnes_entree_modele if col not in scaler.feature_names_in_
-]
 
-# Noms finaux des features transformées
-feature_names = list(colonnes_scalées) + list(colonnes_passthrough)
+# Suivi de la dérive : esquisses du trafic comparées au profil de référence précalculé au build
+# (python -m api.derive, dans DERIVE_PROFIL). Rien n'est calculé au démarrage : sans profil
+# lisible, le suivi est désactivé et le scoring démarre normalement. Chaque worker publie
+# ses esquisses dans DERIVE_DOSSIER, /derive les fusionne.
+def charger_moniteur_derive(dossier_profil):
+    try:
+        profil = ProfilReference.charger(dossier_profil)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Profil de dérive illisible ({dossier_profil}), suivi désactivé : {e}")
+        return None
+    if profil is None:
+        print(f"Profil de dérive absent ({dossier_profil}, python -m api.derive), suivi désactivé")
+        return None
+    if profil.colonnes != version_demarrage.colonnes_entree:
+        print("Profil de dérive construit pour d'autres colonnes d'entrée, suivi désactivé")
+        return None
+    if profil.meta.get("empreinte_modele") != version_demarrage.empreinte:
+        print("Profil de dérive construit avec un autre modèle : dérive des probabilités indicative")
+    return MoniteurDerive(
+        profil,
+        duree_tranche=float(os.environ.get("DERIVE_TRANCHE_S", "300")),
+        n_tranches=int(os.environ.get("DERIVE_TRANCHES", "12")),
+        dossier_partage=os.environ.get("DERIVE_DOSSIER", os.path.join(dossier_derive, "workers")),
+        intervalle_publication=float(os.environ.get("DERIVE_PUBLICATION_S", "10")),
+    )
+
+
+moniteur_derive = None
+if os.environ.get("DERIVE", "1") == "1":
+    debut = time.perf_counter()
+    moniteur_derive = charger_moniteur_derive(os.environ.get("DERIVE_PROFIL", dossier_derive))
+    mesurer_etape("profil_derive", debut)
+
+# Warm-up : un premier appel sur une ligne vide initialise LightGBM avant la première requête
+debut = time.perf_counter()
+version_demarrage.rechauffer()
+mesurer_etape("warmup", debut)
+modele_pret = True
+
+
+# Explainer SHAP : construit en arrière-plan (import de shap compris), /predict n'attend pas
+def initialiser_explainer():
+    debut = time.perf_counter()
+    version_demarrage.initialiser_explainer()
+    if version_demarrage.explainer is not None:
+        mesurer_etape("explainer_shap", debut)
+
+
+def obtenir_explainer():
+    # Explainer de la version active (attend la fin de son initialisation si besoin)
+    return registre.actif.obtenir_explainer()
+
+
+# Pool de processus pour SHAP (POOL_PROCESSUS_WORKERS=0 : calcul dans le processus du serveur)
+nb_workers_shap = int(os.environ.get("POOL_PROCESSUS_WORKERS", "0"))
+
+if nb_workers_shap > 0 or os.environ.get("SHAP_INIT_DIFFEREE", "1") == "0":
+    # Le pool est forké depuis le thread principal : l'explainer doit exister avant
+    initialiser_explainer()
+else:
+    threading.Thread(target=initialiser_explainer, name="init-explainer-shap", daemon=True).start()
+
+# Le pool sert la version de démarrage ; après une bascule, SHAP est calculé dans le processus
+pool_shap = PoolShap(obtenir_explainer(), chemin_modele, nb_workers_shap) if nb_workers_shap > 0 else None
+
+# Threads de fond démarrés après le fork du pool : aucun verrou tenu par un thread n'est hérité par les workers
+# Surveillance des fichiers de api/models/ : rechargement et bascule à chaud (0 pour désactiver)
+intervalle_surveillance = float(os.environ.get("SURVEILLANCE_MODELES_S", "5"))
+if intervalle_surveillance > 0:
+    registre.surveiller(intervalle_surveillance)
+
+# Publication des esquisses de dérive de ce worker
+if moniteur_derive is not None:
+    moniteur_derive.publier_en_continu()
+
+# Nombre d'explications SHAP traitées en parallèle ; /predict n'est pas limité et garde la priorité
+limite_explications = asyncio.Semaphore(int(os.environ.get("LIMITE_SHAP_CONCURRENTS", "2")))
+
+
+def calculer_shap(X_transforme, version=None):
+    # Valeurs SHAP (classe 1) et base values pour les lignes données
+    version = version or registre.actif
+    if pool_shap is not None and version is version_demarrage:
+        return pool_shap.calculer(X_transforme)
+
+    shap_explanation = version.obtenir_explainer()(X_transforme)
+    shap_values = shap_explanation.values
+    base_values = shap_explanation.base_values
+    if shap_values.ndim == 3:
+        shap_values, base_values = shap_values[..., 1], base_values[..., 1]
+    return shap_values, base_values
+
+
+# Cache des explications par ligne (clé = hash ligne transformée + version du modèle)
+cache_shap = CacheShap(
+    chemin_modele,
+    max_octets=int(float(os.environ.get("CACHE_SHAP_MO", "64")) * 1024 * 1024),
+    ttl=float(os.environ.get("CACHE_SHAP_TTL_S", "3600")),
+)
+
+
+@app.get("/derive")
+def derive(top: int = 10, seuil_alerte: float = 0.2):
+    # PSI / KS du trafic récent (tous workers) par rapport au profil de référence
+    if moniteur_derive is None:
+        raise HTTPException(status_code=404, detail="Suivi de la dérive désactivé (DERIVE=0)")
+    return moniteur_derive.rapport(top=top, seuil_alerte=seuil_alerte)
+
+
+@app.get("/shap_cache/stats")
+def shap_cache_stats():
+    return cache_shap.stats()
+
+
+def collecteur_compteurs():
+    # Compteurs du cache SHAP et du micro-batcher, ajoutés à /metrics
+    return [
+        "# TYPE api_cache_shap_hits_total counter",
+        f"api_cache_shap_hits_total {cache_shap.hits}",
+        "# TYPE api_cache_shap_misses_total counter",
+        f"api_cache_shap_misses_total {cache_shap.misses}",
+        "# TYPE api_micro_batch_lots_total counter",
+        f"api_micro_batch_lots_total {micro_batcher.lots_scores}",
+        "# TYPE api_micro_batch_lignes_total counter",
+        f"api_micro_batch_lignes_total {micro_batcher.lignes_scorees}",
+    ] + collecteur_ombre() + collecteur_derive()
+
+
+def collecteur_ombre():
+    # Scoring fantôme : lignes comparées et écarts avec le candidat
+    ombre = registre.ombre.resume()
+    if ombre["candidat"] is None:
+        return []
+    labels = f'actif="{ombre["actif"]}",candidat="{ombre["candidat"]}"'
+    return [
+        "# TYPE api_ombre_lignes_total counter",
+        f"api_ombre_lignes_total{{{labels}}} {ombre['lignes']}",
+        "# TYPE api_ombre_decisions_differentes_total counter",
+        f"api_ombre_decisions_differentes_total{{{labels}}} {ombre['decisions_differentes']}",
+        "# TYPE api_ombre_ecart_abs_moyen gauge",
+        f"api_ombre_ecart_abs_moyen{{{labels}}} {ombre['ecart_abs_moyen'] or 0.0}",
+    ]
+
+
+def collecteur_derive():
+    # Dérive du trafic de ce worker (le rapport fusionné de tous les workers est servi par /derive)
+    if moniteur_derive is None:
+        return []
+    rapport = moniteur_derive.rapport(top=0, tous_workers=False)
+    return [
+        "# TYPE api_derive_lignes gauge",
+        f"api_derive_lignes {rapport['n_lignes']}",
+        "# TYPE api_derive_psi_max gauge",
+        f"api_derive_psi_max {rapport['psi_max'] or 0.0}",
+        "# TYPE api_derive_psi_probas gauge",
+        f"api_derive_psi_probas {rapport['probas']['psi'] or 0.0}",
+        "# TYPE api_derive_lots_ignores_total counter",
+        f"api_derive_lots_ignores_total {moniteur_derive.lots_ignores}",
+    ]
+
+
+# --- Administration du registre de modèles (en-tête X-Admin-Token = ADMIN_TOKEN) ---
+jeton_admin = os.environ.get("ADMIN_TOKEN")
+
+
+def verifier_admin(request: Request):
+    if not jeton_admin:
+        raise HTTPException(status_code=403, detail="Administration désactivée (ADMIN_TOKEN non défini)")
+    if request.headers.get("x-admin-token") != jeton_admin:
+        raise HTTPException(status_code=401, detail="Jeton d'administration invalide")
+
+
+@app.get("/admin/modeles")
+def admin_modeles(request: Request):
+    verifier_admin(request)
+    return registre.etat()
+
+
+@app.post("/admin/modeles/activer")
+async def admin_activer(request: Request, nom: str):
+    verifier_admin(request)
+    try:
+        # Chargement et construction de l'explainer hors boucle : le service continue sur l'ancienne version
+        ancienne = await run_in_threadpool(registre.activer, nom)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Version inconnue : {nom}")
+    return {"ancienne": ancienne.nom, **registre.etat()}
 
-# Explainer SHAP
-explainer = shap.TreeExplainer(model_lgb)
+
+@app.post("/admin/modeles/ombre")
+async def admin_ombre(request: Request, nom: str | None = None):
+    verifier_admin(request)
+    try:
+        await run_in_threadpool(registre.definir_candidat, nom)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Version inconnue : {nom}")
+    return registre.etat()
+
+
+@app.post("/admin/modeles/recharger")
+async def admin_recharger(request: Request):
+    verifier_admin(request)
+    await run_in_threadpool(registre.verifier_fichiers)
+    return registre.etat()
+
+
+@app.post("/admin/modeles/seuil")
+async def admin_seuil(request: Request, seuil: float, nom: str | None = None):
+    # Seuil de décision d'une version (active par défaut), écrit dans api/models/<nom>.json
+    verifier_admin(request)
+    try:
+        version = registre.actif if nom is None else await run_in_threadpool(registre.charger, nom)
+        version.definir_seuil(seuil)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Version inconnue : {nom}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return version.description()
+
+
+metriques.ajouter_collecteur(collecteur_compteurs)
+
+
+# --- Modes de réponse SHAP (paramètre `mode`, voir api/format_shap.py) ---
+def valider_mode_shap(mode, k, portee, bins):
+    if mode not in MODES_SHAP or portee not in PORTEES_TOP_K or k < 1 or bins < 1:
+        raise HTTPException(
+            status_code=400,
+            detail=f"mode ({'/'.join(MODES_SHAP)}), portee ({'/'.join(PORTEES_TOP_K)}), k ou bins invalide",
+        )
+
+
+def reponse_shap_compacte(mode, shap_values, features, base_values, feature_names, k, portee, bins, extra=None):
+    if mode == "binaire":
+        entetes = entetes_float32(len(shap_values), feature_names)
+        if extra and "approximation" in extra:
+            # En-tête borné : seulement les indicateurs scalaires (les listes par feature sont en JSON)
+            entetes["X-Approximation"] = json.dumps(
+                {cle: v for cle, v in extra["approximation"].items() if not isinstance(v, list)}
+            )
+        return Response(
+            encoder_float32(shap_values, features, base_values),
+            media_type=TYPE_SHAP_FLOAT32,
+            headers=entetes,
+        )
+    if mode == "top_k":
+        contenu = top_k(shap_values, features, feature_names, k, portee)
+    else:
+        contenu = resume_beeswarm(shap_values, features, feature_names, bins)
+    contenu["mode"] = mode
+    contenu["base_value"] = float(np.mean(base_values)) if len(base_values) else None
+    contenu.update(extra or {})
+    # ujson (déjà en dépendance) : encodage plus rapide que json pour les listes de floats
+    return UJSONResponse(contenu)
 
 # --- Schéma Pydantic ---
 class ShapGlobalRequest(BaseModel):
@@ -84,33 +485,83 @@ class ShapGlobalRequest(BaseModel):
     columns: list
 
 @app.post("/shap_global")
-def shap_global_endpoint(request: ShapGlobalRequest):
+async def shap_global_endpoint(
+    request: ShapGlobalRequest,
+    mode: str = "complet",
+    k: int = 10,
+    portee: str = "global",
+    bins: int = 10,
+    approx: bool = False,
+    tolerance: float = 0.05,
+    n_max: int = 4000,
+):
+    valider_mode_shap(mode, k, portee, bins)
+    if approx and (tolerance <= 0 or n_max < 1):
+        raise HTTPException(status_code=400, detail="tolerance > 0 et n_max >= 1 requis")
+    # Les requêtes au-delà de la limite attendent sans occuper de thread
+    async with limite_explications:
+        return await run_in_threadpool(
+            shap_global, request, mode, k, portee, bins, (tolerance, n_max) if approx else None
+        )
+
+
+def shap_global(request: ShapGlobalRequest, mode="complet", k=10, portee="global", bins=10, approx=None):
     try:
+        endpoint = "/shap_global"
+        version = registre.actif  # même version du modèle pour toute la requête
+
         # 1. Recréer DataFrame depuis la requête
-        df = pd.DataFrame(request.data, columns=request.columns)
-        print("df.shape =", df.shape)
+        with metriques.etape(endpoint, "dataframe"):
+            df = pd.DataFrame(request.data, columns=request.columns)
+        metriques.observer_lignes(endpoint, len(df))
 
         # 2. Transformer avec le préprocesseur
-        df_transformed = preprocessor.transform(df)
-        print("df_transformed.shape =", df_transformed.shape)
-
-        # 3. SHAP explainer
-        shap_output = explainer.shap_values(df_transformed)
-        
-        if isinstance(shap_output, list):
-            shap_values = shap_output[1]  # classe 1
+        with metriques.etape(endpoint, "transform"):
+            # float64 : les None du JSON deviennent NaN (sinon tableau object non nettoyé par nan_to_num)
+            df_transformed = version.preprocessor.transform(df).astype(np.float64)
+
+        # 3. SHAP explainer (seules les lignes absentes du cache sont calculées)
+        extra = {}
+        if approx is None:
+            with metriques.etape(endpoint, "shap"):
+                shap_values, base_values = cache_shap.explications(
+                    df_transformed, lambda X: calculer_shap(X, version), version.empreinte
+                )
         else:
-            shap_values = shap_output
-
-         # Nettoyage
-        shap_values_clean = np.nan_to_num(shap_values)
-        df_clean = np.nan_to_num(df_transformed)
-
-        return {
-            "shap_values": shap_values_clean.tolist(),
-            "feature_names": feature_names,
-            "features_transformed": df_clean.tolist()
-        }
+            # Mode approché : échantillon stratifié (décile de risque x CODE_GENDER) agrandi
+            # jusqu'à stabilité des importances, voir api/shap_approx.py
+            tolerance, n_max = approx
+            with metriques.etape(endpoint, "shap_approx"):
+                resultat = shap_approx(
+                    df_transformed,
+                    version.predire_probas(df),
+                    lambda X: cache_shap.explications(X, lambda X: calculer_shap(X, version), version.empreinte),
+                    genre=df["CODE_GENDER"].to_numpy() if "CODE_GENDER" in df else None,
+                    tolerance=tolerance,
+                    n_max=n_max,
+                )
+            shap_values, base_values = resultat["shap_values"], resultat["base_values"]
+            df_transformed = df_transformed[resultat["indices"]]
+            extra = {"indices": resultat["indices"].tolist(), "approximation": resultat["approximation"]}
+            metriques.observer_lignes(f"{endpoint}?approx", len(shap_values))
+
+        # Nettoyage
+        with metriques.etape(endpoint, "nan_to_num"):
+            shap_values_clean = np.nan_to_num(shap_values)
+            df_clean = np.nan_to_num(df_transformed)
+
+        # Sérialisation JSON (tolist + encodage) mesurée dans le handler
+        with metriques.etape(endpoint, "serialisation"):
+            if mode != "complet":
+                return reponse_shap_compacte(
+                    mode, shap_values_clean, df_clean, base_values, version.feature_names, k, portee, bins, extra
+                )
+            return JSONResponse({
+                "shap_values": shap_values_clean.tolist(),
+                "feature_names": version.feature_names,
+                "features_transformed": df_clean.tolist(),
+                **extra,
+            })
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erreur SHAP global : {e}")
@@ -121,32 +572,421 @@ class ShapLocalRequest(BaseModel):
     columns: list
 
 @app.post("/shap_local")
-def shap_local_endpoint(request: ShapLocalRequest):
+async def shap_local_endpoint(
+    request: ShapLocalRequest, mode: str = "complet", k: int = 10, portee: str = "ligne", bins: int = 10
+):
+    valider_mode_shap(mode, k, portee, bins)
+    async with limite_explications:
+        return await run_in_threadpool(shap_local, request, mode, k, portee, bins)
+
+
+def shap_local(request: ShapLocalRequest, mode="complet", k=10, portee="ligne", bins=10):
     try:
+        endpoint = "/shap_local"
+        version = registre.actif  # même version du modèle pour toute la requête
+
         # 1. Recréation DataFrame à partir de la requête
-        df = pd.DataFrame(request.data, columns=request.columns)  
-        print("Client reçu pour SHAP local :", df.shape)
+        with metriques.etape(endpoint, "dataframe"):
+            df = pd.DataFrame(request.data, columns=request.columns)
+        metriques.observer_lignes(endpoint, len(df))
 
         # 2. Prétraitement
-        df_transformed = preprocessor.transform(df)
+        with metriques.etape(endpoint, "transform"):
+            # float64 : les None du JSON deviennent NaN (sinon tableau object non nettoyé par nan_to_num)
+            df_transformed = version.preprocessor.transform(df).astype(np.float64)
 
-        # 3. SHAP local avec explainer 
-        shap_explanation = explainer(df_transformed)
+        # 3. SHAP local avec explainer (ou depuis le cache si le client a déjà été expliqué)
+        with metriques.etape(endpoint, "shap"):
+            shap_values_lignes, base_values = cache_shap.explications(
+                df_transformed, lambda X: calculer_shap(X, version), version.empreinte
+            )
 
         # 4. Récupération des valeurs SHAP pour ce client
-        shap_values = shap_explanation.values[0]
-        base_value = shap_explanation.base_values[0]
+        shap_values = shap_values_lignes[0]
+        base_value = base_values[0]
 
         # Nettoyage des valeurs avant JSON
-        shap_values_clean = np.nan_to_num(shap_values)
-        features_clean = np.nan_to_num(df_transformed[0])
-
-        return {
-            "shap_values": shap_values_clean.tolist(),
-            "feature_names": feature_names,
-            "features_transformed": features_clean.tolist(),
-            "base_value": float(base_value)
+        with metriques.etape(endpoint, "nan_to_num"):
+            shap_values_clean = np.nan_to_num(shap_values)
+            features_clean = np.nan_to_num(df_transformed[0])
+
+        with metriques.etape(endpoint, "serialisation"):
+            if mode != "complet":
+                return reponse_shap_compacte(
+                    mode,
+                    shap_values_clean[None, :],
+                    features_clean[None, :],
+                    base_values[:1],
+                    version.feature_names,
+                    k,
+                    portee,
+                    bins,
+                )
+            return JSONResponse({
+                "shap_values": shap_values_clean.tolist(),
+                "feature_names": version.feature_names,
+                "features_transformed": features_clean.tolist(),
+                "base_value": float(base_value)
+            })
+
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Erreur SHAP local : {e}")
+
+
+# --- SHAP global précalculé (artefacts de api.precalcul_shap, mappés en mémoire) ---
+artefacts_shap = ArtefactsShap()
+
+
+@app.get("/shap_global/precalcule")
+def shap_global_precalcule_liste():
+    return {"datasets": artefacts_shap.disponibles()}
+
+
+@app.get("/shap_global/precalcule/{nom}")
+def shap_global_precalcule(
+    nom: str, offset: int = 0, limit: int | None = None, echantillon: int | None = None
+):
+    artefact = artefacts_shap.charger(nom)
+    if artefact is None:
+        raise HTTPException(status_code=404, detail=f"Aucun SHAP précalculé pour '{nom}'")
+
+    meta, shap_values, features_transformed, ids = artefact
+    if meta["empreinte_modele"] != registre.actif.empreinte:
+        raise HTTPException(
+            status_code=409,
+            detail=f"SHAP précalculé obsolète pour '{nom}' (autre modèle), relancer api.precalcul_shap",
+        )
+
+    # Seules les lignes demandées sont lues depuis le disque
+    try:
+        indices = indices_page(meta["n_lignes"], offset, limit, echantillon)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # JSONResponse directe : évite jsonable_encoder sur les grandes listes imbriquées
+    return JSONResponse({
+        "shap_values": np.nan_to_num(shap_values[indices]).tolist(),
+        "feature_names": meta["feature_names"],
+        "features_transformed": np.nan_to_num(features_transformed[indices]).tolist(),
+        "ids": ids[indices].tolist(),
+        "base_value": meta["base_value"],
+        "n_total": meta["n_lignes"],
+        "offset": offset,
+    })
+
+
+# --- Clients similaires : index des plus proches voisins par fichier de data/ ---
+chemin_data = os.path.abspath(os.path.join(chemin_fichier, "..", "data"))
+PONDERATIONS_VOISINS = ("aucune", "shap")
+index_voisins = OrderedDict()  # (fichier, empreinte du modèle, pondération) -> IndexVoisins
+verrou_index_voisins = threading.Lock()  # protège index_voisins et verrous_construction_voisins
+verrous_construction_voisins = {}  # clé -> verrou de la construction en cours
+MAX_INDEX_VOISINS = int(os.environ.get("MAX_INDEX_VOISINS", "4"))
+
+
+def importance_shap_globale(nom, version, X_transforme):
+    # Moyenne |SHAP| : artefact précalculé s'il est à jour, sinon SHAP sur un échantillon de 512 clients
+    artefact = artefacts_shap.charger(nom)
+    if artefact is not None and artefact[0]["empreinte_modele"] == version.empreinte:
+        return np.abs(np.asarray(artefact[1], dtype=np.float64)).mean(axis=0)
+    rng = np.random.default_rng(0)
+    echantillon = X_transforme[np.sort(rng.choice(len(X_transforme), min(512, len(X_transforme)), replace=False))]
+    valeurs, _ = cache_shap.explications(echantillon, lambda X: calculer_shap(X, version), version.empreinte)
+    return np.abs(valeurs).mean(axis=0)
+
+
+def obtenir_index_voisins(nom, version, ponderation):
+    cle = (nom, version.empreinte, ponderation)
+    with verrou_index_voisins:
+        index = index_voisins.get(cle)
+        if index is not None:
+            index_voisins.move_to_end(cle)
+            return index
+        verrou_construction = verrous_construction_voisins.setdefault(cle, threading.Lock())
+
+    # Construction unique par (fichier, version, pondération), hors du verrou global : seules
+    # les requêtes sur cette clé l'attendent, les index déjà construits restent servis
+    with verrou_construction:
+        try:
+            with verrou_index_voisins:
+                index = index_voisins.get(cle)
+            if index is not None:
+                return index
+
+            debut = time.perf_counter()
+            jeu = jeu_donnees(os.path.join(chemin_data, f"{nom}.csv"))
+            X_transforme = version.preprocessor.transform(jeu.donnees(version.colonnes_entree)).astype(np.float64)
+            poids = importance_shap_globale(nom, version, X_transforme) if ponderation == "shap" else None
+            index = IndexVoisins(X_transforme, jeu.colonne("SK_ID_CURR").to_numpy(), poids)
+            with verrou_index_voisins:
+                index_voisins[cle] = index
+                while len(index_voisins) > MAX_INDEX_VOISINS:
+                    index_voisins.popitem(last=False)
+            print(f"Index des voisins {cle} construit en {time.perf_counter() - debut:.2f} s")
+            return index
+        finally:
+            # Verrou retiré après succès comme après échec (une clé remplacée entre-temps est gardée)
+            with verrou_index_voisins:
+                if verrous_construction_voisins.get(cle) is verrou_construction:
+                    del verrous_construction_voisins[cle]
+
+
+class VoisinsRequest(BaseModel):
+    data: list[list]
+    columns: list
+
+
+@app.post("/voisins/{nom}")
+async def voisins_endpoint(
+    nom: str, request: VoisinsRequest, k: int = 10, ponderation: str = "aucune", id_client: int | None = None
+):
+    # Seuls les fichiers de data/ sont indexables
+    fichiers = {os.path.splitext(f)[0] for f in os.listdir(chemin_data) if f.endswith(".csv")}
+    if nom not in fichiers:
+        raise HTTPException(status_code=404, detail=f"Fichier clients inconnu : {nom}")
+    if ponderation not in PONDERATIONS_VOISINS or k < 1:
+        raise HTTPException(status_code=400, detail=f"ponderation ({'/'.join(PONDERATIONS_VOISINS)}) ou k invalide")
+    return await run_in_threadpool(voisins, nom, request, k, ponderation, id_client)
+
+
+def voisins(nom, request, k, ponderation, id_client):
+    endpoint = "/voisins/{nom}"
+    version = registre.actif
+    try:
+        # Construction de l'index comprise : un fichier sans les colonnes du modèle donne une 400
+        with metriques.etape(endpoint, "index"):
+            index = obtenir_index_voisins(nom, version, ponderation)
+        with metriques.etape(endpoint, "transform"):
+            df = pd.DataFrame(request.data, columns=request.columns)
+            x_transforme = version.preprocessor.transform(df[version.colonnes_entree]).astype(np.float64)[:1]
+        with metriques.etape(endpoint, "requete"):
+            _, ids, distances = index.voisins(x_transforme, k, exclure_id=id_client)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Erreur recherche de voisins : {e}")
+    return {"ids": ids.tolist(), "distances": distances.tolist(), "index": index.description()}
+
+
+# --- Analyse du seuil de décision (précision / rappel / coût métier sur tous les seuils) ---
+courbes_seuils = OrderedDict()  # empreinte du corps (+ version si scoré ici) -> CourbeSeuils
+verrou_courbes_seuils = threading.Lock()
+MAX_COURBES_SEUILS = 8
+
+
+class SeuilRequest(BaseModel):
+    labels: list[int]
+    probas: list[float] | None = None
+    data: list[list] | None = None
+    columns: list | None = None
+
+
+def courbe_seuils(cle, construire):
+    # Changer les coûts ne refait ni le scoring ni le tri : la courbe est gardée par corps de requête
+    with verrou_courbes_seuils:
+        courbe = courbes_seuils.get(cle)
+        if courbe is not None:
+            courbes_seuils.move_to_end(cle)
+            return courbe
+    courbe = construire()
+    with verrou_courbes_seuils:
+        courbes_seuils[cle] = courbe
+        while len(courbes_seuils) > MAX_COURBES_SEUILS:
+            courbes_seuils.popitem(last=False)
+    return courbe
+
+
+@app.post("/seuil/analyse")
+async def seuil_analyse(
+    request: Request, cout_fn: float = COUT_FN, cout_fp: float = COUT_FP, max_points: int = MAX_POINTS
+):
+    """Courbes et seuil optimal pour cout_fn x FN + cout_fp x FP.
+
+    Corps JSON {probas, labels} ou {data, columns, labels} (scoré par la version active),
+    ou binaire (application/octet-stream) : probas float64 puis labels int8.
+    """
+    if cout_fn < 0 or cout_fp < 0 or max_points < 2:
+        raise HTTPException(status_code=400, detail="cout_fn, cout_fp (>= 0) ou max_points (>= 2) invalide")
+    corps = await request.body()
+    type_contenu = request.headers.get("content-type", "").split(";")[0].strip()
+    version = registre.actif
+    return await run_in_threadpool(analyser_seuil, corps, type_contenu, version, cout_fn, cout_fp, max_points)
+
+
+def analyser_seuil(corps, type_contenu, version, cout_fn, cout_fp, max_points):
+    endpoint = "/seuil/analyse"
+    cle = hashlib.blake2b(corps, digest_size=16).hexdigest()
+    try:
+        with metriques.etape(endpoint, "courbe"):
+            if type_contenu == TYPE_FLOAT64:
+                courbe = courbe_seuils(cle, lambda: CourbeSeuils(*decoder_probas_labels(corps)))
+            else:
+                requete = SeuilRequest.model_validate_json(corps)
+                if requete.probas is not None:
+                    courbe = courbe_seuils(cle, lambda: CourbeSeuils(requete.probas, requete.labels))
+                elif requete.data is not None:
+                    # Probas dépendant du modèle : la version fait partie de la clé
+                    X_input = pd.DataFrame(requete.data, columns=requete.columns)
+                    courbe = courbe_seuils(
+                        (cle, version.empreinte),
+                        lambda: CourbeSeuils(version.predire_probas(X_input), requete.labels),
+                    )
+                else:
+                    raise ValueError("fournir probas ou data/columns avec labels")
+        metriques.observer_lignes(endpoint, courbe.n_positifs + courbe.n_negatifs)
+        with metriques.etape(endpoint, "analyse"):
+            analyse = courbe.analyser(cout_fn, cout_fp, max_points)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Erreur lors de l'analyse du seuil : {e}")
+    analyse["seuil_actuel"] = {
+        "version": version.nom,
+        "seuil": version.seuil,
+        "cout": cout_au_seuil(courbe, version.seuil, cout_fn, cout_fp),
+    }
+    return analyse
+
+
+# --- What-if : variantes d'un client sur des grilles de valeurs (voir api/what_if.py) ---
+class WhatIfRequest(BaseModel):
+    data: list[list]
+    columns: list
+    grilles: dict[str, list[float] | dict[str, float]]
+    croise: bool = False
+
+
+@app.post("/what_if")
+async def what_if_endpoint(request: WhatIfRequest, shap: bool = False):
+    if shap:
+        async with limite_explications:
+            return await run_in_threadpool(what_if, request, shap)
+    return await run_in_threadpool(what_if, request, shap)
+
+
+def what_if(request: WhatIfRequest, avec_shap=False):
+    endpoint = "/what_if"
+    version = registre.actif
+    try:
+        # Ligne du client (première ligne) et toutes ses variantes dans une seule matrice
+        with metriques.etape(endpoint, "variantes"):
+            df = pd.DataFrame(request.data[:1], columns=request.columns)
+            ligne = df[version.colonnes_entree].to_numpy(dtype=np.float64)[0]
+            grilles = {colonne: lire_grille(spec) for colonne, spec in request.grilles.items()}
+            X = construire_variantes(ligne, version.colonnes_entree, grilles, request.croise)
+            X_input = pd.DataFrame(X, columns=version.colonnes_entree, copy=False)
+        metriques.observer_lignes(endpoint, len(X_input))
+
+        # Un seul predict_proba pour le client et toutes les variantes
+        with metriques.etape(endpoint, "score"):
+            probas = version.predire_probas(X_input)
+
+        if avec_shap:
+            with metriques.etape(endpoint, "shap"):
+                X_transforme = version.preprocessor.transform(X_input).astype(np.float64)
+                shap_values, base_values = cache_shap.explications(
+                    X_transforme, lambda X: calculer_shap(X, version), version.empreinte
+                )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Erreur lors de l'analyse what-if : {e}")
+
+    with metriques.etape(endpoint, "serialisation"):
+        reponse = {
+            "base": {"proba": float(probas[0]), "prediction": int(probas[0] >= version.seuil)},
+            "seuil": version.seuil,
+            "n_variantes": len(probas) - 1,
         }
+        if request.croise:
+            reponse["grilles"] = {colonne: grille.tolist() for colonne, grille in grilles.items()}
+            reponse["probas"] = probas[1:].reshape([len(grille) for grille in grilles.values()]).tolist()
+        else:
+            reponse["courbes"] = {
+                colonne: {"valeurs": grilles[colonne].tolist(), "probas": courbe.tolist()}
+                for colonne, courbe in decouper_courbes(grilles, probas[1:]).items()
+            }
+
+        if avec_shap:
+            reponse["feature_names"] = version.feature_names
+            reponse["base_value"] = float(np.ravel(base_values)[0])
+            reponse["base"]["shap_values"] = shap_values[0].tolist()
+            if request.croise:
+                reponse["shap_values"] = shap_values[1:].tolist()
+            else:
+                # Contribution de la colonne modifiée le long de sa courbe, et explication complète de chaque variante
+                for colonne, valeurs in decouper_courbes(grilles, shap_values[1:]).items():
+                    reponse["courbes"][colonne]["shap"] = valeurs[:, version.feature_names.index(colonne)].tolist()
+                    reponse["courbes"][colonne]["shap_values"] = valeurs.tolist()
+        return JSONResponse(reponse)
+
+
+# --- Scoring colonnaire (Arrow IPC ou buffers float64 bruts) ---
+@app.post("/predict_colonnes")
+async def predict_colonnes(request: Request):
+    corps = await request.body()
+    type_contenu = request.headers.get("content-type", TYPE_FLOAT64).split(";")[0].strip()
 
+    try:
+        # 1. Décodage en matrice (colonnes, lignes) dans l'ordre de la version active (relu à chaque requête)
+        colonnes_modele = registre.actif.colonnes_entree
+        with metriques.etape("/predict_colonnes", "decodage"):
+            if type_contenu == TYPE_ARROW:
+                matrice = decoder_arrow(corps, colonnes_modele)
+            else:
+                colonnes = lire_manifeste(request.headers.get("x-colonnes"))
+                matrice = decoder_float64(corps, colonnes, colonnes_modele)
+
+            # 2. DataFrame construit sur la transposée (pas de copie du bloc float64)
+            X_input = pd.DataFrame(matrice.T, columns=colonnes_modele, copy=False)
+        metriques.observer_lignes("/predict_colonnes", len(X_input))
+
+        # 3. Prédictions + seuil métier
+        with metriques.etape("/predict_colonnes", "score"):
+            y_pred, y_proba = await run_in_threadpool(predire, X_input)
     except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Erreur SHAP local : {e}")
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=f"Erreur lors de la prédiction colonnaire : {e}")
+
+    with metriques.etape("/predict_colonnes", "encodage"):
+        if type_contenu == TYPE_ARROW:
+            return Response(encoder_arrow(y_proba, y_pred), media_type=TYPE_ARROW)
+        return Response(
+            encoder_float64(y_proba, y_pred),
+            media_type=TYPE_FLOAT64,
+            headers={"X-Lignes": str(len(y_proba))},
+        )
+
+
+# --- Scoring en flux de gros fichiers (CSV ou Parquet envoyé brut dans le corps) ---
+@app.post("/predict_fichier")
+async def predict_fichier(request: Request, format_sortie: str = "ndjson", taille_bloc: int = TAILLE_BLOC):
+    if format_sortie not in ENCODEURS or taille_bloc <= 0:
+        raise HTTPException(status_code=400, detail="format_sortie (ndjson/arrow) ou taille_bloc invalide")
+
+    with ExitStack() as pile:
+        # Corps reçu par morceaux (en mémoire jusqu'à 8 Mo, puis sur disque) : mémoire bornée
+        fichier = pile.enter_context(tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024))
+        # Écritures regroupées par Mo dans le threadpool : au-delà de 8 Mo ce sont des écritures disque
+        morceaux, taille = [], 0
+        async for morceau in request.stream():
+            morceaux.append(morceau)
+            taille += len(morceau)
+            if taille >= 1024 * 1024:
+                await run_in_threadpool(fichier.writelines, morceaux)
+                morceaux, taille = [], 0
+        if morceaux:
+            await run_in_threadpool(fichier.writelines, morceaux)
+        fichier.seek(0)
+
+        # Premier bloc scoré avant de répondre : un fichier invalide donne une erreur 400
+        blocs = lire_blocs(fichier, taille_bloc=taille_bloc)
+        pile.callback(blocs.close)
+        resultats = scorer_blocs(blocs, predire, registre.actif.colonnes_entree)
+        try:
+            premier = await run_in_threadpool(next, resultats, None)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Erreur lors du scoring du fichier : {e}")
+
+        # Réponse prête : la fermeture du fichier est confiée à la réponse, après le dernier bloc
+        fermer = pile.pop_all().close
+
+    # Les blocs suivants sont lus, scorés et envoyés au fil de l'eau
+    flux = itertools.chain([premier] if premier is not None else [], resultats)
+    return StreamingResponse(
+        ENCODEURS[format_sortie](flux),
+        media_type=TYPES_CONTENU[format_sortie],
+        background=BackgroundTask(fermer),
+    )
@@ -0,0 +1,109 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+from fastapi.concurrency import run_in_threadpool
+
+
+class MicroBatcher:
+    """Regroupe les requêtes concurrentes en un seul appel vectorisé au modèle.
+
+    Les requêtes arrivant pendant `fenetre_ms` (ou jusqu'à `max_lignes` lignes)
+    sont concaténées, scorées en un seul `predict_proba`, puis les probabilités
+    sont redistribuées à chaque appelant. `colonnes` est une liste fixe ou une
+    fonction sans argument relue à chaque requête (colonnes de la version active).
+    """
+
+    def __init__(self, fonction_score, colonnes, fenetre_ms=2.0, max_lignes=64):
+        self.fonction_score = fonction_score  # DataFrame -> probas classe 1
+        self._colonnes = (
+            colonnes if callable(colonnes) else lambda liste=list(colonnes): liste
+        )
+        self.fenetre = fenetre_ms / 1000
+        self.max_lignes = max_lignes
+
+        self._boucle = None
+        self._en_attente = []  # liste de (DataFrame, future)
+        self._cle = None  # colonnes des requêtes en attente
+        self._nb_lignes = 0
+        self._minuteur = None
+
+        # Compteurs (taille moyenne des lots = lignes_scorees / lots_scores)
+        self.lots_scores = 0
+        self.lignes_scorees = 0
+
+    @property
+    def colonnes(self):
+        return list(self._colonnes())
+
+    @property
+    def actif(self):
+        return self.fenetre > 0 and self.max_lignes > 1
+
+    async def soumettre(self, X):
+        # Requêtes déjà volumineuses ou colonnes non standard : scoring direct
+        colonnes = self.colonnes
+        if not self.actif or len(X) >= self.max_lignes or list(X.columns) != colonnes:
+            return await run_in_threadpool(self.fonction_score, X)
+
+        boucle = asyncio.get_running_loop()
+        if boucle is not self._boucle:
+            # Nouvelle boucle d'événements (ex : TestClient) : on repart d'un lot vide
+            self._boucle = boucle
+            self._en_attente, self._nb_lignes, self._minuteur = [], 0, None
+        if colonnes != self._cle:
+            # Colonnes changées (bascule de version) : le lot en attente part seul
+            self._vider()
+            self._cle = colonnes
+
+        future = boucle.create_future()
+        self._en_attente.append((X, future))
+        self._nb_lignes += len(X)
+
+        if self._nb_lignes >= self.max_lignes:
+            self._vider()
+        elif self._minuteur is None:
+            self._minuteur = boucle.call_later(self.fenetre, self._vider)
+
+        return await future
+
+    def _vider(self):
+        if self._minuteur is not None:
+            self._minuteur.cancel()
+            self._minuteur = None
+
+        lot, self._en_attente, self._nb_lignes = self._en_attente, [], 0
+        if lot:
+            asyncio.ensure_future(self._scorer_lot(lot))
+
+    async def _scorer_lot(self, lot):
+        try:
+            X = (
+                pd.concat([x for x, _ in lot], ignore_index=True)
+                if len(lot) > 1
+                else lot[0][0]
+            )
+            probas = np.asarray(await run_in_threadpool(self.fonction_score, X))
+        except Exception:
+            # Lot en échec : chaque requête est rescorée seule pour recevoir sa propre erreur
+            for x, future in lot:
+                try:
+                    resultat = await run_in_threadpool(self.fonction_score, x)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(resultat)
+            return
+
+        self.lots_scores += 1
+        self.lignes_scorees += len(X)
+
+        # Redistribution des probabilités à chaque appelant
+        debut = 0
+        for x, future in lot:
+            fin = debut + len(x)
+            if not future.done():
+                future.set_result(probas[debut:fin])
+            debut = fin
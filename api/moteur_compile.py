@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+
+
+class MoteurCompile:
+    """Moteur d'inférence sans Pipeline sklearn pour le modèle LightGBM.
+
+    Le `ColumnTransformer` (StandardScaler + passthrough) est réduit à une
+    permutation de colonnes et deux vecteurs moyenne/échelle appliqués en une
+    passe NumPy ; la matrice obtenue est passée directement au booster
+    (prédicteur C de LightGBM), sans la validation de Pipeline/LGBMClassifier.
+    """
+
+    def __init__(self, pipeline):
+        preprocessor = pipeline.named_steps["preprocessor"]
+        model_lgb = pipeline.named_steps["model"]
+
+        self.colonnes = preprocessor.feature_names_in_.tolist()
+        self._compiler_preprocessor(preprocessor)
+        self._compiler_booster(model_lgb)
+
+    # --- Préprocesseur ---
+    def _compiler_preprocessor(self, preprocessor):
+        ordre, moyennes, echelles = [], [], []
+        for nom, transformer, colonnes in preprocessor.transformers_:
+            if transformer == "drop":
+                continue
+            positions = _positions_colonnes(colonnes, self.colonnes)
+
+            if isinstance(transformer, StandardScaler):
+                n = len(positions)
+                moyennes.append(
+                    transformer.mean_ if transformer.with_mean else np.zeros(n)
+                )
+                echelles.append(
+                    transformer.scale_ if transformer.with_std else np.ones(n)
+                )
+            elif (
+                transformer == "passthrough"
+                or getattr(transformer, "func", False) is None
+            ):
+                moyennes.append(np.zeros(len(positions)))
+                echelles.append(np.ones(len(positions)))
+            else:
+                raise ValueError(
+                    f"transformer non supporté par le moteur compilé : {nom}"
+                )
+            ordre.append(positions)
+
+        self.ordre = np.concatenate(ordre)
+        self.moyenne = np.concatenate(moyennes).astype(np.float64)
+        self.echelle = np.concatenate(echelles).astype(np.float64)
+
+    # --- Booster ---
+    def _compiler_booster(self, model_lgb):
+        booster = model_lgb.booster_
+        if booster.num_model_per_iteration() != 1 or model_lgb.objective_ != "binary":
+            raise ValueError(
+                "seuls les modèles binaires (un arbre par itération) sont supportés"
+            )
+        if booster.params.get("boosting", "gbdt") == "rf":
+            raise ValueError("le boosting 'rf' (moyenne des arbres) n'est pas supporté")
+
+        self.sigmoid = float(booster.params.get("sigmoid", 1.0))
+        self.booster = booster
+        # Même nombre d'itérations que LGBMClassifier.predict_proba
+        self.num_iteration = model_lgb.best_iteration_ or None
+
+    # --- Inférence ---
+    def matrice_entree(self, X):
+        """Matrice float64 (n, p) dans l'ordre des colonnes d'entrée du modèle."""
+        if isinstance(X, pd.DataFrame):
+            if list(X.columns) != self.colonnes:
+                X = X[self.colonnes]
+            X = X.to_numpy(dtype=np.float64)
+        return np.asarray(X, dtype=np.float64)
+
+    def transformer(self, X):
+        """Équivalent de `preprocessor.transform` (mêmes colonnes, même ordre)."""
+        X = self.matrice_entree(X)
+        return (X[:, self.ordre] - self.moyenne) / self.echelle
+
+    def scores_bruts(self, X_transforme):
+        return self.booster.predict(
+            X_transforme, raw_score=True, num_iteration=self.num_iteration
+        )
+
+    def predict_proba(self, X):
+        scores = self.scores_bruts(self.transformer(X))
+        proba = 1.0 / (1.0 + np.exp(-self.sigmoid * scores))
+        return np.column_stack([1.0 - proba, proba])
+
+
+def _positions_colonnes(colonnes, colonnes_entree):
+    # Les colonnes d'un ColumnTransformer sont des noms ou des indices
+    colonnes = list(colonnes)
+    if colonnes and isinstance(colonnes[0], str):
+        index = {col: i for i, col in enumerate(colonnes_entree)}
+        return np.array([index[col] for col in colonnes], dtype=np.intp)
+    return np.array(colonnes, dtype=np.intp)
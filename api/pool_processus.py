@@ -0,0 +1,86 @@
+import multiprocessing
+import os
+import pickle
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Explainer des workers : hérité du parent par fork (copy-on-write) ou rechargé par l'initializer
+_explainer = None
+
+
+def _init_worker(chemin_modele):
+    global _explainer
+    if _explainer is None:
+        # Démarrage "spawn"/"forkserver" : chaque worker recharge le modèle une seule fois
+        import shap
+
+        with open(chemin_modele, "rb") as file:
+            model = pickle.load(file)
+        _explainer = shap.TreeExplainer(model.named_steps["model"])
+
+
+def _calcul_shap_bloc(X_transforme):
+    shap_explanation = _explainer(X_transforme)
+    shap_values = shap_explanation.values
+    base_values = shap_explanation.base_values
+    if shap_values.ndim == 3:
+        shap_values, base_values = shap_values[..., 1], base_values[..., 1]
+    return shap_values, base_values
+
+
+def _demarrer_worker(_):
+    # Tâche de démarrage : renvoie le pid du worker qui la traite
+    return os.getpid()
+
+
+class PoolShap:
+    """Pool de processus pour les calculs SHAP (hors GIL du serveur).
+
+    Les lignes sont découpées en blocs répartis sur les workers. Sous Linux le
+    pool est créé par fork juste après le chargement du modèle : les workers
+    partagent les tableaux du modèle en lecture seule (copy-on-write).
+    """
+
+    def __init__(self, explainer, chemin_modele, nb_workers, taille_bloc_min=64):
+        global _explainer
+        self.nb_workers = nb_workers
+        self.taille_bloc_min = taille_bloc_min
+
+        # fork uniquement sous Linux (déconseillé sous macOS, absent sous Windows)
+        if sys.platform.startswith("linux"):
+            _explainer = explainer  # hérité par les workers au fork
+            contexte = multiprocessing.get_context("fork")
+        else:
+            contexte = multiprocessing.get_context("spawn")
+
+        self._executor = ProcessPoolExecutor(
+            max_workers=nb_workers,
+            mp_context=contexte,
+            initializer=_init_worker,
+            initargs=(chemin_modele,),
+        )
+        # Lancement immédiat des workers (fork depuis le thread principal, avant le service)
+        self.pids = sorted(set(self._executor.map(_demarrer_worker, range(nb_workers))))
+
+    def calculer(self, X_transforme):
+        """Valeurs SHAP (n, p) et base values (n,), blocs calculés en parallèle."""
+        n = len(X_transforme)
+        taille_bloc = max(self.taille_bloc_min, -(-n // self.nb_workers))
+        blocs = [
+            X_transforme[debut : debut + taille_bloc]
+            for debut in range(0, n, taille_bloc)
+        ]
+        if len(blocs) <= 1:
+            return self._executor.submit(_calcul_shap_bloc, X_transforme).result()
+
+        resultats = list(self._executor.map(_calcul_shap_bloc, blocs))
+        shap_values = np.vstack([valeurs for valeurs, _ in resultats])
+        base_values = np.concatenate(
+            [np.broadcast_to(bases, (len(valeurs),)) for valeurs, bases in resultats]
+        )
+        return shap_values, base_values
+
+    def arreter(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,213 @@
+"""Précalcul hors ligne des valeurs SHAP globales pour chaque fichier de `data/`.
+
+Usage : python -m api.precalcul_shap [fichiers.csv ...] [--force]
+
+Pour chaque fichier, écrit dans `api/artefacts/<nom>/` :
+- `shap_values.npy` et `features_transformed.npy` (float32, lignes x features),
+- `ids.npy` (SK_ID_CURR),
+- `meta.json` (empreintes du modèle et des données, noms des features, base value).
+Les artefacts sont servis par l'API via `np.load(mmap_mode="r")`.
+"""
+
+import argparse
+import glob
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+from api.empreinte import empreinte_fichier
+
+chemin_fichier = os.path.dirname(__file__)
+chemin_modele = os.path.join(chemin_fichier, "models", "model.pkl")
+chemin_data = os.path.abspath(os.path.join(chemin_fichier, "..", "data"))
+dossier_artefacts = os.path.join(chemin_fichier, "artefacts")
+
+TAILLE_BLOC = 2000
+
+
+def nom_artefact(chemin_csv):
+    return os.path.splitext(os.path.basename(chemin_csv))[0]
+
+
+def lire_meta(dossier):
+    chemin_meta = os.path.join(dossier, "meta.json")
+    if not os.path.exists(chemin_meta):
+        return None
+    with open(chemin_meta, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def precalculer(
+    chemin_csv,
+    preprocessor,
+    explainer,
+    feature_names,
+    version_modele,
+    force=False,
+    dossier_racine=dossier_artefacts,
+):
+    """Calcule et écrit l'artefact d'un fichier ; ne refait rien si les empreintes sont identiques."""
+    dossier = os.path.join(dossier_racine, nom_artefact(chemin_csv))
+    empreinte_donnees = empreinte_fichier(chemin_csv)
+
+    meta = lire_meta(dossier)
+    if (
+        not force
+        and meta is not None
+        and meta["empreinte_modele"] == version_modele
+        and meta["empreinte_donnees"] == empreinte_donnees
+    ):
+        return dossier, False
+
+    data = pd.read_csv(chemin_csv)
+    ids = data["SK_ID_CURR"].to_numpy()
+    df = data.drop(columns=["SK_ID_CURR"])
+
+    os.makedirs(dossier, exist_ok=True)
+    n, p = len(df), len(feature_names)
+
+    # Écriture par blocs directement dans les fichiers .npy (mémoire bornée)
+    shap_values = np.lib.format.open_memmap(
+        os.path.join(dossier, "shap_values.npy.tmp"),
+        mode="w+",
+        dtype=np.float32,
+        shape=(n, p),
+    )
+    features = np.lib.format.open_memmap(
+        os.path.join(dossier, "features_transformed.npy.tmp"),
+        mode="w+",
+        dtype=np.float32,
+        shape=(n, p),
+    )
+    base_value = float(np.ravel(explainer.expected_value)[-1])
+    for debut in range(0, n, TAILLE_BLOC):
+        bloc = preprocessor.transform(df.iloc[debut : debut + TAILLE_BLOC])
+        valeurs = explainer.shap_values(bloc)
+        if isinstance(valeurs, list):
+            valeurs = valeurs[1]  # classe 1
+        shap_values[debut : debut + len(bloc)] = valeurs
+        features[debut : debut + len(bloc)] = bloc
+    shap_values.flush()
+    features.flush()
+    del shap_values, features
+
+    np.save(os.path.join(dossier, "ids.npy"), ids)
+    os.replace(
+        os.path.join(dossier, "shap_values.npy.tmp"),
+        os.path.join(dossier, "shap_values.npy"),
+    )
+    os.replace(
+        os.path.join(dossier, "features_transformed.npy.tmp"),
+        os.path.join(dossier, "features_transformed.npy"),
+    )
+
+    # meta.json écrit en dernier : un artefact sans meta est considéré comme absent
+    meta = {
+        "fichier": os.path.basename(chemin_csv),
+        "empreinte_modele": version_modele,
+        "empreinte_donnees": empreinte_donnees,
+        "feature_names": list(feature_names),
+        "n_lignes": n,
+        "base_value": base_value,
+        "cree_le": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(os.path.join(dossier, "meta.json"), "w", encoding="utf-8") as file:
+        json.dump(meta, file, indent=2)
+    return dossier, True
+
+
+class ArtefactsShap:
+    """Accès en lecture aux artefacts précalculés (tableaux mappés en mémoire)."""
+
+    def __init__(self, dossier=dossier_artefacts):
+        self.dossier = dossier
+        self._ouverts = {}  # nom -> (mtime de meta.json, artefact)
+
+    def disponibles(self):
+        if not os.path.isdir(self.dossier):
+            return []
+        return sorted(
+            nom
+            for nom in os.listdir(self.dossier)
+            if lire_meta(os.path.join(self.dossier, nom))
+        )
+
+    def charger(self, nom):
+        """Renvoie (meta, shap_values, features_transformed, ids) ou None si absent."""
+        dossier = os.path.join(self.dossier, os.path.basename(nom))
+        chemin_meta = os.path.join(dossier, "meta.json")
+        if not os.path.exists(chemin_meta):
+            return None
+
+        mtime = os.stat(chemin_meta).st_mtime_ns
+        ouvert = self._ouverts.get(nom)
+        if ouvert is None or ouvert[0] != mtime:
+            artefact = (
+                lire_meta(dossier),
+                np.load(os.path.join(dossier, "shap_values.npy"), mmap_mode="r"),
+                np.load(
+                    os.path.join(dossier, "features_transformed.npy"), mmap_mode="r"
+                ),
+                np.load(os.path.join(dossier, "ids.npy"), mmap_mode="r"),
+            )
+            ouvert = self._ouverts[nom] = (mtime, artefact)
+        return ouvert[1]
+
+
+def indices_page(n_total, offset=0, limit=None, echantillon=None):
+    """Indices des lignes d'une page, éventuellement sous-échantillonnée à pas régulier."""
+    if offset < 0 or (limit is not None and limit < 0):
+        raise ValueError("offset et limit doivent être positifs")
+    if echantillon is not None and echantillon < 1:
+        raise ValueError("echantillon doit être au moins 1")
+    debut = min(offset, n_total)
+    fin = n_total if limit is None else min(n_total, debut + limit)
+    if echantillon is not None and fin - debut > echantillon:
+        return np.unique(np.linspace(debut, fin - 1, echantillon).astype(np.intp))
+    return np.arange(debut, fin)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Précalcul des valeurs SHAP globales")
+    parser.add_argument(
+        "fichiers", nargs="*", help="fichiers CSV (défaut : data/*.csv)"
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="recalculer même si à jour"
+    )
+    args = parser.parse_args()
+
+    import shap
+
+    with open(chemin_modele, "rb") as file:
+        model = pickle.load(file)
+    preprocessor = model.named_steps["preprocessor"]
+    explainer = shap.TreeExplainer(model.named_steps["model"])
+    feature_names = preprocessor.get_feature_names_out()
+    # Même convention que l'API : préfixes "scaler_continuous_features__" / "remainder__" retirés
+    feature_names = [nom.split("__", 1)[-1] for nom in feature_names]
+    version_modele = empreinte_fichier(chemin_modele)
+
+    fichiers = args.fichiers or sorted(glob.glob(os.path.join(chemin_data, "*.csv")))
+    for chemin_csv in fichiers:
+        debut = time.perf_counter()
+        dossier, calcule = precalculer(
+            chemin_csv,
+            preprocessor,
+            explainer,
+            feature_names,
+            version_modele,
+            force=args.force,
+        )
+        etat = "calculé" if calcule else "à jour"
+        print(
+            f"{chemin_csv} -> {dossier} ({etat}, {time.perf_counter() - debut:.1f} s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
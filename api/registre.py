@@ -0,0 +1,374 @@
+"""Registre des versions du modèle : chargement, bascule à chaud et scoring fantôme.
+
+Chaque fichier `api/models/**/*.pkl` est une version nommée par son chemin relatif
+sans extension ("model", "old/model"). Une version chargée regroupe le Pipeline,
+le moteur compilé, le preprocessor, les feature_names et l'explainer SHAP, construits
+une seule fois. La version active est une simple référence remplacée d'un bloc :
+une requête lit `registre.actif` une fois et garde la même version jusqu'au bout.
+
+Le seuil de décision de chaque version est lu dans `<nom>.json` à côté du pickle
+({"seuil": 0.47}), SEUIL_DEFAUT sinon.
+"""
+
+import glob
+import json
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from api.empreinte import empreinte_fichier
+from api.moteur_compile import MoteurCompile
+
+# Seuil métier par défaut (optimisé dans le notebook sur le score métier)
+SEUIL_DEFAUT = 0.47
+
+
+def _stat(chemin):
+    stat = os.stat(chemin)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class VersionModele:
+    """Une version du modèle et tout ce qui en dérive."""
+
+    def __init__(self, nom, chemin, moteur_compile=True):
+        self.nom = nom
+        self.chemin = chemin
+        self.stat = _stat(chemin)
+        self.empreinte = empreinte_fichier(chemin)
+        self.date_chargement = time.time()
+
+        with open(chemin, "rb") as file:
+            self.pipeline = pickle.load(file)
+        self.preprocessor = self.pipeline.named_steps["preprocessor"]
+        self.model_lgb = self.pipeline.named_steps["model"]
+        self.colonnes_entree = self.preprocessor.feature_names_in_.tolist()
+
+        # Noms des features transformées : colonnes scalées puis passthrough
+        scaler = self.preprocessor.named_transformers_["scaler_continuous_features"]
+        colonnes_passthrough = [
+            col for col in self.colonnes_entree if col not in scaler.feature_names_in_
+        ]
+        self.feature_names = list(scaler.get_feature_names_out()) + colonnes_passthrough
+
+        # Moteur compilé (scaler en NumPy + booster direct), repli sur le Pipeline si non supporté
+        self.moteur = None
+        if moteur_compile:
+            try:
+                self.moteur = MoteurCompile(self.pipeline)
+            except ValueError as e:
+                print(
+                    f"Moteur compilé indisponible pour {nom}, utilisation du Pipeline : {e}"
+                )
+
+        self.explainer = None
+        self.erreur_explainer = None
+        self.explainer_pret = threading.Event()
+        self._verrou_explainer = threading.Lock()
+
+        self.chemin_meta = os.path.splitext(chemin)[0] + ".json"
+        self.seuil = self.lire_meta().get("seuil", SEUIL_DEFAUT)
+
+    def lire_meta(self):
+        if not os.path.exists(self.chemin_meta):
+            return {}
+        with open(self.chemin_meta) as file:
+            return json.load(file)
+
+    def definir_seuil(self, seuil, persister=True):
+        """Change le seuil de décision de la version (et l'écrit dans `<nom>.json`)."""
+        if not 0.0 <= seuil <= 1.0:
+            raise ValueError(f"seuil hors de [0, 1] : {seuil}")
+        self.seuil = float(seuil)
+        if persister:
+            meta = {**self.lire_meta(), "seuil": self.seuil}
+            temporaire = f"{self.chemin_meta}.tmp"
+            with open(temporaire, "w") as file:
+                json.dump(meta, file, indent=2)
+            os.replace(temporaire, self.chemin_meta)
+
+    def predire_probas(self, X_input):
+        """Probabilité de la classe 1."""
+        if self.moteur is not None and list(X_input.columns) == self.moteur.colonnes:
+            return self.moteur.predict_proba(X_input)[:, 1]
+        # Colonnes inattendues : le Pipeline lève l'erreur de validation habituelle
+        return self.pipeline.predict_proba(X_input)[:, 1]
+
+    def rechauffer(self):
+        # Premier appel sur une ligne vide : initialise LightGBM avant la première requête
+        self.predire_probas(
+            pd.DataFrame(
+                np.full((1, len(self.colonnes_entree)), np.nan),
+                columns=self.colonnes_entree,
+            )
+        )
+
+    def initialiser_explainer(self):
+        """Construit l'explainer une seule fois (import de shap compris) ; sans effet ensuite."""
+        with self._verrou_explainer:
+            if self.explainer_pret.is_set():
+                return
+            try:
+                import shap
+
+                self.explainer = shap.TreeExplainer(self.model_lgb)
+            except Exception as e:
+                self.erreur_explainer = e
+                print(f"Explainer SHAP indisponible pour {self.nom} : {e}")
+            finally:
+                self.explainer_pret.set()
+
+    def obtenir_explainer(self):
+        # Attend la fin de l'initialisation si une explication arrive pendant la construction
+        self.explainer_pret.wait()
+        if self.explainer is None:
+            raise RuntimeError(f"Explainer SHAP indisponible : {self.erreur_explainer}")
+        return self.explainer
+
+    def etat_shap(self):
+        if self.explainer is not None:
+            return "pret"
+        return "erreur" if self.erreur_explainer else "initialisation"
+
+    def description(self):
+        return {
+            "nom": self.nom,
+            "empreinte": self.empreinte,
+            "chemin": self.chemin,
+            "charge_le": time.strftime(
+                "%Y-%m-%dT%H:%M:%S", time.localtime(self.date_chargement)
+            ),
+            "moteur_compile": self.moteur is not None,
+            "shap": self.etat_shap(),
+            "seuil": self.seuil,
+        }
+
+
+class StatsOmbre:
+    """Écarts de score entre le candidat (scoring fantôme) et la version active."""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self.reinitialiser(None, None)
+
+    def reinitialiser(self, actif, candidat):
+        with self._verrou:
+            self.actif, self.candidat = actif, candidat
+            self.lots = 0
+            self.lignes = 0
+            self.somme_ecarts = 0.0
+            self.somme_ecarts_abs = 0.0
+            self.ecart_abs_max = 0.0
+            self.decisions_differentes = 0
+            self.lots_ignores = 0
+            self.erreurs = 0
+
+    def enregistrer(self, y_proba_actif, y_proba_candidat, seuil_actif, seuil_candidat):
+        ecarts = y_proba_candidat - y_proba_actif
+        differentes = int(
+            np.count_nonzero(
+                (y_proba_actif >= seuil_actif) != (y_proba_candidat >= seuil_candidat)
+            )
+        )
+        with self._verrou:
+            self.lots += 1
+            self.lignes += len(ecarts)
+            self.somme_ecarts += float(ecarts.sum())
+            self.somme_ecarts_abs += float(np.abs(ecarts).sum())
+            self.ecart_abs_max = max(
+                self.ecart_abs_max, float(np.abs(ecarts).max(initial=0.0))
+            )
+            self.decisions_differentes += differentes
+
+    def resume(self):
+        with self._verrou:
+            n = self.lignes
+            return {
+                "actif": self.actif,
+                "candidat": self.candidat,
+                "lots": self.lots,
+                "lignes": n,
+                "ecart_moyen": self.somme_ecarts / n if n else None,
+                "ecart_abs_moyen": self.somme_ecarts_abs / n if n else None,
+                "ecart_abs_max": self.ecart_abs_max,
+                "decisions_differentes": self.decisions_differentes,
+                "taux_decisions_differentes": self.decisions_differentes / n
+                if n
+                else None,
+                "lots_ignores": self.lots_ignores,
+                "erreurs": self.erreurs,
+            }
+
+
+class RegistreModeles:
+    """Versions disponibles dans `dossier`, version active et candidat en scoring fantôme."""
+
+    def __init__(
+        self, dossier, nom_actif="model", moteur_compile=True, max_lots_ombre=8
+    ):
+        self.dossier = dossier
+        self.moteur_compile = moteur_compile
+        self.versions = {}  # nom -> VersionModele chargée
+        self._verrou = threading.RLock()
+
+        self.actif = self.charger(nom_actif)
+        self.candidat = None
+        self.historique = [(time.time(), nom_actif)]
+
+        # Scoring fantôme : un thread dédié, file bornée (les lots en trop sont ignorés)
+        self.ombre = StatsOmbre()
+        self.max_lots_ombre = max_lots_ombre
+        self._lots_ombre_en_attente = 0
+        self._executor_ombre = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="scoring-ombre"
+        )
+        self._surveillance = None
+
+    def disponibles(self):
+        """nom -> chemin pour chaque .pkl du dossier (sous-dossiers compris)."""
+        chemins = glob.glob(os.path.join(self.dossier, "**", "*.pkl"), recursive=True)
+        return {
+            os.path.splitext(os.path.relpath(chemin, self.dossier))[0].replace(
+                os.sep, "/"
+            ): chemin
+            for chemin in sorted(chemins)
+        }
+
+    def charger(self, nom):
+        """Version chargée `nom` ; rechargée si son fichier a changé depuis le chargement."""
+        chemin = self.disponibles().get(nom)
+        if chemin is None:
+            raise KeyError(nom)
+        with self._verrou:
+            version = self.versions.get(nom)
+            if version is not None and version.stat == _stat(chemin):
+                return version
+        # Chargement hors verrou : les requêtes continuent sur la version active
+        version = VersionModele(nom, chemin, self.moteur_compile)
+        with self._verrou:
+            self.versions[nom] = version
+        return version
+
+    def activer(self, nom, avec_shap=True):
+        """Charge, réchauffe (LightGBM, explainer) puis bascule la version active ; renvoie l'ancienne."""
+        version = self.charger(nom)
+        version.rechauffer()
+        if avec_shap:
+            version.initialiser_explainer()
+        with self._verrou:
+            ancienne, self.actif = self.actif, version
+            self.historique.append((time.time(), nom))
+            if self.candidat is not None:
+                self.ombre.reinitialiser(version.nom, self.candidat.nom)
+        if ancienne is not version:
+            print(
+                f"Version active : {ancienne.nom} ({ancienne.empreinte}) -> {nom} ({version.empreinte})"
+            )
+        return ancienne
+
+    def definir_candidat(self, nom):
+        """Candidat du scoring fantôme (None pour l'arrêter)."""
+        candidat = None
+        if nom is not None:
+            candidat = self.charger(nom)
+            candidat.rechauffer()
+        with self._verrou:
+            self.candidat = candidat
+            self.ombre.reinitialiser(self.actif.nom, nom)
+        return candidat
+
+    def soumettre_ombre(self, X_input, y_proba_actif, seuil):
+        """Score le même lot avec le candidat en arrière-plan, sans attendre le résultat.
+
+        Les décisions sont comparées au seuil `seuil` de l'actif et au seuil propre du candidat.
+        """
+        candidat = self.candidat
+        if candidat is None:
+            return
+        with self._verrou:
+            if self._lots_ombre_en_attente >= self.max_lots_ombre:
+                self.ombre.lots_ignores += 1
+                return
+            self._lots_ombre_en_attente += 1
+        self._executor_ombre.submit(
+            self._scorer_ombre, candidat, X_input, np.asarray(y_proba_actif), seuil
+        )
+
+    def _scorer_ombre(self, candidat, X_input, y_proba_actif, seuil):
+        try:
+            self.ombre.enregistrer(
+                y_proba_actif, candidat.predire_probas(X_input), seuil, candidat.seuil
+            )
+        except Exception as e:
+            self.ombre.erreurs += 1
+            print(f"Scoring fantôme ({candidat.nom}) en erreur : {e}")
+        finally:
+            with self._verrou:
+                self._lots_ombre_en_attente -= 1
+
+    def attendre_ombre(self):
+        # Attend les lots fantômes déjà soumis (tests, arrêt)
+        self._executor_ombre.submit(lambda: None).result()
+
+    def verifier_fichiers(self):
+        """Recharge et rebascule la version active (et le candidat) si leur fichier a changé."""
+        actif, candidat = self.actif, self.candidat
+        if _stat_ou_none(actif.chemin) not in (None, actif.stat):
+            self.activer(actif.nom, avec_shap=actif.explainer_pret.is_set())
+        if candidat is not None and _stat_ou_none(candidat.chemin) not in (
+            None,
+            candidat.stat,
+        ):
+            self.definir_candidat(candidat.nom)
+
+    def surveiller(self, intervalle):
+        """Thread de fond qui appelle `verifier_fichiers` toutes les `intervalle` secondes."""
+
+        def boucle():
+            while True:
+                time.sleep(intervalle)
+                try:
+                    self.verifier_fichiers()
+                except Exception as e:
+                    # Fichier en cours d'écriture ou invalide : la version active reste servie
+                    print(f"Rechargement du modèle impossible : {e}")
+
+        self._surveillance = threading.Thread(
+            target=boucle, name="surveillance-modeles", daemon=True
+        )
+        self._surveillance.start()
+
+    def etat(self):
+        with self._verrou:
+            charges = {
+                nom: version.description() for nom, version in self.versions.items()
+            }
+            return {
+                "actif": self.actif.nom,
+                "empreinte_active": self.actif.empreinte,
+                "candidat": self.candidat.nom if self.candidat is not None else None,
+                "disponibles": list(self.disponibles()),
+                "charges": charges,
+                "ombre": self.ombre.resume(),
+                "historique": [
+                    {
+                        "date": time.strftime(
+                            "%Y-%m-%dT%H:%M:%S", time.localtime(date)
+                        ),
+                        "nom": nom,
+                    }
+                    for date, nom in self.historique
+                ],
+            }
+
+
+def _stat_ou_none(chemin):
+    try:
+        return _stat(chemin)
+    except OSError:
+        return None
@@ -0,0 +1,171 @@
+"""Scoring en flux de gros fichiers clients (CSV ou Parquet), par blocs de taille bornée.
+
+Utilisé par l'endpoint `/predict_fichier` et en ligne de commande :
+    python -m api.scoring_lot [fichiers ...] [--format ndjson|arrow] [--taille-bloc N]
+                              [--modele NOM] [--seuil S]
+
+Le seuil par défaut est celui de la version (api/models/<nom>.json), comme pour l'API.
+"""
+
+import argparse
+import glob
+import io
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+chemin_fichier = os.path.dirname(__file__)
+dossier_modeles = os.path.join(chemin_fichier, "models")
+chemin_data = os.path.abspath(os.path.join(chemin_fichier, "..", "data"))
+
+TAILLE_BLOC = 10_000
+MAGIC_PARQUET = b"PAR1"
+
+
+def detecter_format(fichier):
+    """'parquet' si le fichier commence par la signature Parquet, sinon 'csv'."""
+    position = fichier.tell()
+    debut = fichier.read(4)
+    fichier.seek(position)
+    return "parquet" if debut == MAGIC_PARQUET else "csv"
+
+
+def lire_blocs(fichier, format_entree=None, taille_bloc=TAILLE_BLOC):
+    """Itère sur le fichier par DataFrames d'au plus `taille_bloc` lignes."""
+    format_entree = format_entree or detecter_format(fichier)
+    if format_entree == "parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(fichier).iter_batches(batch_size=taille_bloc):
+            yield batch.to_pandas()
+    else:
+        with pd.read_csv(fichier, chunksize=taille_bloc) as lecteur:
+            yield from lecteur
+
+
+def scorer_blocs(blocs, predire, colonnes_modele):
+    """Applique `predire` (DataFrame -> (y_pred, y_proba)) à chaque bloc."""
+    for bloc in blocs:
+        ids = (
+            bloc["SK_ID_CURR"].to_numpy()
+            if "SK_ID_CURR" in bloc
+            else np.full(len(bloc), -1)
+        )
+        y_pred, y_proba = predire(bloc[colonnes_modele])
+        yield ids, y_proba, y_pred
+
+
+def ndjson_blocs(resultats):
+    """Une ligne JSON par client, émise bloc par bloc."""
+    for ids, y_proba, y_pred in resultats:
+        yield "".join(
+            f'{{"SK_ID_CURR": {i}, "probas_class_1": {p!r}, "predictions": {y}}}\n'
+            for i, p, y in zip(ids.tolist(), y_proba.tolist(), y_pred.tolist())
+        ).encode()
+
+
+def arrow_blocs(resultats):
+    """Flux Arrow IPC : le schéma puis un record batch par bloc."""
+    import pyarrow as pa
+
+    schema = pa.schema(
+        [
+            ("SK_ID_CURR", pa.int64()),
+            ("probas_class_1", pa.float64()),
+            ("predictions", pa.int8()),
+        ]
+    )
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for ids, y_proba, y_pred in resultats:
+            batch = pa.record_batch(
+                [
+                    pa.array(ids.astype(np.int64)),
+                    pa.array(y_proba.astype(np.float64)),
+                    pa.array(y_pred.astype(np.int8)),
+                ],
+                schema=schema,
+            )
+            writer.write_batch(batch)
+            yield _vider(sink)
+    # Marqueur de fin de flux écrit à la fermeture du writer
+    yield _vider(sink)
+
+
+def _vider(sink):
+    contenu = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return contenu
+
+
+ENCODEURS = {"ndjson": ndjson_blocs, "arrow": arrow_blocs}
+TYPES_CONTENU = {
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Scoring par lots de fichiers clients")
+    parser.add_argument(
+        "fichiers", nargs="*", help="fichiers CSV/Parquet (défaut : data/*.csv)"
+    )
+    parser.add_argument("--format", choices=sorted(ENCODEURS), default="ndjson")
+    parser.add_argument("--taille-bloc", type=int, default=TAILLE_BLOC)
+    parser.add_argument("--dossier-sortie", default="scores")
+    parser.add_argument(
+        "--modele",
+        default=os.environ.get("MODELE_ACTIF", "model"),
+        help="version à utiliser (chemin relatif à api/models/ sans .pkl)",
+    )
+    parser.add_argument(
+        "--seuil", type=float, help="seuil métier forcé (défaut : seuil de la version)"
+    )
+    args = parser.parse_args(arguments)
+
+    from api.registre import VersionModele
+
+    version = VersionModele(
+        args.modele, os.path.join(dossier_modeles, f"{args.modele}.pkl")
+    )
+    seuil = version.seuil if args.seuil is None else args.seuil
+    print(f"Version {version.nom} ({version.empreinte}), seuil {seuil}")
+
+    def predire(X):
+        y_proba = version.predire_probas(X)
+        return (y_proba >= seuil).astype(int), y_proba
+
+    os.makedirs(args.dossier_sortie, exist_ok=True)
+    extension = "ndjson" if args.format == "ndjson" else "arrows"
+    fichiers = args.fichiers or sorted(glob.glob(os.path.join(chemin_data, "*.csv")))
+
+    for chemin in fichiers:
+        debut, n = time.perf_counter(), 0
+        nom = os.path.splitext(os.path.basename(chemin))[0]
+        chemin_sortie = os.path.join(args.dossier_sortie, f"{nom}_scores.{extension}")
+
+        with open(chemin, "rb") as entree, open(chemin_sortie, "wb") as sortie:
+            resultats = scorer_blocs(
+                lire_blocs(entree, taille_bloc=args.taille_bloc),
+                predire,
+                version.colonnes_entree,
+            )
+
+            def compter(resultats):
+                nonlocal n
+                for resultat in resultats:
+                    n += len(resultat[0])
+                    yield resultat
+
+            sortie.writelines(ENCODEURS[args.format](compter(resultats)))
+
+        print(
+            f"{chemin} -> {chemin_sortie} ({n} clients, {time.perf_counter() - debut:.1f} s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
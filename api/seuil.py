@@ -0,0 +1,123 @@
+"""Analyse du seuil de décision : courbes précision / rappel / coût métier sur tous les seuils.
+
+Un seul tri des probabilités (O(n log n)) puis des sommes cumulées donnent la matrice
+de confusion pour chaque seuil distinct : au seuil t, un client est prédit en défaut
+si sa probabilité est >= t. Le coût métier vaut cout_fn x FN + cout_fp x FP
+(README : FP + 10 x FN).
+"""
+
+import numpy as np
+
+COUT_FN = 10.0
+COUT_FP = 1.0
+MAX_POINTS = 1000
+
+
+class CourbeSeuils:
+    """Comptages cumulés par seuil distinct, calculés une fois ; les coûts sont recalculés à la demande."""
+
+    def __init__(self, probas, labels):
+        probas = np.asarray(probas, dtype=np.float64)
+        labels = np.asarray(labels)
+        if probas.ndim != 1 or len(probas) != len(labels) or len(probas) == 0:
+            raise ValueError(
+                "probas et labels doivent être deux vecteurs non vides de même longueur"
+            )
+        if np.isnan(probas).any():
+            raise ValueError("probas contient des NaN")
+        if not np.isin(labels, (0, 1)).all():
+            raise ValueError("labels doit ne contenir que 0 et 1")
+
+        ordre = np.argsort(-probas, kind="stable")
+        probas_triees = probas[ordre]
+        positifs_tries = labels[ordre].astype(np.int64)
+
+        # Dernière position de chaque valeur distinct de probabilité (ordre décroissant)
+        fins = np.concatenate(
+            [np.flatnonzero(np.diff(probas_triees)), [len(probas_triees) - 1]]
+        )
+        vp = np.cumsum(positifs_tries)[fins]
+        fp = (fins + 1) - vp
+
+        # Premier point : seuil au-dessus du maximum, aucun client prédit en défaut
+        self.seuils = np.concatenate(
+            [[np.nextafter(probas_triees[0], np.inf)], probas_triees[fins]]
+        )
+        self.vp = np.concatenate([[0], vp])
+        self.fp = np.concatenate([[0], fp])
+        self.n_positifs = int(positifs_tries.sum())
+        self.n_negatifs = len(probas) - self.n_positifs
+
+    def analyser(self, cout_fn=COUT_FN, cout_fp=COUT_FP, max_points=MAX_POINTS):
+        vp, fp = self.vp, self.fp
+        fn = self.n_positifs - vp
+        vn = self.n_negatifs - fp
+        with np.errstate(divide="ignore", invalid="ignore"):
+            precision = np.where(vp + fp > 0, vp / (vp + fp), 1.0)
+            rappel = vp / self.n_positifs if self.n_positifs else np.zeros(len(vp))
+            f1 = np.where(
+                precision + rappel > 0,
+                2 * precision * rappel / (precision + rappel),
+                0.0,
+            )
+        cout = cout_fn * fn + cout_fp * fp
+
+        # Coût minimal ; à égalité, le seuil le plus élevé (premier dans l'ordre décroissant)
+        i = int(np.argmin(cout))
+        optimum = {
+            "seuil": float(self.seuils[i]),
+            "cout": float(cout[i]),
+            "precision": float(precision[i]),
+            "rappel": float(rappel[i]),
+            "f1": float(f1[i]),
+            "vp": int(vp[i]),
+            "fp": int(fp[i]),
+            "fn": int(fn[i]),
+            "vn": int(vn[i]),
+        }
+
+        # Courbe sous-échantillonnée pour la réponse (l'optimum est calculé sur tous les seuils)
+        points = np.unique(
+            np.concatenate(
+                [
+                    np.linspace(0, len(cout) - 1, min(max_points, len(cout))).astype(
+                        int
+                    ),
+                    [i],
+                ]
+            )
+        )
+        return {
+            "n": self.n_positifs + self.n_negatifs,
+            "n_positifs": self.n_positifs,
+            "n_seuils": len(self.seuils),
+            "cout_fn": cout_fn,
+            "cout_fp": cout_fp,
+            "optimum": optimum,
+            "courbe": {
+                "seuil": np.minimum(self.seuils[points], 1.0).tolist(),
+                "precision": precision[points].tolist(),
+                "rappel": rappel[points].tolist(),
+                "f1": f1[points].tolist(),
+                "cout": cout[points].tolist(),
+            },
+        }
+
+
+def decoder_probas_labels(corps):
+    """Corps binaire : n probas float64 puis n labels int8 (little-endian), comme encoder_float64."""
+    if len(corps) == 0 or len(corps) % 9 != 0:
+        raise ValueError(
+            f"taille du corps ({len(corps)} octets) incompatible avec n float64 + n int8"
+        )
+    n = len(corps) // 9
+    return np.frombuffer(corps, dtype="<f8", count=n), np.frombuffer(
+        corps, dtype=np.int8, offset=8 * n
+    )
+
+
+def cout_au_seuil(courbe, seuil, cout_fn=COUT_FN, cout_fp=COUT_FP):
+    """Coût métier au seuil donné (dernier seuil distinct >= seuil)."""
+    i = max(int(np.searchsorted(-courbe.seuils, -seuil, side="right")) - 1, 0)
+    fn = courbe.n_positifs - courbe.vp[i]
+    return float(cout_fn * fn + cout_fp * courbe.fp[i])
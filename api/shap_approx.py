@@ -0,0 +1,141 @@
+"""SHAP global approché : échantillon stratifié croissant et intervalles de confiance bootstrap.
+
+Les lignes sont stratifiées par décile de risque prédit et CODE_GENDER, puis
+ordonnées de sorte que tout préfixe soit un échantillon stratifié proportionnel.
+Le préfixe double jusqu'à ce que l'intervalle de confiance de la moyenne |SHAP|
+de chaque feature soit plus étroit que `tolerance` x l'importance maximale,
+ou jusqu'à `n_max` lignes / `duree_max` secondes : le coût ne dépend plus de
+la taille du fichier.
+"""
+
+import time
+
+import numpy as np
+
+
+def strates(probas, genre=None, n_deciles=10):
+    """Identifiant de strate par ligne : décile de risque x CODE_GENDER."""
+    bornes = np.quantile(probas, np.linspace(0, 1, n_deciles + 1)[1:-1])
+    deciles = np.searchsorted(bornes, probas, side="right")
+    if genre is None:
+        return deciles
+    _, codes_genre = np.unique(
+        np.nan_to_num(np.asarray(genre, dtype=np.float64), nan=-1.0),
+        return_inverse=True,
+    )
+    return deciles * (codes_genre.max() + 1) + codes_genre
+
+
+def ordre_stratifie(strates_lignes, rng):
+    """Permutation dont chaque préfixe est un échantillon stratifié proportionnel.
+
+    Dans chaque strate (mélangée), la k-ième ligne reçoit le rang (k + u) / N_h ;
+    le tri sur ce rang entrelace les strates au prorata de leur effectif.
+    """
+    n = len(strates_lignes)
+    melange = rng.permutation(n)
+    strates_melangees = strates_lignes[melange]
+    ordre_strates = np.argsort(strates_melangees, kind="stable")
+    effectifs = np.bincount(strates_melangees)
+    debuts = np.concatenate([[0], np.cumsum(effectifs)[:-1]])
+    position = np.empty(n)
+    position[ordre_strates] = np.arange(n) - np.repeat(debuts, effectifs)
+    rang = (position + rng.random(n)) / effectifs[strates_melangees]
+    return melange[np.argsort(rang, kind="stable")]
+
+
+def importance_stratifiee(
+    abs_shap, strates_echantillon, poids_strates, n_bootstrap, rng
+):
+    """Moyenne |SHAP| pondérée par strate et ses réplicats bootstrap (rééchantillonnage intra-strate)."""
+    n_features = abs_shap.shape[1]
+    estimation = np.zeros(n_features)
+    replicats = np.zeros((n_bootstrap, n_features))
+    presentes = np.unique(strates_echantillon)
+    poids = poids_strates[presentes] / poids_strates[presentes].sum()
+    for strate, poids_h in zip(presentes, poids):
+        lignes = abs_shap[strates_echantillon == strate]
+        n_h = len(lignes)
+        estimation += poids_h * lignes.mean(axis=0)
+        # Poids multinomiaux : B moyennes bootstrap en un seul produit matriciel
+        tirages = rng.multinomial(n_h, np.full(n_h, 1 / n_h), size=n_bootstrap)
+        replicats += poids_h * (tirages @ lignes) / n_h
+    return estimation, replicats
+
+
+def shap_approx(
+    X_transforme,
+    probas,
+    calculer,
+    genre=None,
+    tolerance=0.05,
+    niveau=0.95,
+    n_initial=256,
+    n_max=4000,
+    duree_max=None,
+    n_bootstrap=200,
+    graine=0,
+):
+    """SHAP sur un échantillon stratifié croissant.
+
+    `calculer(X)` renvoie (valeurs, base_values) pour les lignes transformées X.
+    Renvoie un dict : indices des lignes retenues, leurs valeurs SHAP et base values,
+    et `approximation` (taille d'échantillon, importances et intervalles de confiance).
+    """
+    debut = time.perf_counter()
+    rng = np.random.default_rng(graine)
+    n_total = len(X_transforme)
+    strates_lignes = strates(np.asarray(probas), genre)
+    poids_strates = np.bincount(strates_lignes).astype(np.float64)
+    ordre = ordre_stratifie(strates_lignes, rng)
+    n_max = min(n_max or n_total, n_total)
+
+    valeurs, bases, n, iterations = [], [], 0, 0
+    alpha = (1 - niveau) / 2
+    while True:
+        cible = min(max(n_initial, 2 * n), n_max)
+        nouvelles = ordre[n:cible]
+        valeurs_lot, bases_lot = calculer(X_transforme[nouvelles])
+        valeurs.append(valeurs_lot)
+        bases.append(np.broadcast_to(bases_lot, (len(nouvelles),)))
+        n, iterations = cible, iterations + 1
+
+        shap_values = np.vstack(valeurs)
+        estimation, replicats = importance_stratifiee(
+            np.abs(shap_values),
+            strates_lignes[ordre[:n]],
+            poids_strates,
+            n_bootstrap,
+            rng,
+        )
+        ic_bas, ic_haut = np.quantile(replicats, [alpha, 1 - alpha], axis=0)
+        demi_largeur = (ic_haut - ic_bas) / 2
+        erreur_relative = float(demi_largeur.max() / max(estimation.max(), 1e-12))
+
+        converge = erreur_relative <= tolerance
+        if (
+            converge
+            or n >= n_max
+            or (duree_max is not None and time.perf_counter() - debut >= duree_max)
+        ):
+            break
+
+    return {
+        "indices": ordre[:n],
+        "shap_values": shap_values,
+        "base_values": np.concatenate(bases),
+        "approximation": {
+            "n_echantillon": n,
+            "n_total": n_total,
+            "iterations": iterations,
+            "converge": bool(converge),
+            "tolerance": tolerance,
+            "niveau": niveau,
+            "erreur_relative_max": erreur_relative,
+            "importance": estimation.tolist(),
+            "ic_bas": ic_bas.tolist(),
+            "ic_haut": ic_haut.tolist(),
+            "demi_largeur": demi_largeur.tolist(),
+            "duree_s": round(time.perf_counter() - debut, 3),
+        },
+    }
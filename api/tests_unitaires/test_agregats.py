@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from api.agregats import MAX_POINTS_NUAGE, densite_2d, histogramme, rang_centile
+from api.donnees_dashboard import CacheMemoire, JeuDonnees
+
+chemin_fichier = os.path.dirname(__file__)
+chemin_csv = os.path.join(chemin_fichier, "../../data", "sample_clients_5k.csv")
+
+
+def test_histogramme_et_cache(tmp_path):
+    jeu = JeuDonnees(chemin_csv, CacheMemoire(64 * 1024 * 1024), dossier=str(tmp_path))
+    data = pd.read_csv(chemin_csv)
+    hommes = (data["CODE_GENDER"] == 0).to_numpy()
+    appels = []
+
+    def masque():
+        appels.append(1)
+        return hommes
+
+    hist = histogramme(jeu, "EXT_SOURCE_1", ("sexe", 0), masque)
+    valeurs = data.loc[hommes, "EXT_SOURCE_1"].dropna().to_numpy()
+    attendus, _ = np.histogram(valeurs, bins=np.array(hist["bornes"]))
+    assert hist["comptes"] == attendus.tolist()
+    assert (
+        hist["n"] == hommes.sum()
+        and hist["n_manquants"] == data.loc[hommes, "EXT_SOURCE_1"].isna().sum()
+    )
+    assert abs(hist["quantiles"][0.5] - np.median(valeurs)) < 1e-12
+    assert abs(np.trapezoid(hist["kde_y"], hist["kde_x"]) - 1) < 0.05
+    assert abs(rang_centile(hist, np.median(valeurs)) - 50) <= 1
+
+    # Même fichier et même filtre : agrégat servi par le cache, masque non recalculé
+    assert histogramme(jeu, "EXT_SOURCE_1", ("sexe", 0), masque) is hist
+    assert len(appels) == 1
+
+
+def test_densite_2d_grille_et_petite_population(tmp_path):
+    jeu = JeuDonnees(chemin_csv, CacheMemoire(64 * 1024 * 1024), dossier=str(tmp_path))
+    data = pd.read_csv(chemin_csv)
+
+    densite = densite_2d(jeu, "DAYS_BIRTH", "AMT_CREDIT")
+    completes = data[["DAYS_BIRTH", "AMT_CREDIT"]].dropna()
+    assert np.array(densite["comptes"]).sum() == len(completes) == densite["n"]
+    assert len(data) > MAX_POINTS_NUAGE and densite["points"] is None
+
+    # Voisins (liste de positions) : peu de clients, points bruts
+    positions = [3, 10, 42]
+    voisins = densite_2d(
+        jeu,
+        "DAYS_BIRTH",
+        "AMT_CREDIT",
+        ("voisins", tuple(positions)),
+        lambda: positions,
+    )
+    assert voisins["points"] == [
+        data["DAYS_BIRTH"].iloc[positions].astype(float).tolist(),
+        data["AMT_CREDIT"].iloc[positions].astype(float).tolist(),
+    ]
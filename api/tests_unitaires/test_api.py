@@ -50,3 +50,39 @@ def test_predict_single_client():
     assert "probas_class_1" in json_response
     assert json_response["predictions"][0] in [0, 1]
     assert 0 <= json_response["probas_class_1"][0] <= 1
+
+
+def test_health_live_et_ready():
+    assert client.get("/health/live").status_code == 200
+
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    json_response = response.json()
+    assert json_response["predict"] is True
+    assert {"chargement_modele", "warmup"} <= set(json_response["etapes_demarrage"])
+
+    # Avec avec_shap, prêt seulement une fois l'explainer construit
+    from api.main import obtenir_explainer
+
+    obtenir_explainer()
+    response = client.get("/health/ready", params={"avec_shap": True})
+    assert response.status_code == 200
+    assert response.json()["shap"] == "pret"
+
+
+def test_shap_local_valeurs_manquantes():
+    # Client dont une colonne passthrough est vide : None dans le JSON
+    chemin_fichier = os.path.dirname(__file__)
+    data = pd.read_csv(
+        os.path.join(chemin_fichier, "../../data", "sample_clients_1k.csv")
+    )
+    data_client = data.drop(columns=["SK_ID_CURR"]).iloc[[15]]
+    data_json = (
+        data_client.astype(object).where(data_client.notna(), None).values.tolist()
+    )
+
+    response = client.post(
+        "/shap_local", json={"data": data_json, "columns": data_client.columns.tolist()}
+    )
+    assert response.status_code == 200
+    assert len(response.json()["features_transformed"]) == data_client.shape[1]
@@ -0,0 +1,60 @@
+import asyncio
+import json
+
+from api.bench_api import (
+    CibleInprocess,
+    charger_lignes,
+    comparer,
+    construire_corps,
+    executer,
+    resumer,
+)
+
+
+def resultat(p95_ms, debit_req_s, erreurs=0):
+    return {
+        "endpoint": "predict",
+        "fichier": "1k",
+        "taille_lot": 1,
+        "concurrence": 1,
+        "p95_ms": p95_ms,
+        "debit_req_s": debit_req_s,
+        "erreurs": erreurs,
+    }
+
+
+def test_comparer_reference():
+    reference = {"mode": "inprocess", "scenarios": [resultat(10.0, 100.0)]}
+    assert (
+        comparer(
+            {"mode": "inprocess", "scenarios": [resultat(11.0, 90.0)]}, reference, 0.2
+        )
+        == []
+    )
+
+    regressions = comparer(
+        {"mode": "inprocess", "scenarios": [resultat(13.0, 70.0, 2)]}, reference, 0.2
+    )
+    assert len(regressions) == 3
+    assert comparer({"mode": "uvicorn", "scenarios": []}, reference, 0.2)
+
+
+def test_scenario_inprocess():
+    lignes, colonnes = charger_lignes("1k")
+    corps = construire_corps(lignes, colonnes, taille_lot=5, n_requetes=300)
+    # Les lots parcourent le fichier en boucle
+    assert len(json.loads(corps[-1])["data"]) == 5
+
+    async def scenario():
+        cible = CibleInprocess()
+        try:
+            return await executer(
+                cible.client, "/predict", corps[:20], concurrence=4, duree_max=60
+            )
+        finally:
+            await cible.fermer()
+
+    latences, erreurs, duree = asyncio.run(scenario())
+    resume = resumer(latences, erreurs, duree, taille_lot=5)
+    assert resume["requetes"] == 20 and resume["erreurs"] == 0
+    assert resume["p50_ms"] <= resume["p95_ms"] <= resume["p99_ms"]
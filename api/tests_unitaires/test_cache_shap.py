@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+from api.cache_shap import CacheShap
+from api.main import app, cache_shap
+
+client = TestClient(app)
+
+chemin_fichier = os.path.dirname(__file__)
+chemin_csv = os.path.join(chemin_fichier, "../../data", "sample_clients.csv")
+
+
+def payload(data_client):
+    data_json = [
+        [
+            None if (isinstance(x, float) and (np.isnan(x) or np.isinf(x))) else x
+            for x in row
+        ]
+        for row in data_client.values.tolist()
+    ]
+    return {"data": data_json, "columns": data_client.columns.tolist()}
+
+
+def test_shap_local_puis_global_depuis_le_cache():
+    data = pd.read_csv(chemin_csv).drop(columns=["SK_ID_CURR"])
+    cache_shap.vider()
+
+    premier = client.post("/shap_local", json=payload(data.iloc[[0]]))
+    misses = cache_shap.misses
+    second = client.post("/shap_local", json=payload(data.iloc[[0]]))
+    assert premier.status_code == second.status_code == 200
+    assert premier.json() == second.json()
+    assert cache_shap.misses == misses
+
+    # Le global ne calcule que les lignes absentes (toutes sauf la première)
+    hits = cache_shap.hits
+    response = client.post("/shap_global", json=payload(data))
+    assert response.status_code == 200
+    assert cache_shap.hits == hits + 1
+    assert cache_shap.misses == misses + len(data) - 1
+    np.testing.assert_allclose(
+        response.json()["shap_values"][0], premier.json()["shap_values"]
+    )
+
+    stats = client.get("/shap_cache/stats").json()
+    assert stats["entrees"] == len(data)
+
+
+def calcul_factice(X):
+    return X * 2, np.zeros(len(X))
+
+
+def test_cache_lru_et_invalidation_modele(tmp_path):
+    chemin_modele = tmp_path / "model.pkl"
+    chemin_modele.write_bytes(b"v1")
+
+    # Limite mémoire d'environ 3 entrées de 10 float64
+    cache = CacheShap(str(chemin_modele), max_octets=3 * (80 + 200), ttl=60)
+    X = np.arange(50, dtype=np.float64).reshape(5, 10)
+
+    valeurs, _ = cache.explications(X, calcul_factice)
+    np.testing.assert_array_equal(valeurs, X * 2)
+    assert cache.stats()["entrees"] == 3
+    assert cache.evictions == 2
+
+    # Les 3 dernières lignes sont en cache, les 2 premières ont été évincées
+    cache.explications(X[2:], calcul_factice)
+    assert cache.hits == 3
+
+    # Changement du fichier modèle : nouvelle version et cache vidé
+    ancienne_version = cache.version_modele
+    chemin_modele.write_bytes(b"v2 plus long")
+    cache.explications(X[2:], calcul_factice)
+    assert cache.version_modele != ancienne_version
+    assert cache.hits == 3
+
+
+def test_cache_ttl(tmp_path):
+    chemin_modele = tmp_path / "model.pkl"
+    chemin_modele.write_bytes(b"v1")
+    cache = CacheShap(str(chemin_modele), ttl=0)
+
+    X = np.ones((2, 3))
+    cache.explications(X, calcul_factice)
+    cache.explications(X, calcul_factice)
+    assert cache.hits == 0
+    assert cache.misses == 4
@@ -0,0 +1,94 @@
+import gzip
+import json
+import os
+import socket
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+import uvicorn
+from fastapi.testclient import TestClient
+
+from api.client_api import ClientApi
+from api.main import app, model, registre
+
+chemin_fichier = os.path.dirname(__file__)
+chemin_csv = os.path.join(chemin_fichier, "../../data", "sample_clients_1k.csv")
+
+
+@pytest.fixture(scope="module")
+def url_api():
+    # Serveur uvicorn local dans un thread : le client passe par une vraie pile HTTP
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    serveur = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=serveur.run, daemon=True)
+    thread.start()
+    while not serveur.started:
+        time.sleep(0.05)
+    yield f"http://127.0.0.1:{port}"
+    serveur.should_exit = True
+    thread.join()
+
+
+def test_predire_et_expliquer_avec_cache(url_api):
+    data = pd.read_csv(chemin_csv).drop(columns=["SK_ID_CURR"])
+    client_api = ClientApi(base_url=url_api)
+    data_client = data.iloc[[15]]  # ligne avec des valeurs manquantes
+
+    prediction, explication = client_api.predire_et_expliquer(data_client)
+    attendu = model.predict_proba(data_client)[:, 1]
+    np.testing.assert_allclose(prediction["probas_class_1"], attendu, atol=1e-12)
+    assert prediction["predictions"] == (attendu >= 0.47).astype(int).tolist()
+    assert len(explication["shap_values"]) == data.shape[1]
+
+    # Même client : réponses servies par le cache, sans appel réseau
+    assert client_api.predire_et_expliquer(data_client) == (prediction, explication)
+    assert (client_api.hits, client_api.misses) == (2, 2)
+
+    # Ligne modifiée : nouvelle clé
+    modifie = data_client.copy()
+    modifie["DAYS_BIRTH"] -= 365
+    client_api.predire(modifie)
+    assert client_api.misses == 3
+    client_api.fermer()
+
+
+def test_corps_gzip_decompresse():
+    client = TestClient(app)
+    data = pd.read_csv(chemin_csv).drop(columns=["SK_ID_CURR"]).head(2).fillna(0)
+    corps = gzip.compress(
+        json.dumps(
+            {"data": data.values.tolist(), "columns": data.columns.tolist()}
+        ).encode()
+    )
+
+    response = client.post(
+        "/predict",
+        content=corps,
+        headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+    )
+    assert response.status_code == 200
+    assert len(response.json()["predictions"]) == 2
+
+    response = client.post(
+        "/predict", content=b"pas du gzip", headers={"Content-Encoding": "gzip"}
+    )
+    assert response.status_code == 400
+
+
+def test_seuil_et_analyse(url_api):
+    client_api = ClientApi(url_api)
+    assert client_api.seuil() == registre.actif.seuil
+
+    rng = np.random.default_rng(0)
+    probas = rng.random(10_000)
+    labels = (rng.random(10_000) < probas * 0.2).astype(int)
+    analyse = client_api.analyse_seuil(probas, labels, max_points=100)
+    assert analyse["n"] == 10_000 and len(analyse["courbe"]["seuil"]) <= 101
+    client_api.fermer()
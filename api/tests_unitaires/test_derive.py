@@ -0,0 +1,168 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import api.main
+from api.client_api import valeurs_json
+from api.derive import (
+    EsquisseDerive,
+    MoniteurDerive,
+    ProfilReference,
+    construire_profil,
+    ks,
+    psi,
+)
+from api.main import app, charger_moniteur_derive, colonnes_entree_modele, registre
+
+client = TestClient(app)
+
+chemin_fichier = os.path.dirname(__file__)
+chemin_csv = os.path.join(chemin_fichier, "../../data", "sample_clients_5k.csv")
+
+
+def donnees():
+    data = pd.read_csv(chemin_csv)[colonnes_entree_modele]
+    probas = np.random.default_rng(0).random(len(data))
+    return data, probas
+
+
+def test_esquisse_identique_au_comptage_par_colonne():
+    data, probas = donnees()
+    profil = ProfilReference.construire(data.iloc[:3000], probas[:3000])
+    X = data.iloc[3000:].to_numpy(dtype=np.float64)
+
+    esquisse = EsquisseDerive(X.shape[1])
+    esquisse.ajouter(X, probas[3000:], profil.bornes)
+    for j in range(X.shape[1]):
+        presentes = X[:, j][~np.isnan(X[:, j])]
+        cases = np.searchsorted(profil.bornes[j], presentes, side="right")
+        attendu = np.bincount(cases, minlength=profil.bornes.shape[1] + 1)
+        np.testing.assert_array_equal(esquisse.comptages[j, :-1], attendu)
+        assert esquisse.comptages[j, -1] == np.isnan(X[:, j]).sum()
+
+    # Fusion de deux moitiés = esquisse du lot entier
+    moitie_1, moitie_2 = EsquisseDerive(X.shape[1]), EsquisseDerive(X.shape[1])
+    moitie_1.ajouter(X[:1000], probas[3000:4000], profil.bornes)
+    moitie_2.ajouter(X[1000:], probas[4000:], profil.bornes)
+    fusion = moitie_1.fusionner(moitie_2)
+    np.testing.assert_array_equal(fusion.comptages, esquisse.comptages)
+    np.testing.assert_array_equal(fusion.comptages_probas, esquisse.comptages_probas)
+    assert fusion.n_lignes == len(X)
+
+
+def test_psi_ks_et_quantiles():
+    data, probas = donnees()
+    profil = ProfilReference.construire(data.iloc[:3000], probas[:3000])
+    j = profil.colonnes.index("DAYS_BIRTH")
+
+    meme_population = EsquisseDerive(len(profil.colonnes))
+    meme_population.ajouter(
+        data.iloc[3000:].to_numpy(dtype=np.float64), probas[3000:], profil.bornes
+    )
+    decalee = data.iloc[3000:].copy()
+    decalee["DAYS_BIRTH"] += 3650  # clients plus jeunes de 10 ans
+    derive = EsquisseDerive(len(profil.colonnes))
+    derive.ajouter(decalee.to_numpy(dtype=np.float64), probas[3000:], profil.bornes)
+
+    reference = profil.esquisse.comptages
+    assert psi(reference, meme_population.comptages)[j] < 0.05
+    assert psi(reference, derive.comptages)[j] > 0.5
+    assert ks(reference[:, :-1], derive.comptages[:, :-1])[j] > 0.2
+
+    # Médiane approchée à une case près
+    mediane = profil.quantiles(meme_population.comptages, [0.5])[j, 0]
+    assert (
+        abs(mediane - data["DAYS_BIRTH"].iloc[3000:].median())
+        < np.diff(profil.bornes[j]).max()
+    )
+
+
+def test_fusion_entre_workers(tmp_path):
+    data, probas = donnees()
+    profil = ProfilReference.construire(data, probas)
+    worker_1 = MoniteurDerive(profil, dossier_partage=str(tmp_path))
+    worker_2 = MoniteurDerive(profil, dossier_partage=str(tmp_path))
+    worker_2.chemin_publication = str(tmp_path / "worker-autre.npz")
+
+    worker_1.soumettre(data.iloc[:100], probas[:100])
+    worker_2.soumettre(data.iloc[100:350], probas[100:350])
+    worker_1.attendre()
+    worker_2.publier()
+
+    esquisse, workers = worker_1.esquisse_globale()
+    assert workers == 2 and esquisse.n_lignes == 350
+    assert worker_1.rapport(top=3)["n_lignes"] == 350
+    assert worker_1.rapport(top=3, tous_workers=False)["n_lignes"] == 100
+
+
+@pytest.fixture
+def moniteur_derive(tmp_path, monkeypatch):
+    # Le profil est précalculé au build (python -m api.derive) : le test construit le sien
+    construire_profil(chemin_csv, registre.actif).sauvegarder(str(tmp_path))
+    moniteur = charger_moniteur_derive(str(tmp_path))
+    moniteur.dossier_partage = str(tmp_path / "workers")
+    moniteur.chemin_publication = str(tmp_path / "workers" / "worker-test.npz")
+    monkeypatch.setattr(api.main, "moniteur_derive", moniteur)
+    return moniteur
+
+
+def test_sauvegarde_et_profil_absent(tmp_path):
+    assert charger_moniteur_derive(str(tmp_path)) is None
+    data, probas = donnees()
+    ProfilReference.construire(data, probas, version="test").sauvegarder(str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == ["bornes.npz", "meta.json", "reference.npz"]
+    profil = ProfilReference.charger(str(tmp_path))
+    np.testing.assert_array_equal(
+        profil.esquisse.comptages,
+        ProfilReference.construire(data, probas).esquisse.comptages,
+    )
+
+    # Profil illisible : l'API démarre sans suivi de dérive
+    (tmp_path / "bornes.npz").write_bytes(b"tronque")
+    assert charger_moniteur_derive(str(tmp_path)) is None
+
+
+def test_endpoint_derive(moniteur_derive):
+    data = pd.read_csv(chemin_csv).drop(columns=["SK_ID_CURR"]).head(200)
+
+    response = client.post(
+        "/predict", json={"data": valeurs_json(data), "columns": data.columns.tolist()}
+    )
+    assert response.status_code == 200
+    moniteur_derive.attendre()
+
+    rapport = client.get("/derive", params={"top": 5}).json()
+    assert rapport["n_lignes"] >= 200 and len(rapport["colonnes"]) == 5
+    assert rapport["colonnes"][0]["psi"] >= rapport["colonnes"][-1]["psi"]
+    assert rapport["probas"]["psi"] is not None
+    assert "api_derive_psi_max" in client.get("/metrics").text
+
+
+def test_nettoyage_des_publications(tmp_path):
+    data, probas = donnees()
+    profil = ProfilReference.construire(data.iloc[:500], probas[:500])
+    worker = MoniteurDerive(
+        profil, duree_tranche=60, n_tranches=2, dossier_partage=str(tmp_path)
+    )
+    worker.soumettre(data.iloc[:100], probas[:100])
+    worker.attendre()
+    worker.publier()
+
+    # Fichiers d'autres workers : un inactif depuis plus d'une fenêtre, un simplement en retard
+    ancien, en_retard = tmp_path / "worker-1.npz", tmp_path / "worker-2.npz"
+    for chemin, age in ((ancien, 3600), (en_retard, 90)):
+        worker.esquisse_locale().exporter(str(chemin))
+        os.utime(chemin, (time.time() - age, time.time() - age))
+
+    esquisse, workers = worker.esquisse_globale()
+    assert workers == 1 and esquisse.n_lignes == 100
+    assert not ancien.exists() and en_retard.exists()
+
+    # À la sortie du processus, le worker retire son propre fichier
+    worker.retirer_publication()
+    assert not os.path.exists(worker.chemin_publication)
+    worker.retirer_publication()
@@ -0,0 +1,75 @@
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from api.donnees_dashboard import CacheMemoire, JeuDonnees, convertir_parquet
+
+chemin_fichier = os.path.dirname(__file__)
+chemin_csv = os.path.join(chemin_fichier, "../../data", "sample_clients_1k.csv")
+
+
+def test_client_et_colonnes_depuis_parquet(tmp_path):
+    cache = CacheMemoire(64 * 1024 * 1024)
+    jeu = JeuDonnees(chemin_csv, cache, dossier=str(tmp_path))
+    assert os.path.exists(os.path.join(tmp_path, "sample_clients_1k.parquet"))
+
+    data = pd.read_csv(chemin_csv)
+    assert jeu.colonnes == data.columns.tolist()
+    assert jeu.ids() == data["SK_ID_CURR"].unique().tolist()
+
+    id_client = data["SK_ID_CURR"].iloc[123]
+    pd.testing.assert_frame_equal(
+        jeu.client(id_client).reset_index(drop=True),
+        data.iloc[[123]].reset_index(drop=True),
+    )
+    assert jeu.donnees(["DAYS_BIRTH"]).columns.tolist() == ["DAYS_BIRTH"]
+
+    # Second accès : servi par le cache
+    hits = cache.hits
+    jeu.client(id_client)
+    assert cache.hits > hits
+
+
+def test_donnees_sans_double_stockage(tmp_path):
+    cache = CacheMemoire(64 * 1024 * 1024)
+    jeu = JeuDonnees(chemin_csv, cache, dossier=str(tmp_path))
+    colonnes = ["DAYS_BIRTH", "AMT_CREDIT"]
+    data = jeu.donnees(colonnes)
+    assert data.columns.tolist() == colonnes
+
+    # Seules les colonnes sont en cache, et le DataFrame partage leur mémoire
+    octets = cache.stats()["octets"]
+    assert octets == sum(
+        jeu.colonne(nom).memory_usage(deep=True, index=True) for nom in colonnes
+    )
+    for nom in colonnes:
+        assert np.shares_memory(data[nom].to_numpy(), jeu.colonne(nom).to_numpy())
+    jeu.donnees(colonnes)
+    assert cache.stats()["octets"] == octets
+
+
+def test_conversion_unique_et_reconversion(tmp_path):
+    copie = os.path.join(tmp_path, "clients.csv")
+    shutil.copy(chemin_csv, copie)
+    chemin_parquet = convertir_parquet(copie, str(tmp_path))
+    date = os.path.getmtime(chemin_parquet)
+    assert convertir_parquet(copie, str(tmp_path)) == chemin_parquet
+    assert os.path.getmtime(chemin_parquet) == date
+
+    # CSV modifié après la conversion : nouveau Parquet
+    time.sleep(0.01)
+    pd.read_csv(copie).head(10).to_csv(copie, index=False)
+    os.utime(copie, (date + 1, date + 1))
+    assert len(pd.read_parquet(convertir_parquet(copie, str(tmp_path)))) == 10
+
+
+def test_cache_borne_en_memoire():
+    cache = CacheMemoire(max_octets=20_000)
+    for i in range(10):
+        cache.obtenir(("serie", i), lambda: pd.Series(range(1000), dtype="int64"))
+    stats = cache.stats()
+    assert stats["octets"] <= 20_000
+    assert stats["evictions"] > 0
@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+from api.client_api import valeurs_json
+from api.format_shap import decoder_float32, resume_beeswarm, top_k
+from api.main import app, feature_names
+
+client = TestClient(app)
+
+chemin_fichier = os.path.dirname(__file__)
+chemin_csv = os.path.join(chemin_fichier, "../../data", "sample_clients.csv")
+
+
+def payload():
+    data = pd.read_csv(chemin_csv).drop(columns=["SK_ID_CURR"])
+    return {"data": valeurs_json(data), "columns": data.columns.tolist()}
+
+
+def test_modes_shap_global_coherents_avec_complet():
+    complet = client.post("/shap_global", json=payload()).json()
+    shap_values = np.array(complet["shap_values"])
+    features = np.array(complet["features_transformed"])
+
+    # Binaire float32 : mêmes matrices à la précision float32 près
+    response = client.post("/shap_global", json=payload(), params={"mode": "binaire"})
+    assert response.status_code == 200
+    n_lignes, n_features = (
+        int(response.headers["x-lignes"]),
+        int(response.headers["x-features"]),
+    )
+    valeurs, features_binaire, base_values = decoder_float32(
+        response.content, n_lignes, n_features
+    )
+    np.testing.assert_allclose(valeurs, shap_values, rtol=1e-6, atol=1e-6)
+    np.testing.assert_allclose(features_binaire, features, rtol=1e-6, atol=1e-6)
+    assert len(base_values) == n_lignes
+
+    # Top-K global : colonnes de plus forte moyenne |SHAP|
+    res = client.post(
+        "/shap_global", json=payload(), params={"mode": "top_k", "k": 5}
+    ).json()
+    attendu = np.argsort(-np.abs(shap_values).mean(axis=0), kind="stable")[:5]
+    assert res["feature_names"] == [feature_names[i] for i in attendu]
+    np.testing.assert_allclose(res["shap_values"], shap_values[:, attendu])
+
+    res = client.post(
+        "/shap_global", json=payload(), params={"mode": "resume", "bins": 4}
+    ).json()
+    assert res["n_lignes"] == len(shap_values)
+    assert all(sum(f["effectifs"]) == len(shap_values) for f in res["features"])
+
+    assert (
+        client.post(
+            "/shap_global", json=payload(), params={"mode": "inconnu"}
+        ).status_code
+        == 400
+    )
+
+
+def test_top_k_par_ligne():
+    rng = np.random.default_rng(0)
+    shap_values, features = rng.normal(size=(50, 30)), rng.normal(size=(50, 30))
+    noms = [f"f{i}" for i in range(30)]
+    res = top_k(shap_values, features, noms, k=3, portee="ligne")
+    attendu = np.argsort(-np.abs(shap_values), axis=1)[:, :3]
+    assert res["indices"] == attendu.tolist()
+    np.testing.assert_allclose(
+        res["features_transformed"], np.take_along_axis(features, attendu, axis=1)
+    )
+
+
+def test_resume_beeswarm_quantiles():
+    features = np.repeat([0.0, 1.0], 100)[:, None]
+    shap_values = np.concatenate([np.linspace(-1, 0, 100), np.linspace(0, 2, 100)])[
+        :, None
+    ]
+    feature = resume_beeswarm(shap_values, features, ["x"], bins=2)["features"][0]
+    assert feature["effectifs"] == [100, 100]
+    assert feature["valeur_moyenne"] == [0.0, 1.0]
+    assert (
+        feature["shap_quantiles"]["0.05"][0] < 0 < feature["shap_quantiles"]["0.05"][1]
+    )
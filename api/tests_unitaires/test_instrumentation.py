@@ -0,0 +1,77 @@
+import os
+import time
+
+import pandas as pd
+from fastapi.testclient import TestClient
+
+from api.instrumentation import Metriques, ProfileurEchantillonnage
+from api.main import app
+
+client = TestClient(app)
+
+chemin_fichier = os.path.dirname(__file__)
+chemin_csv = os.path.join(chemin_fichier, "../../data", "sample_clients.csv")
+
+
+def test_metrics_etapes_et_server_timing():
+    data = pd.read_csv(chemin_csv).drop(columns=["SK_ID_CURR"]).head(3)
+    # NaN -> None pour la sérialisation JSON
+    valeurs = data.astype(object).where(data.notna(), None).values.tolist()
+    payload = {"data": valeurs, "columns": data.columns.tolist()}
+
+    response = client.post("/predict", json=payload, headers={"X-Server-Timing": "1"})
+    assert response.status_code == 200
+    server_timing = response.headers["server-timing"]
+    assert "dataframe;dur=" in server_timing and "score;dur=" in server_timing
+    assert "serialisation;dur=" in server_timing
+    assert "total;dur=" in server_timing
+
+    # Sans l'en-tête de la requête (et SERVER_TIMING non défini), pas de Server-Timing
+    assert "server-timing" not in client.post("/predict", json=payload).headers
+
+    texte = client.get("/metrics").text
+    assert (
+        'api_etape_duree_secondes_bucket{endpoint="/predict",etape="score",le="+Inf"}'
+        in texte
+    )
+    assert (
+        'api_etape_duree_secondes_quantile{endpoint="/predict",etape="total",quantile="0.95"}'
+        in texte
+    )
+    assert 'api_requetes_total{endpoint="/predict",code="200"}' in texte
+    assert 'api_lignes_par_requete_sum{endpoint="/predict"}' in texte
+    assert "api_micro_batch_lignes_total" in texte
+
+
+def test_histogramme_cumulatif():
+    metriques = Metriques()
+    for duree in (0.001, 0.003, 0.2):
+        metriques.observer_duree("/x", "score", duree)
+    texte = metriques.exposition_prometheus()
+    assert (
+        'api_etape_duree_secondes_bucket{endpoint="/x",etape="score",le="0.005"} 2'
+        in texte
+    )
+    assert (
+        'api_etape_duree_secondes_bucket{endpoint="/x",etape="score",le="+Inf"} 3'
+        in texte
+    )
+    assert 'api_etape_duree_secondes_count{endpoint="/x",etape="score"} 3' in texte
+
+
+def test_metriques_inactives():
+    metriques = Metriques(actif=False)
+    with metriques.etape("/x", "score"):
+        pass
+    metriques.observer_lignes("/x", 10)
+    assert metriques.durees == {} and metriques.lignes == {}
+
+
+def test_profileur_echantillonnage():
+    profileur = ProfileurEchantillonnage(intervalle=0.001).demarrer()
+    fin = time.perf_counter() + 0.05
+    while time.perf_counter() < fin:
+        sum(range(1000))
+    profileur.arreter()
+    assert profileur.echantillons > 0
+    assert "test_profileur_echantillonnage" in profileur.rapport()
@@ -0,0 +1,127 @@
+import asyncio
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import api.main
+from api.client_api import valeurs_json
+from api.main import app
+from api.micro_batch import MicroBatcher
+
+client = TestClient(app)
+
+chemin_fichier = os.path.dirname(__file__)
+chemin_csv = os.path.join(chemin_fichier, "../../data", "sample_clients_1k.csv")
+
+
+def test_micro_batch_regroupe_et_redistribue():
+    appels = []
+
+    def fonction_score(X):
+        appels.append(len(X))
+        return X["a"].to_numpy() * 10
+
+    batcher = MicroBatcher(fonction_score, ["a", "b"], fenetre_ms=20, max_lignes=64)
+
+    async def scenario():
+        requetes = [pd.DataFrame({"a": [float(i)], "b": [0.0]}) for i in range(10)]
+        return await asyncio.gather(*(batcher.soumettre(X) for X in requetes))
+
+    resultats = asyncio.run(scenario())
+
+    # Un seul appel vectorisé pour les 10 requêtes, résultats dans le bon ordre
+    assert appels == [10]
+    assert [float(r[0]) for r in resultats] == [i * 10.0 for i in range(10)]
+
+
+def test_micro_batch_erreur_isolee():
+    def fonction_score(X):
+        if X["a"].isna().any():
+            raise ValueError("valeur invalide")
+        return X["a"].to_numpy()
+
+    batcher = MicroBatcher(fonction_score, ["a"], fenetre_ms=20, max_lignes=64)
+
+    async def scenario():
+        ok = batcher.soumettre(pd.DataFrame({"a": [1.0]}))
+        ko = batcher.soumettre(pd.DataFrame({"a": [np.nan]}))
+        return await asyncio.gather(ok, ko, return_exceptions=True)
+
+    ok, ko = asyncio.run(scenario())
+
+    # Seule la requête fautive reçoit l'erreur
+    assert float(ok[0]) == 1.0
+    assert isinstance(ko, ValueError)
+
+
+def test_micro_batch_lot_plein_sans_attendre():
+    batcher = MicroBatcher(
+        lambda X: X["a"].to_numpy(), ["a"], fenetre_ms=10_000, max_lignes=4
+    )
+
+    async def scenario():
+        requetes = [pd.DataFrame({"a": [float(i)]}) for i in range(4)]
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.soumettre(X) for X in requetes)), timeout=5
+        )
+
+    # Le lot part dès max_lignes atteint, sans attendre la fenêtre de 10 s
+    resultats = asyncio.run(scenario())
+    assert [float(r[0]) for r in resultats] == pytest.approx([0.0, 1.0, 2.0, 3.0])
+
+
+def test_micro_batch_colonnes_de_la_version_active():
+    appels = []
+    colonnes = ["a", "b"]
+
+    def fonction_score(X):
+        appels.append(list(X.columns))
+        return X["a"].to_numpy()
+
+    batcher = MicroBatcher(
+        fonction_score, lambda: colonnes, fenetre_ms=20, max_lignes=64
+    )
+
+    async def scenario():
+        anciennes = [
+            batcher.soumettre(pd.DataFrame({"a": [1.0], "b": [0.0]})) for _ in range(2)
+        ]
+        taches = [asyncio.ensure_future(requete) for requete in anciennes]
+        await asyncio.sleep(0)
+        # Bascule vers une version aux colonnes réordonnées pendant la fenêtre
+        colonnes[:] = ["b", "a"]
+        nouvelles = [
+            batcher.soumettre(pd.DataFrame({"b": [0.0], "a": [2.0]})) for _ in range(3)
+        ]
+        return await asyncio.gather(*taches, *nouvelles)
+
+    resultats = asyncio.run(scenario())
+    # Deux lots distincts, chacun dans l'ordre de colonnes de sa version
+    assert appels == [["a", "b"], ["b", "a"]]
+    assert [float(r[0]) for r in resultats] == [1.0, 1.0, 2.0, 2.0, 2.0]
+    assert batcher.lots_scores == 2 and batcher.lignes_scorees == 5
+
+
+def test_predict_gros_lot_hors_boucle(monkeypatch):
+    appels = []
+
+    async def espion(fonction, *args, **kwargs):
+        appels.append(fonction if fonction is pd.DataFrame else fonction.__name__)
+        return fonction(*args, **kwargs)
+
+    monkeypatch.setattr(api.main, "run_in_threadpool", espion)
+    data = pd.read_csv(chemin_csv).drop(columns=["SK_ID_CURR"])
+    corps = {"data": valeurs_json(data.head(3)), "columns": data.columns.tolist()}
+    assert client.post("/predict", json=corps).status_code == 200
+    assert appels == []  # petite requête : construite et rendue sur la boucle
+
+    gros = data.head(api.main.micro_batcher.max_lignes)
+    corps = {"data": valeurs_json(gros), "columns": data.columns.tolist()}
+    reponse = client.post("/predict", json=corps)
+    assert reponse.status_code == 200 and len(reponse.json()["predictions"]) == len(
+        gros
+    )
+    assert appels == [pd.DataFrame, "reponse_predictions"]
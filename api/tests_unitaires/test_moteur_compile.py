@@ -0,0 +1,47 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from api.moteur_compile import MoteurCompile
+
+chemin_fichier = os.path.dirname(__file__)
+chemin_data = os.path.join(chemin_fichier, "../../data")
+chemin_modele = os.path.join(chemin_fichier, "..", "models", "model.pkl")
+
+with open(chemin_modele, "rb") as file:
+    model = pickle.load(file)
+
+moteur = MoteurCompile(model)
+
+
+@pytest.mark.parametrize(
+    "fichier", ["sample_clients.csv", "sample_clients_1k.csv", "sample_clients_5k.csv"]
+)
+def test_moteur_equivalent_pipeline(fichier):
+    data = pd.read_csv(os.path.join(chemin_data, fichier)).drop(columns=["SK_ID_CURR"])
+
+    attendu = model.predict_proba(data)
+    obtenu = moteur.predict_proba(data)
+
+    np.testing.assert_allclose(obtenu, attendu, rtol=0, atol=1e-12)
+    np.testing.assert_allclose(
+        moteur.transformer(data),
+        model.named_steps["preprocessor"].transform(data),
+        rtol=0,
+        atol=1e-12,
+    )
+
+
+def test_moteur_ligne_unique_colonnes_melangees():
+    data = pd.read_csv(os.path.join(chemin_data, "sample_clients.csv")).drop(
+        columns=["SK_ID_CURR"]
+    )
+    ligne = data.iloc[[3]]
+
+    attendu = model.predict_proba(ligne)[:, 1]
+    obtenu = moteur.predict_proba(ligne[ligne.columns[::-1]])[:, 1]
+
+    np.testing.assert_allclose(obtenu, attendu, rtol=0, atol=1e-12)
@@ -0,0 +1,47 @@
+import os
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+import api.main
+from api.main import app, chemin_modele, obtenir_explainer, preprocessor
+from api.pool_processus import PoolShap
+
+client = TestClient(app)
+explainer = obtenir_explainer()
+
+chemin_fichier = os.path.dirname(__file__)
+chemin_csv = os.path.join(chemin_fichier, "../../data", "sample_clients_1k.csv")
+
+
+def test_pool_shap_identique_au_calcul_direct(monkeypatch):
+    data = pd.read_csv(chemin_csv).head(150).drop(columns=["SK_ID_CURR"])
+    X = preprocessor.transform(data)
+
+    pool = PoolShap(explainer, chemin_modele, nb_workers=2, taille_bloc_min=32)
+    try:
+        assert os.getpid() not in pool.pids
+
+        shap_values, base_values = pool.calculer(X)
+        np.testing.assert_allclose(
+            shap_values, explainer.shap_values(X), rtol=0, atol=1e-12
+        )
+        assert base_values.shape == (len(X),)
+
+        # Endpoint global servi par le pool (cache vidé pour forcer le calcul)
+        monkeypatch.setattr(api.main, "pool_shap", pool)
+        api.main.cache_shap.vider()
+        data_json = [
+            [None if np.isnan(x) else x for x in row]
+            for row in data.head(40).values.tolist()
+        ]
+        response = client.post(
+            "/shap_global", json={"data": data_json, "columns": data.columns.tolist()}
+        )
+        assert response.status_code == 200
+        np.testing.assert_allclose(
+            response.json()["shap_values"], shap_values[:40], atol=1e-12
+        )
+    finally:
+        pool.arreter()
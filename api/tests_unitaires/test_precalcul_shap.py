@@ -0,0 +1,101 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import api.main
+from api.main import app, feature_names, obtenir_explainer, preprocessor, version_modele
+from api.precalcul_shap import ArtefactsShap, indices_page, precalculer
+
+client = TestClient(app)
+explainer = obtenir_explainer()
+
+chemin_fichier = os.path.dirname(__file__)
+chemin_csv = os.path.join(chemin_fichier, "../../data", "sample_clients.csv")
+
+
+def test_shap_precalcule_servi_par_api(tmp_path, monkeypatch):
+    dossier, calcule = precalculer(
+        chemin_csv,
+        preprocessor,
+        explainer,
+        feature_names,
+        version_modele,
+        dossier_racine=tmp_path,
+    )
+    assert calcule
+    # Empreintes identiques : rien à recalculer
+    assert precalculer(
+        chemin_csv,
+        preprocessor,
+        explainer,
+        feature_names,
+        version_modele,
+        dossier_racine=tmp_path,
+    ) == (dossier, False)
+
+    monkeypatch.setattr(api.main, "artefacts_shap", ArtefactsShap(str(tmp_path)))
+    assert client.get("/shap_global/precalcule").json() == {
+        "datasets": ["sample_clients"]
+    }
+
+    response = client.get(
+        "/shap_global/precalcule/sample_clients", params={"offset": 5, "limit": 10}
+    )
+    assert response.status_code == 200
+    res_json = response.json()
+    assert res_json["n_total"] == 20
+    assert len(res_json["shap_values"]) == 10
+
+    # Mêmes valeurs (à la précision float32 près) qu'un calcul direct
+    data = pd.read_csv(chemin_csv)
+    attendu = explainer.shap_values(
+        preprocessor.transform(data.drop(columns=["SK_ID_CURR"]))
+    )
+    np.testing.assert_allclose(
+        res_json["shap_values"], attendu[5:15], rtol=1e-5, atol=1e-6
+    )
+    assert res_json["ids"] == data["SK_ID_CURR"].iloc[5:15].tolist()
+    assert res_json["feature_names"] == feature_names
+
+    # Paramètres de page invalides : 400 plutôt qu'une page décalée ou vide
+    for params in ({"offset": -5}, {"limit": -1}, {"echantillon": 0}):
+        response = client.get("/shap_global/precalcule/sample_clients", params=params)
+        assert response.status_code == 400
+
+
+def test_shap_precalcule_absent_ou_obsolete(tmp_path, monkeypatch):
+    precalculer(
+        chemin_csv,
+        preprocessor,
+        explainer,
+        feature_names,
+        "autre_modele",
+        dossier_racine=tmp_path,
+    )
+    monkeypatch.setattr(api.main, "artefacts_shap", ArtefactsShap(str(tmp_path)))
+
+    assert client.get("/shap_global/precalcule/inconnu").status_code == 404
+    assert client.get("/shap_global/precalcule/sample_clients").status_code == 409
+
+    with open(os.path.join(tmp_path, "sample_clients", "meta.json")) as file:
+        assert json.load(file)["empreinte_modele"] == "autre_modele"
+
+
+def test_indices_page_echantillon():
+    assert indices_page(100, offset=90).tolist() == list(range(90, 100))
+    indices = indices_page(1_000_000, echantillon=500)
+    assert len(indices) == 500
+    assert indices[0] == 0 and indices[-1] == 999_999
+
+
+def test_indices_page_bornes():
+    assert indices_page(100, offset=250, limit=10).tolist() == []
+    assert indices_page(100, offset=95, limit=10).tolist() == list(range(95, 100))
+    assert indices_page(100, echantillon=1).tolist() == [0]
+    for params in ({"offset": -5}, {"limit": -1}, {"echantillon": 0}):
+        with pytest.raises(ValueError):
+            indices_page(100, **params)
@@ -0,0 +1,105 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from fastapi.testclient import TestClient
+
+from api.main import app
+
+client = TestClient(app)
+
+chemin_fichier = os.path.dirname(__file__)
+chemin_csv = os.path.join(chemin_fichier, "../../data", "sample_clients_1k.csv")
+
+
+def charger_clients(n=200):
+    data = pd.read_csv(chemin_csv).head(n)
+    return data.drop(columns=["SK_ID_CURR"])
+
+
+def predict_json(data_client):
+    data_json = [
+        [
+            None if (isinstance(x, float) and (np.isnan(x) or np.isinf(x))) else x
+            for x in row
+        ]
+        for row in data_client.values.tolist()
+    ]
+    response = client.post(
+        "/predict", json={"data": data_json, "columns": data_client.columns.tolist()}
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_predict_colonnes_float64_parite_json():
+    data_client = charger_clients()
+    attendu = predict_json(data_client)
+
+    # Buffers float64 colonne par colonne, ordre des colonnes mélangé
+    colonnes = data_client.columns.tolist()[::-1]
+    corps = np.ascontiguousarray(
+        data_client[colonnes].to_numpy(dtype="<f8").T
+    ).tobytes()
+
+    response = client.post(
+        "/predict_colonnes",
+        content=corps,
+        headers={
+            "Content-Type": "application/octet-stream",
+            "X-Colonnes": ",".join(colonnes),
+        },
+    )
+    assert response.status_code == 200
+    n = int(response.headers["X-Lignes"])
+    assert n == len(data_client)
+
+    probas = np.frombuffer(response.content[: 8 * n], dtype="<f8")
+    predictions = np.frombuffer(response.content[8 * n :], dtype=np.int8)
+    np.testing.assert_allclose(probas, attendu["probas_class_1"], rtol=0, atol=1e-12)
+    assert predictions.tolist() == attendu["predictions"]
+
+
+def test_predict_colonnes_arrow_parite_json():
+    data_client = charger_clients()
+    attendu = predict_json(data_client)
+
+    table = pa.Table.from_pandas(data_client, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    response = client.post(
+        "/predict_colonnes",
+        content=sink.getvalue().to_pybytes(),
+        headers={"Content-Type": "application/vnd.apache.arrow.stream"},
+    )
+    assert response.status_code == 200
+
+    resultat = pa.ipc.open_stream(response.content).read_all()
+    np.testing.assert_allclose(
+        resultat.column("probas_class_1").to_numpy(),
+        attendu["probas_class_1"],
+        rtol=0,
+        atol=1e-12,
+    )
+    assert resultat.column("predictions").to_pylist() == attendu["predictions"]
+
+
+def test_predict_colonnes_colonne_manquante():
+    data_client = charger_clients(5)
+    colonnes = data_client.columns.tolist()[1:]
+    corps = np.ascontiguousarray(
+        data_client[colonnes].to_numpy(dtype="<f8").T
+    ).tobytes()
+
+    response = client.post(
+        "/predict_colonnes",
+        content=corps,
+        headers={
+            "Content-Type": "application/octet-stream",
+            "X-Colonnes": ",".join(colonnes),
+        },
+    )
+    assert response.status_code == 400
@@ -0,0 +1,99 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+import api.main
+from api.client_api import valeurs_json
+from api.main import app, registre
+from api.registre import RegistreModeles
+
+client = TestClient(app)
+
+chemin_fichier = os.path.dirname(__file__)
+chemin_csv = os.path.join(chemin_fichier, "../../data", "sample_clients.csv")
+dossier_modeles = os.path.join(chemin_fichier, "..", "models")
+
+
+def payload():
+    data = pd.read_csv(chemin_csv).drop(columns=["SK_ID_CURR"])
+    return data, {"data": valeurs_json(data), "columns": data.columns.tolist()}
+
+
+def test_versions_disponibles():
+    assert list(registre.disponibles()) == ["model", "old/model"]
+    assert registre.actif.nom == "model"
+
+
+def test_bascule_a_chaud_par_admin(monkeypatch):
+    data, corps = payload()
+    assert client.get("/admin/modeles").status_code == 403
+
+    monkeypatch.setattr(api.main, "jeton_admin", "secret")
+    entetes = {"X-Admin-Token": "secret"}
+    assert (
+        client.get("/admin/modeles", headers={"X-Admin-Token": "faux"}).status_code
+        == 401
+    )
+    assert (
+        client.post(
+            "/admin/modeles/activer", params={"nom": "inconnu"}, headers=entetes
+        ).status_code
+        == 404
+    )
+
+    version_initiale = client.get("/version").json()["version_modele"]
+    try:
+        response = client.post(
+            "/admin/modeles/activer", params={"nom": "old/model"}, headers=entetes
+        )
+        assert response.status_code == 200
+        assert response.json()["actif"] == "old/model"
+        assert client.get("/version").json()["version_modele"] != version_initiale
+
+        # Prédictions et SHAP servis par l'ancienne version
+        ancienne = registre.charger("old/model")
+        probas = client.post("/predict", json=corps).json()["probas_class_1"]
+        np.testing.assert_allclose(
+            probas, ancienne.pipeline.predict_proba(data)[:, 1], atol=1e-12
+        )
+        assert client.post("/shap_local", json=corps).status_code == 200
+    finally:
+        registre.activer("model")
+    assert client.get("/version").json()["version_modele"] == version_initiale
+
+
+def test_scoring_fantome(monkeypatch):
+    data, corps = payload()
+    registre.definir_candidat("old/model")
+    try:
+        reponse = client.post("/predict", json=corps).json()
+        registre.attendre_ombre()
+        ombre = registre.ombre.resume()
+        assert ombre["candidat"] == "old/model" and ombre["lignes"] == len(data)
+
+        candidat = registre.charger("old/model").pipeline.predict_proba(data)[:, 1]
+        ecarts = candidat - np.array(reponse["probas_class_1"])
+        assert abs(ombre["ecart_abs_moyen"] - np.abs(ecarts).mean()) < 1e-9
+        assert "api_ombre_lignes_total" in client.get("/metrics").text
+    finally:
+        registre.definir_candidat(None)
+
+
+def test_rechargement_fichier_modifie(tmp_path):
+    shutil.copy(os.path.join(dossier_modeles, "model.pkl"), tmp_path / "model.pkl")
+    registre_test = RegistreModeles(str(tmp_path))
+    empreinte = registre_test.actif.empreinte
+
+    registre_test.verifier_fichiers()
+    assert registre_test.actif.empreinte == empreinte
+
+    # Nouveau fichier déposé à la place de l'ancien : bascule au prochain contrôle
+    shutil.copy(
+        os.path.join(dossier_modeles, "old", "model.pkl"), tmp_path / "model.pkl"
+    )
+    registre_test.verifier_fichiers()
+    assert registre_test.actif.empreinte != empreinte
+    assert [nom for _, nom in registre_test.historique] == ["model", "model"]
@@ -0,0 +1,110 @@
+import io
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi.testclient import TestClient
+
+import api.main
+from api.main import app, model
+
+client = TestClient(app)
+
+chemin_fichier = os.path.dirname(__file__)
+chemin_csv = os.path.join(chemin_fichier, "../../data", "sample_clients_1k.csv")
+
+
+def test_predict_fichier_csv_ndjson():
+    with open(chemin_csv, "rb") as file:
+        contenu = file.read()
+
+    response = client.post(
+        "/predict_fichier",
+        content=contenu,
+        params={"taille_bloc": 300},
+        headers={"Content-Type": "text/csv"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    lignes = [json.loads(ligne) for ligne in response.text.splitlines()]
+    data = pd.read_csv(chemin_csv)
+    assert [ligne["SK_ID_CURR"] for ligne in lignes] == data["SK_ID_CURR"].tolist()
+
+    attendu = model.predict_proba(data.drop(columns=["SK_ID_CURR"]))[:, 1]
+    np.testing.assert_allclose(
+        [ligne["probas_class_1"] for ligne in lignes], attendu, atol=1e-12
+    )
+    assert [ligne["predictions"] for ligne in lignes] == (attendu >= 0.47).astype(
+        int
+    ).tolist()
+
+
+def test_predict_fichier_parquet_arrow():
+    data = pd.read_csv(chemin_csv).head(250)
+    tampon = io.BytesIO()
+    pq.write_table(
+        pa.Table.from_pandas(data, preserve_index=False), tampon, row_group_size=100
+    )
+
+    response = client.post(
+        "/predict_fichier",
+        content=tampon.getvalue(),
+        params={"format_sortie": "arrow", "taille_bloc": 100},
+    )
+    assert response.status_code == 200
+
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column("SK_ID_CURR").to_pylist() == data["SK_ID_CURR"].tolist()
+    attendu = model.predict_proba(data.drop(columns=["SK_ID_CURR"]))[:, 1]
+    np.testing.assert_allclose(
+        table.column("probas_class_1").to_numpy(), attendu, atol=1e-12
+    )
+
+
+def test_predict_fichier_invalide(monkeypatch):
+    ouverts, original = [], tempfile.SpooledTemporaryFile
+
+    def espion(*args, **kwargs):
+        ouverts.append(original(*args, **kwargs))
+        return ouverts[-1]
+
+    monkeypatch.setattr("api.main.tempfile.SpooledTemporaryFile", espion)
+    response = client.post("/predict_fichier", content=b"a,b\n1,2\n")
+    assert response.status_code == 400
+    # Fichier temporaire fermé dès l'erreur, comme après une réponse complète
+    assert len(ouverts) == 1 and ouverts[0].closed
+    with open(chemin_csv, "rb") as file:
+        client.post(
+            "/predict_fichier",
+            content=file.read(),
+            headers={"Content-Type": "text/csv"},
+        )
+    assert len(ouverts) == 2 and ouverts[1].closed
+
+
+def test_predict_fichier_ecritures_hors_boucle(monkeypatch):
+    ecrits = []
+    original = api.main.run_in_threadpool
+
+    async def espion(fonction, *args, **kwargs):
+        if getattr(fonction, "__name__", "") == "writelines":
+            ecrits.append(sum(len(morceau) for morceau in args[0]))
+        return await original(fonction, *args, **kwargs)
+
+    monkeypatch.setattr(api.main, "run_in_threadpool", espion)
+    chemin_5k = os.path.join(chemin_fichier, "../../data", "sample_clients_5k.csv")
+    with open(chemin_5k, "rb") as file:
+        contenu = file.read()
+
+    response = client.post(
+        "/predict_fichier", content=contenu, headers={"Content-Type": "text/csv"}
+    )
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) == 5000
+    # Tout le corps (3,4 Mo) est écrit depuis le threadpool, jamais sur la boucle
+    assert ecrits and sum(ecrits) == len(contenu)
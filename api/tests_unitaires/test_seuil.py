@@ -0,0 +1,162 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+import api.main
+from api.client_api import valeurs_json
+from api.main import app, registre
+from api.registre import SEUIL_DEFAUT
+from api.scoring_lot import main as scoring_lot
+from api.seuil import CourbeSeuils, cout_au_seuil
+
+client = TestClient(app)
+
+chemin_fichier = os.path.dirname(__file__)
+chemin_csv = os.path.join(chemin_fichier, "../../data", "sample_clients_1k.csv")
+
+
+def cout_boucle(probas, labels, seuil, cout_fn=10, cout_fp=1):
+    predictions = probas >= seuil
+    return cout_fn * np.sum(~predictions & (labels == 1)) + cout_fp * np.sum(
+        predictions & (labels == 0)
+    )
+
+
+def test_courbe_identique_a_la_boucle_sur_les_seuils():
+    rng = np.random.default_rng(0)
+    # Probas arrondies : nombreux ex aequo, comme des scores discrétisés
+    probas = np.round(rng.random(5000), 3)
+    labels = (rng.random(5000) < probas * 0.3).astype(int)
+
+    courbe = CourbeSeuils(probas, labels)
+    analyse = courbe.analyser(cout_fn=10, cout_fp=1, max_points=50)
+    couts = {seuil: cout_boucle(probas, labels, seuil) for seuil in np.unique(probas)}
+    seuil_boucle = max(couts, key=lambda s: (-couts[s], s))
+
+    assert analyse["n_seuils"] == len(np.unique(probas)) + 1
+    assert analyse["optimum"]["seuil"] == seuil_boucle
+    assert analyse["optimum"]["cout"] == couts[seuil_boucle]
+    assert len(analyse["courbe"]["seuil"]) <= 51
+    for seuil in (0.0, 0.2, 0.47, 0.9, 1.0):
+        assert cout_au_seuil(courbe, seuil) == cout_boucle(probas, labels, seuil)
+
+
+def test_analyse_json_et_binaire():
+    rng = np.random.default_rng(1)
+    probas = rng.random(2000)
+    labels = (rng.random(2000) < probas * 0.2).astype(int)
+
+    reponse = client.post(
+        "/seuil/analyse", json={"probas": probas.tolist(), "labels": labels.tolist()}
+    )
+    assert reponse.status_code == 200
+    analyse = reponse.json()
+    assert analyse["n"] == 2000 and analyse["n_positifs"] == labels.sum()
+    assert analyse["seuil_actuel"]["seuil"] == registre.actif.seuil
+    assert analyse["seuil_actuel"]["cout"] == cout_boucle(
+        probas, labels, registre.actif.seuil
+    )
+
+    # Même analyse en binaire, avec un autre coût : seul le coût change
+    corps = probas.astype("<f8").tobytes() + labels.astype(np.int8).tobytes()
+    binaire = client.post(
+        "/seuil/analyse",
+        content=corps,
+        params={"cout_fn": 5},
+        headers={"Content-Type": "application/octet-stream"},
+    ).json()
+    assert (
+        binaire["n_seuils"] == analyse["n_seuils"]
+        and binaire["n_positifs"] == analyse["n_positifs"]
+    )
+    assert binaire["optimum"]["cout"] == min(
+        cout_boucle(probas, labels, s, cout_fn=5) for s in probas
+    )
+    assert binaire["optimum"]["seuil"] >= analyse["optimum"]["seuil"]
+
+    assert (
+        client.post(
+            "/seuil/analyse", json={"probas": [0.1, 0.2], "labels": [1]}
+        ).status_code
+        == 400
+    )
+    assert client.post("/seuil/analyse", json={"labels": [1]}).status_code == 400
+
+
+def test_analyse_jeu_de_donnees_score():
+    data = pd.read_csv(chemin_csv).drop(columns=["SK_ID_CURR"]).head(300)
+    probas = registre.actif.predire_probas(data)
+    labels = (probas >= np.quantile(probas, 0.9)).astype(int)
+
+    corps = {
+        "data": valeurs_json(data),
+        "columns": data.columns.tolist(),
+        "labels": labels.tolist(),
+    }
+    analyse = client.post("/seuil/analyse", json=corps).json()
+    assert analyse["optimum"]["cout"] == 0
+    assert analyse["optimum"]["seuil"] == probas[labels == 1].min()
+
+
+def test_seuil_par_version(monkeypatch):
+    monkeypatch.setattr(api.main, "jeton_admin", "secret")
+    entetes = {"X-Admin-Token": "secret"}
+    version = registre.actif
+    assert (
+        client.post(
+            "/admin/modeles/seuil", params={"seuil": 2}, headers=entetes
+        ).status_code
+        == 400
+    )
+    try:
+        reponse = client.post(
+            "/admin/modeles/seuil", params={"seuil": 0.3}, headers=entetes
+        )
+        assert reponse.status_code == 200 and reponse.json()["seuil"] == 0.3
+        assert client.get("/version").json()["seuil"] == 0.3
+        assert os.path.exists(version.chemin_meta)
+
+        # Décisions de /predict prises au nouveau seuil
+        data = pd.read_csv(chemin_csv).drop(columns=["SK_ID_CURR"]).head(200)
+        reponse = client.post(
+            "/predict",
+            json={"data": valeurs_json(data), "columns": data.columns.tolist()},
+        ).json()
+        probas = np.array(reponse["probas_class_1"])
+        assert reponse["predictions"] == (probas >= 0.3).astype(int).tolist()
+    finally:
+        version.seuil = SEUIL_DEFAUT
+        if os.path.exists(version.chemin_meta):
+            os.remove(version.chemin_meta)
+    assert client.get("/version").json()["seuil"] == SEUIL_DEFAUT
+
+
+def test_scoring_lot_seuil_de_la_version(tmp_path):
+    version = registre.actif
+    sortie = tmp_path / "scores"
+    try:
+        version.definir_seuil(0.05)
+        scoring_lot(
+            [chemin_csv, "--modele", version.nom, "--dossier-sortie", str(sortie)]
+        )
+        lignes = (sortie / "sample_clients_1k_scores.ndjson").read_text().splitlines()
+        lignes = [json.loads(ligne) for ligne in lignes]
+        probas = np.array([ligne["probas_class_1"] for ligne in lignes])
+        assert [ligne["predictions"] for ligne in lignes] == (probas >= 0.05).astype(
+            int
+        ).tolist()
+
+        # --seuil reste un forçage explicite
+        scoring_lot([chemin_csv, "--seuil", "0.9", "--dossier-sortie", str(sortie)])
+        lignes = (sortie / "sample_clients_1k_scores.ndjson").read_text().splitlines()
+        lignes = [json.loads(ligne) for ligne in lignes]
+        assert [ligne["predictions"] for ligne in lignes] == (probas >= 0.9).astype(
+            int
+        ).tolist()
+    finally:
+        version.seuil = SEUIL_DEFAUT
+        if os.path.exists(version.chemin_meta):
+            os.remove(version.chemin_meta)
@@ -0,0 +1,81 @@
+import os
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+from api.client_api import valeurs_json
+from api.main import app
+from api.shap_approx import ordre_stratifie, shap_approx, strates
+
+client = TestClient(app)
+
+chemin_fichier = os.path.dirname(__file__)
+chemin_csv = os.path.join(chemin_fichier, "../../data", "sample_clients_1k.csv")
+
+
+def test_prefixes_stratifies_proportionnels():
+    rng = np.random.default_rng(0)
+    probas = rng.random(10_000)
+    genre = (rng.random(10_000) < 0.3).astype(float)
+    strates_lignes = strates(probas, genre)
+    assert len(np.unique(strates_lignes)) == 20
+
+    ordre = ordre_stratifie(strates_lignes, rng)
+    assert sorted(ordre.tolist()) == list(range(10_000))
+    # Un préfixe de 500 lignes respecte les proportions de la population (à une ligne près par strate)
+    attendu = np.bincount(strates_lignes) * 500 / 10_000
+    assert (
+        np.abs(np.bincount(strates_lignes[ordre[:500]], minlength=20) - attendu).max()
+        <= 1
+    )
+
+
+def test_importances_approchees_dans_la_tolerance():
+    rng = np.random.default_rng(1)
+    X = rng.normal(size=(20_000, 8))
+    coefficients = np.array([3.0, 2.0, 1.0, 0.5, 0.2, 0.1, 0.0, 0.0])
+
+    def calculer(X_lot):
+        return X_lot * coefficients, 0.0
+
+    resultat = shap_approx(
+        X, rng.random(20_000), calculer, tolerance=0.05, n_initial=128
+    )
+    approximation = resultat["approximation"]
+    assert approximation["converge"]
+    assert approximation["n_echantillon"] < 20_000
+
+    vraie = np.abs(X * coefficients).mean(axis=0)
+    erreur = np.abs(np.array(approximation["importance"]) - vraie).max() / vraie.max()
+    assert erreur <= 0.05
+    assert np.all(
+        np.array(approximation["ic_bas"]) <= np.array(approximation["ic_haut"])
+    )
+    assert resultat["shap_values"].shape == (approximation["n_echantillon"], 8)
+
+
+def test_shap_global_approx_endpoint():
+    data = pd.read_csv(chemin_csv).drop(columns=["SK_ID_CURR"])
+    response = client.post(
+        "/shap_global",
+        json={"data": valeurs_json(data), "columns": data.columns.tolist()},
+        params={
+            "approx": True,
+            "mode": "top_k",
+            "k": 5,
+            "tolerance": 0.5,
+            "n_max": 300,
+        },
+    )
+    assert response.status_code == 200
+    res_json = response.json()
+    approximation = res_json["approximation"]
+    assert approximation["n_total"] == 1000
+    assert (
+        approximation["n_echantillon"]
+        == len(res_json["indices"])
+        == len(res_json["shap_values"])
+        <= 300
+    )
+    assert len(res_json["feature_names"]) == 5
@@ -0,0 +1,125 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+import api.main
+from api.client_api import valeurs_json
+from api.main import app, obtenir_index_voisins, preprocessor, registre
+from api.voisins import IndexVoisins
+
+client = TestClient(app)
+
+chemin_fichier = os.path.dirname(__file__)
+chemin_csv = os.path.join(chemin_fichier, "../../data", "sample_clients_1k.csv")
+
+
+def test_index_proche_du_calcul_exact():
+    data = pd.read_csv(chemin_csv)
+    X = preprocessor.transform(data.drop(columns=["SK_ID_CURR"])).astype(np.float64)
+    index = IndexVoisins(X, data["SK_ID_CURR"].to_numpy())
+    assert index.description()["n_composantes"] == 32
+
+    rappels = []
+    for position in range(0, 1000, 50):
+        positions, ids, distances = index.voisins(X[position], k=10)
+        assert positions[0] == position and distances[0] == 0
+        assert ids[0] == data["SK_ID_CURR"].iloc[position]
+        assert np.all(np.diff(distances) >= 0)
+        exactes = np.argsort(((index.X - index.X[position]) ** 2).sum(axis=1))[:10]
+        rappels.append(len(set(positions) & set(exactes)) / 10)
+    assert np.mean(rappels) >= 0.9
+
+
+def test_ponderation_et_exclusion():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(500, 4))
+    ids = np.arange(500) + 1000
+    # Seule la première feature compte : les voisins sont ceux de valeur proche sur celle-ci
+    index = IndexVoisins(X, ids, poids=[1.0, 0.0, 0.0, 0.0])
+    _, voisins_ids, _ = index.voisins(X[0], k=5, exclure_id=1000)
+    assert 1000 not in voisins_ids
+    ecarts = np.abs(X[voisins_ids - 1000, 0] - X[0, 0])
+    assert ecarts.max() <= np.sort(np.abs(X[1:, 0] - X[0, 0]))[4] + 1e-6
+
+
+def test_voisins_endpoint():
+    data = pd.read_csv(chemin_csv)
+    client_selectionne = data.iloc[[7]]
+    corps = {
+        "data": valeurs_json(client_selectionne.drop(columns=["SK_ID_CURR"])),
+        "columns": data.columns.drop("SK_ID_CURR").tolist(),
+    }
+    id_client = int(client_selectionne["SK_ID_CURR"].iloc[0])
+
+    response = client.post(
+        "/voisins/sample_clients_1k",
+        json=corps,
+        params={"k": 20, "id_client": id_client},
+    )
+    assert response.status_code == 200
+    res_json = response.json()
+    assert len(res_json["ids"]) == 20 and id_client not in res_json["ids"]
+    assert set(res_json["ids"]) <= set(data["SK_ID_CURR"])
+
+    assert client.post("/voisins/inconnu", json=corps).status_code == 404
+    assert (
+        client.post(
+            "/voisins/sample_clients_1k", json=corps, params={"ponderation": "x"}
+        ).status_code
+        == 400
+    )
+
+
+def test_construction_hors_du_verrou_global(monkeypatch):
+    constructions, demarree, debloquer = [], threading.Event(), threading.Event()
+
+    def index_lent(*args):
+        constructions.append(args[0].shape)
+        demarree.set()
+        assert debloquer.wait(timeout=30)
+        return IndexVoisins(*args)
+
+    monkeypatch.setattr(api.main, "index_voisins", OrderedDict())
+    version = registre.actif
+    deja_construit = obtenir_index_voisins("sample_clients_1k", version, "aucune")
+    monkeypatch.setattr(api.main, "IndexVoisins", index_lent)
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [
+            executor.submit(
+                obtenir_index_voisins, "sample_clients_5k", version, "aucune"
+            )
+            for _ in range(3)
+        ]
+        # Pendant la construction, l'index déjà en cache reste servi sans attendre
+        assert demarree.wait(timeout=60)
+        assert (
+            obtenir_index_voisins("sample_clients_1k", version, "aucune")
+            is deja_construit
+        )
+        debloquer.set()
+        index = {id(future.result(timeout=60)) for future in futures}
+
+    # Une seule construction pour les trois requêtes concurrentes
+    assert len(constructions) == 1 and len(index) == 1
+
+
+def test_construction_en_echec(monkeypatch):
+    def index_invalide(*args):
+        raise ValueError("colonne manquante")
+
+    monkeypatch.setattr(api.main, "index_voisins", OrderedDict())
+    monkeypatch.setattr(api.main, "IndexVoisins", index_invalide)
+    data = pd.read_csv(chemin_csv).drop(columns=["SK_ID_CURR"]).head(1)
+    corps = {"data": valeurs_json(data), "columns": data.columns.tolist()}
+
+    response = client.post("/voisins/sample_clients_1k", json=corps)
+    assert (
+        response.status_code == 400 and "colonne manquante" in response.json()["detail"]
+    )
+    assert api.main.verrous_construction_voisins == {}
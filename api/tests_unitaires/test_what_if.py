@@ -0,0 +1,114 @@
+import os
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+from api.client_api import valeurs_json
+from api.main import app, model, registre
+from api.what_if import construire_variantes, lire_grille
+
+client = TestClient(app)
+
+chemin_fichier = os.path.dirname(__file__)
+chemin_csv = os.path.join(chemin_fichier, "../../data", "sample_clients.csv")
+
+
+def client_test():
+    return pd.read_csv(chemin_csv).drop(columns=["SK_ID_CURR"]).head(1)
+
+
+def test_construire_variantes():
+    colonnes = ["a", "b", "c"]
+    ligne = np.array([1.0, 2.0, 3.0])
+    grilles = {
+        "a": np.array([10.0, 20.0]),
+        "c": lire_grille({"min": 0, "max": 1, "n": 3}),
+    }
+
+    X = construire_variantes(ligne, colonnes, grilles)
+    np.testing.assert_array_equal(X[0], ligne)
+    np.testing.assert_array_equal(X[1:3, 0], [10, 20])
+    np.testing.assert_array_equal(X[3:, 2], [0, 0.5, 1])
+    assert (X[:, 1] == 2).all()
+
+    croise = construire_variantes(ligne, colonnes, grilles, croise=True)
+    assert len(croise) == 1 + 6
+    np.testing.assert_array_equal(
+        croise[1:, [0, 2]], [[10, 0], [10, 0.5], [10, 1], [20, 0], [20, 0.5], [20, 1]]
+    )
+
+
+def test_courbes_identiques_au_scoring_variante_par_variante():
+    data = client_test()
+    grilles = {
+        "AMT_CREDIT": [1e5, 5e5, 1e6],
+        "EXT_SOURCE_2": {"min": 0.1, "max": 0.9, "n": 5},
+    }
+    corps = {
+        "data": valeurs_json(data),
+        "columns": data.columns.tolist(),
+        "grilles": grilles,
+    }
+
+    reponse = client.post("/what_if", json=corps)
+    assert reponse.status_code == 200
+    resultat = reponse.json()
+    assert resultat["n_variantes"] == 8
+    assert abs(resultat["base"]["proba"] - model.predict_proba(data)[0, 1]) < 1e-9
+
+    for colonne, courbe in resultat["courbes"].items():
+        for valeur, proba in zip(courbe["valeurs"], courbe["probas"]):
+            variante = data.copy()
+            variante[colonne] = valeur
+            assert abs(proba - model.predict_proba(variante)[0, 1]) < 1e-9
+
+    corps["croise"] = True
+    croise = client.post("/what_if", json=corps).json()
+    assert np.array(croise["probas"]).shape == (3, 5)
+    variante = data.copy()
+    variante["AMT_CREDIT"], variante["EXT_SOURCE_2"] = 5e5, 0.9
+    assert abs(croise["probas"][1][4] - model.predict_proba(variante)[0, 1]) < 1e-9
+
+
+def test_what_if_avec_shap():
+    data = client_test()
+    corps = {
+        "data": valeurs_json(data),
+        "columns": data.columns.tolist(),
+        "grilles": {"EXT_SOURCE_3": [0.2, 0.8]},
+    }
+    resultat = client.post("/what_if", json=corps, params={"shap": True}).json()
+    courbe = resultat["courbes"]["EXT_SOURCE_3"]
+    j = resultat["feature_names"].index("EXT_SOURCE_3")
+    assert [valeurs[j] for valeurs in courbe["shap_values"]] == courbe["shap"]
+
+    # Additivité SHAP (espace log-odds) : base + somme des contributions = logit de la proba
+    logits = resultat["base_value"] + np.sum(courbe["shap_values"], axis=1)
+    np.testing.assert_allclose(1 / (1 + np.exp(-logits)), courbe["probas"], atol=1e-6)
+
+
+def test_what_if_invalide():
+    data = client_test()
+    corps = {
+        "data": valeurs_json(data),
+        "columns": data.columns.tolist(),
+        "grilles": {"INCONNUE": [1, 2]},
+    }
+    assert client.post("/what_if", json=corps).status_code == 400
+
+    grilles = {
+        col: {"min": 0, "max": 1, "n": 100}
+        for col in registre.actif.colonnes_entree[:3]
+    }
+    corps.update(grilles=grilles, croise=True)  # 10^6 variantes
+    assert client.post("/what_if", json=corps).status_code == 400
+
+    # 128^10 = 2^70 variantes : refusé sans dépassement d'entier (np.prod donnait 0)
+    grilles = {
+        col: {"min": 0, "max": 1, "n": 128}
+        for col in registre.actif.colonnes_entree[:10]
+    }
+    corps.update(grilles=grilles)
+    reponse = client.post("/what_if", json=corps)
+    assert reponse.status_code == 400 and str(2**70) in reponse.json()["detail"]
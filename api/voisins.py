@@ -0,0 +1,82 @@
+"""Index des plus proches voisins (clients similaires) dans l'espace des features transformées.
+
+Les lignes passent par le preprocessor du modèle, les valeurs manquantes sont
+remplacées par la médiane de la colonne et chaque feature peut être pondérée par
+son importance SHAP globale (distance euclidienne pondérée). Le KD-tree est construit
+sur une projection PCA ; une requête y cherche `facteur_candidats` x k candidats,
+reclassés par distance exacte dans l'espace complet : pas de parcours de toute la
+population par requête.
+"""
+
+import numpy as np
+from sklearn.decomposition import PCA
+from sklearn.neighbors import KDTree
+
+N_COMPOSANTES = 32
+FACTEUR_CANDIDATS = 8
+TAILLE_AJUSTEMENT_PCA = 20_000
+
+
+class IndexVoisins:
+    def __init__(
+        self,
+        X_transforme,
+        ids,
+        poids=None,
+        n_composantes=N_COMPOSANTES,
+        facteur_candidats=FACTEUR_CANDIDATS,
+    ):
+        X = np.asarray(X_transforme, dtype=np.float64)
+        self.ids = np.asarray(ids)
+        self.facteur_candidats = facteur_candidats
+        self.medianes = (
+            np.nan_to_num(np.nanmedian(X, axis=0))
+            if np.isnan(X).any()
+            else np.zeros(X.shape[1])
+        )
+
+        # Pondération : distance pondérée par l'importance => coordonnées multipliées par sqrt(poids)
+        if poids is None:
+            self.echelle = np.ones(X.shape[1])
+        else:
+            poids = np.asarray(poids, dtype=np.float64)
+            self.echelle = np.sqrt(poids / max(poids.mean(), 1e-12))
+
+        self.X = self.preparer(X).astype(np.float32)
+        self.pca = None
+        if X.shape[1] > n_composantes and len(X) > n_composantes:
+            # PCA ajustée sur un échantillon : construction bornée même pour de très grandes populations
+            rng = np.random.default_rng(0)
+            echantillon = self.X[
+                rng.choice(len(X), min(len(X), TAILLE_AJUSTEMENT_PCA), replace=False)
+            ]
+            self.pca = PCA(n_components=n_composantes, random_state=0).fit(echantillon)
+            self.arbre = KDTree(self.pca.transform(self.X))
+        else:
+            self.arbre = KDTree(self.X)
+
+    def preparer(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        return np.where(np.isnan(X), self.medianes, X) * self.echelle
+
+    def voisins(self, x_transforme, k=10, exclure_id=None):
+        """(positions, ids, distances) des k plus proches voisins d'une ligne transformée."""
+        x = self.preparer(np.atleast_2d(x_transforme)).astype(np.float32)
+        n_candidats = min(len(self.X), k * self.facteur_candidats + 1)
+        requete = self.pca.transform(x) if self.pca is not None else x
+        candidats = self.arbre.query(requete, k=n_candidats, return_distance=False)[0]
+
+        if exclure_id is not None:
+            candidats = candidats[self.ids[candidats] != exclure_id]
+        distances = np.sqrt(((self.X[candidats] - x[0]) ** 2).sum(axis=1))
+        ordre = np.argsort(distances, kind="stable")[:k]
+        positions = candidats[ordre]
+        return positions, self.ids[positions], distances[ordre]
+
+    def description(self):
+        return {
+            "n_clients": len(self.X),
+            "n_features": self.X.shape[1],
+            "n_composantes": self.pca.n_components_ if self.pca is not None else None,
+            "pondere": bool(np.any(self.echelle != 1)),
+        }
@@ -0,0 +1,71 @@
+"""Analyse what-if : variantes d'un client sur des grilles de valeurs, scorées en un seul appel.
+
+Mode indépendant (défaut) : chaque colonne varie seule, les autres gardent la valeur du
+client (courbes de dépendance partielle individuelles). Mode croisé : produit cartésien
+des grilles. La ligne du client puis toutes les variantes forment une seule matrice
+(lignes x colonnes du modèle), scorée par un seul `predict_proba`.
+"""
+
+import math
+
+import numpy as np
+
+POINTS_GRILLE = 20
+MAX_POINTS_GRILLE = 200
+MAX_VARIANTES = 20_000
+
+
+def lire_grille(spec):
+    """Valeurs d'une grille : liste explicite ou {"min", "max", "n"} (n points réguliers)."""
+    if isinstance(spec, dict):
+        n = int(spec.get("n", POINTS_GRILLE))
+        if not 2 <= n <= MAX_POINTS_GRILLE:
+            raise ValueError(f"n doit être entre 2 et {MAX_POINTS_GRILLE}")
+        return np.linspace(float(spec["min"]), float(spec["max"]), n)
+    valeurs = np.asarray(spec, dtype=np.float64)
+    if valeurs.ndim != 1 or not 1 <= len(valeurs) <= MAX_POINTS_GRILLE:
+        raise ValueError(
+            f"une grille doit contenir entre 1 et {MAX_POINTS_GRILLE} valeurs"
+        )
+    return valeurs
+
+
+def construire_variantes(ligne, colonnes, grilles, croise=False):
+    """Matrice (1 + n_variantes, colonnes) : la ligne du client puis ses variantes.
+
+    `grilles` associe à chaque colonne modifiée ses valeurs ; en mode indépendant les
+    variantes sont rangées grille par grille, en mode croisé dans l'ordre du produit
+    cartésien (dernière grille la plus rapide).
+    """
+    inconnues = [colonne for colonne in grilles if colonne not in colonnes]
+    if inconnues:
+        raise ValueError(f"colonnes inconnues du modèle : {inconnues}")
+    if not grilles:
+        raise ValueError("aucune grille fournie")
+    positions = [colonnes.index(colonne) for colonne in grilles]
+    tailles = [len(valeurs) for valeurs in grilles.values()]
+    # Entiers Python : pas de dépassement int64 sur de grands produits cartésiens
+    n_variantes = math.prod(tailles) if croise else sum(tailles)
+    if n_variantes > MAX_VARIANTES:
+        raise ValueError(f"{n_variantes} variantes (maximum {MAX_VARIANTES})")
+
+    X = np.tile(np.asarray(ligne, dtype=np.float64), (1 + n_variantes, 1))
+    if croise:
+        maillage = np.meshgrid(*grilles.values(), indexing="ij")
+        for position, valeurs in zip(positions, maillage):
+            X[1:, position] = valeurs.ravel()
+    else:
+        debut = 1
+        for position, valeurs in zip(positions, grilles.values()):
+            X[debut : debut + len(valeurs), position] = valeurs
+            debut += len(valeurs)
+    return X
+
+
+def decouper_courbes(grilles, valeurs):
+    """Découpe les résultats des variantes indépendantes (sans la ligne du client) par colonne."""
+    courbes, debut = {}, 0
+    for colonne, grille in grilles.items():
+        courbes[colonne] = valeurs[debut : debut + len(grille)]
+        debut += len(grille)
+    return courbes